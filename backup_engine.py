@@ -0,0 +1,316 @@
+import argparse
+import datetime
+import gzip
+import json
+import os
+import threading
+import time
+from player_store import META_SECTION, _section_value, encode_compact
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+# ===============================
+# Backup engine - base snapshot penuh + incremental (hanya player/section
+# yang berubah), dijalankan oleh writer thread PLAYER_STORE setelah tiap write
+# ===============================
+BACKUP_DIR = os.environ.get("BACKUP_DIR", "backups")
+
+# Kompresi backup: "none", "gzip" atau "zstd" (butuh package zstandard, fallback ke gzip)
+BACKUP_COMPRESSION = os.environ.get("BACKUP_COMPRESSION", "gzip")
+BACKUP_SUFFIXES = {"none": ".json", "gzip": ".json.gz", "zstd": ".json.zst"}
+
+# Incremental paling cepat setiap 5 menit, base baru setiap hari
+BACKUP_INTERVAL = float(os.environ.get("BACKUP_INTERVAL", "300"))
+BACKUP_BASE_INTERVAL = float(os.environ.get("BACKUP_BASE_INTERVAL", "86400"))
+
+# Retensi: semua titik 1 jam terakhir, per jam selama 1 hari, per hari selama 30 hari
+BACKUP_KEEP_ALL = 3600
+BACKUP_HOURLY_FOR = 86400
+BACKUP_RETENTION_DAYS = int(os.environ.get("BACKUP_RETENTION_DAYS", "30"))
+
+
+def backup_compression():
+    """Mode kompresi backup yang benar-benar dipakai"""
+    if BACKUP_COMPRESSION == "zstd" and zstandard is None:
+        return "gzip"
+    if BACKUP_COMPRESSION not in BACKUP_SUFFIXES:
+        return "none"
+    return BACKUP_COMPRESSION
+
+
+def compress_backup(raw, compression):
+    """Kompres bytes backup sesuai mode"""
+    if compression == "gzip":
+        return gzip.compress(raw, compresslevel=6)
+    if compression == "zstd":
+        return zstandard.ZstdCompressor(level=3).compress(raw)
+    return raw
+
+
+def read_backup(path):
+    """Baca file backup, otomatis decompress berdasarkan ekstensi"""
+    with open(path, "rb") as f:
+        raw = f.read()
+    if path.endswith(".gz"):
+        raw = gzip.decompress(raw)
+    elif path.endswith(".zst"):
+        if zstandard is None:
+            raise RuntimeError("zstandard belum terinstall, tidak bisa membaca backup .zst")
+        raw = zstandard.ZstdDecompressor().decompress(raw)
+    return json.loads(raw)
+
+
+def _write_backup_file(path, value):
+    """Tulis satu file backup terkompresi secara atomik"""
+    raw = encode_compact(value).encode("utf-8")
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(compress_backup(raw, backup_compression()))
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+def parse_backup_time(value):
+    """Unix timestamp atau ISO datetime ("2025-01-31T12:00") -> unix timestamp"""
+    if value is None:
+        return None
+    value = str(value).strip()
+    try:
+        return float(value)
+    except ValueError:
+        return datetime.datetime.fromisoformat(value).timestamp()
+
+
+def apply_incremental(data, incremental):
+    """Terapkan satu incremental ke data penuh (player None = dihapus)"""
+    for player_id, player_data in incremental["players"].items():
+        if player_data is None:
+            data["players"].pop(player_id, None)
+        else:
+            data["players"][player_id] = player_data
+    for section, value in incremental["sections"].items():
+        if section == META_SECTION:
+            for key in list(_section_value(data, META_SECTION)):
+                del data[key]
+            data.update(value)
+        else:
+            data[section] = value
+    return data
+
+
+class BackupEngine:
+    """Base + incremental backup dengan retensi bertingkat dan point-in-time restore
+
+    File:
+        base_<ts>.json.gz          snapshot penuh
+        incr_<base>_<ts>.json.gz   perubahan sejak titik sebelumnya dalam chain <base>
+    """
+
+    def __init__(self, directory=BACKUP_DIR):
+        self.directory = directory
+        self._lock = threading.Lock()
+        self.pending_players = {}
+        self.pending_sections = {}
+        # Perubahan sebelum startup tidak tercatat di chain lama, jadi selalu mulai dengan base baru
+        self.needs_base = True
+        self.last_base = None
+        self.last_point = 0
+        self.last_error = None
+
+    # ---------- daftar file ----------
+
+    def points(self):
+        """Semua titik backup: list (ts, kind, base_ts, filename) urut dari yang terlama"""
+        if not os.path.exists(self.directory):
+            return []
+        points = []
+        for filename in os.listdir(self.directory):
+            if not filename.endswith(tuple(BACKUP_SUFFIXES.values())):
+                continue
+            parts = filename.split(".")[0].split("_")
+            if parts[0] == "base" and len(parts) == 2 and parts[1].isdigit():
+                points.append((int(parts[1]), "base", int(parts[1]), filename))
+            elif parts[0] == "incr" and len(parts) == 3 and parts[1].isdigit() and parts[2].isdigit():
+                points.append((int(parts[2]), "incr", int(parts[1]), filename))
+        # Base lebih dulu jika timestamp sama (incremental selalu sesudah base-nya)
+        return sorted(points, key=lambda p: (p[0], p[1] != "base"))
+
+    def _path(self, filename):
+        return os.path.join(self.directory, filename)
+
+    # ---------- dipanggil writer thread ----------
+
+    def request_base(self):
+        """Minta base snapshot baru pada write berikutnya (misal !backup)"""
+        self.needs_base = True
+
+    def record(self, plan, read_full):
+        """After-write hook PLAYER_STORE: kumpulkan perubahan, buat titik backup jika waktunya
+
+        read_full() membaca data lengkap dari backend (dipanggil hanya saat perlu base).
+        """
+        try:
+            written = self._record(plan, read_full)
+        except Exception as e:
+            self.last_error = e
+            raise
+        self.last_error = None
+        return written
+
+    def _record(self, plan, read_full):
+        changed = plan["changed"]
+        if changed["all"]:
+            # save_data() mengganti seluruh data: diff per player tidak bisa dipercaya, buat base baru
+            self.needs_base = True
+        elif plan["data"] is not None:
+            written_players = plan["data"]["players"]
+            for player_id in changed["players"]:
+                self.pending_players[player_id] = written_players.get(player_id)
+            for section in changed["sections"]:
+                self.pending_sections[section] = _section_value(plan["data"], section)
+
+        now = time.time()
+        with self._lock:
+            if self.last_base is None:
+                bases = [p[0] for p in self.points() if p[1] == "base"]
+                self.last_base = bases[-1] if bases else 0
+            if self.last_base == 0 or now - self.last_base >= BACKUP_BASE_INTERVAL:
+                self.needs_base = True
+
+            if self.needs_base:
+                full = plan["data"] if plan["data"] is not None and plan["players"] is None else read_full()
+                if full is None:
+                    return False
+                self._write_base(full, now)
+            elif now - self.last_point >= BACKUP_INTERVAL and (self.pending_players or self.pending_sections):
+                self._write_incremental(now)
+            else:
+                return False
+
+            self.apply_retention(now)
+        return True
+
+    def _write_base(self, data, now):
+        os.makedirs(self.directory, exist_ok=True)
+        timestamp = int(now)
+        filename = f"base_{timestamp}{BACKUP_SUFFIXES[backup_compression()]}"
+        _write_backup_file(self._path(filename), data)
+
+        self.pending_players.clear()
+        self.pending_sections.clear()
+        self.needs_base = False
+        self.last_base = timestamp
+        self.last_point = now
+        print(f"📦 Backup base created: {filename}")
+
+    def _write_incremental(self, now):
+        os.makedirs(self.directory, exist_ok=True)
+        timestamp = max(int(now), self.last_base + 1)
+        filename = f"incr_{self.last_base}_{timestamp}{BACKUP_SUFFIXES[backup_compression()]}"
+        _write_backup_file(self._path(filename), {
+            "ts": timestamp,
+            "base": self.last_base,
+            "players": self.pending_players,
+            "sections": self.pending_sections
+        })
+
+        self.pending_players = {}
+        self.pending_sections = {}
+        self.last_point = now
+
+    # ---------- retensi ----------
+
+    def apply_retention(self, now=None):
+        """Gabungkan incremental per jam / per hari dan hapus chain yang lebih tua dari retensi"""
+        now = now or time.time()
+        chains = {}
+        for point in self.points():
+            chains.setdefault(point[2], []).append(point)
+        newest_chain = max(chains) if chains else None
+
+        for base_ts, points in chains.items():
+            if base_ts != newest_chain and now - points[-1][0] > BACKUP_RETENTION_DAYS * 86400:
+                for point in points:
+                    os.remove(self._path(point[3]))
+                continue
+
+            # Incremental dalam bucket yang sama digabung ke titik terakhir bucket tersebut
+            buckets = {}
+            for point in points:
+                if point[1] != "incr":
+                    continue
+                age = now - point[0]
+                if age < BACKUP_KEEP_ALL:
+                    key = ("all", point[0])
+                elif age < BACKUP_HOURLY_FOR:
+                    key = ("hour", point[0] // 3600)
+                else:
+                    key = ("day", point[0] // 86400)
+                buckets.setdefault(key, []).append(point)
+
+            for bucket in buckets.values():
+                if len(bucket) > 1:
+                    self._merge_incrementals(bucket)
+
+    def _merge_incrementals(self, bucket):
+        merged = {"players": {}, "sections": {}}
+        for point in bucket:
+            incremental = read_backup(self._path(point[3]))
+            merged["players"].update(incremental["players"])
+            merged["sections"].update(incremental["sections"])
+        last = bucket[-1]
+        merged["ts"] = last[0]
+        merged["base"] = last[2]
+
+        _write_backup_file(self._path(last[3]), merged)
+        for point in bucket[:-1]:
+            os.remove(self._path(point[3]))
+
+    # ---------- restore ----------
+
+    def restore(self, at=None):
+        """Data lengkap pada waktu `at` (unix ts, None = titik terbaru), atau None jika tidak ada backup"""
+        with self._lock:
+            points = self.points()
+            bases = [p for p in points if p[1] == "base" and (at is None or p[0] <= at)]
+            if not bases:
+                return None
+
+            base = bases[-1]
+            data = read_backup(self._path(base[3]))
+            for point in points:
+                if point[1] == "incr" and point[2] == base[0] and (at is None or point[0] <= at):
+                    apply_incremental(data, read_backup(self._path(point[3])))
+            return data
+
+
+BACKUP_ENGINE = BackupEngine()
+
+
+if __name__ == "__main__":
+    # python backup_engine.py list
+    # python backup_engine.py restore --at 2025-01-31T12:00 --out data.restored.json
+    parser = argparse.ArgumentParser(description="Backup tools")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    subparsers.add_parser("list", help="Tampilkan semua titik backup")
+    restore_parser = subparsers.add_parser("restore", help="Rekonstruksi data pada waktu tertentu")
+    restore_parser.add_argument("--at", default=None, help="Unix timestamp atau ISO datetime (default: terbaru)")
+    restore_parser.add_argument("--out", default="data.restored.json")
+
+    args = parser.parse_args()
+    if args.command == "list":
+        for timestamp, kind, base_ts, filename in BACKUP_ENGINE.points():
+            when = datetime.datetime.fromtimestamp(timestamp).isoformat(timespec="seconds")
+            print(f"{when}  {kind:<5} {filename}")
+    elif args.command == "restore":
+        data = BACKUP_ENGINE.restore(parse_backup_time(args.at))
+        if data is None:
+            print("⚠️ No backup found for that time")
+        else:
+            with open(args.out, "w") as f:
+                json.dump(data, f, indent=2)
+            print(f"✅ Restored {len(data['players'])} players to {args.out}")
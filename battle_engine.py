@@ -0,0 +1,137 @@
+import random
+from collections import namedtuple
+
+# ===============================
+# Battle engine - perhitungan PvP murni (tanpa Discord / data file).
+# Combatant di-snapshot sekali saat battle dimulai; tiap round
+# menghasilkan RoundLog yang tinggal di-render oleh layer Discord.
+# ===============================
+MAX_HP = 100
+MAX_ROUNDS = 10
+BASE_DAMAGE = 15
+MIN_DAMAGE, MAX_DAMAGE = 5, 40
+
+FLAVOR_TECHNIQUES = (
+    "menggunakan *Palm of Thousand Winds*",
+    "melancarkan *Heavenly Sword Strike*",
+    "mengaktifkan *Dragon Breath Aura*",
+    "menyerang dengan *Shadow Step Punch*",
+    "memanggil *Golden Bell Shield* namun tetap terkena",
+    "menggunakan *Jade Flute Melody*"
+)
+
+# Snapshot immutable satu petarung: power (sudah termasuk bantuan NPC) + bonus beast aktif
+Combatant = namedtuple("Combatant", ["player_id", "power", "regeneration", "critical"])
+
+RoundLog = namedtuple("RoundLog", [
+    "round",
+    "attacker_damage", "defender_damage",
+    "attacker_crit", "defender_crit",
+    "attacker_regen", "defender_regen",
+    "attacker_hp", "defender_hp",
+    "attacker_technique", "defender_technique"
+])
+
+
+def active_beast_bonus(player):
+    """Bonus dict spirit beast yang sedang aktif ({} jika tidak ada)"""
+    current = player.get("current_beast")
+    if not current:
+        return {}
+    for beast in player.get("spirit_beasts", []):
+        if beast["name"] == current:
+            return beast.get("bonus", {})
+    return {}
+
+
+def snapshot(player_id, player, power=None, beast=None):
+    """Combatant dari data player; power default total_power
+
+    beast: profil beast yang sudah di-resolve (punya .regeneration dan
+    .critical, mis. BeastProfile dari derived_stats); tanpa itu roster discan.
+    """
+    if beast is None:
+        bonus = active_beast_bonus(player)
+        regeneration, critical = bonus.get("regeneration", 0), bonus.get("critical", 0)
+    else:
+        regeneration, critical = beast.regeneration, beast.critical
+    return Combatant(
+        player_id,
+        player["total_power"] if power is None else power,
+        regeneration,
+        critical
+    )
+
+
+def _damage(own_power, other_power, rng):
+    """Damage dasar dari rasio power, dibatasi agar tidak ada instant kill di round awal"""
+    ratio = own_power / max(1, other_power)
+    damage = int(BASE_DAMAGE * (ratio ** 0.5) * rng.uniform(0.8, 1.2))
+    return max(MIN_DAMAGE, min(MAX_DAMAGE, damage))
+
+
+def resolve_round(attacker, defender, attacker_hp, defender_hp, round_number, rng=random):
+    """Hitung satu round: damage, regenerasi beast, critical hit, clamp HP
+
+    Tidak mengubah apa pun; HP baru ada di RoundLog.attacker_hp / defender_hp.
+    """
+    att_dmg = _damage(attacker.power, defender.power, rng)
+    def_dmg = _damage(defender.power, attacker.power, rng)
+
+    # Regenerasi (Immortal Phoenix dll) sebelum damage
+    att_regen = int(MAX_HP * attacker.regeneration) if attacker.regeneration > 0 else 0
+    def_regen = int(MAX_HP * defender.regeneration) if defender.regeneration > 0 else 0
+    attacker_hp = min(MAX_HP, attacker_hp + att_regen)
+    defender_hp = min(MAX_HP, defender_hp + def_regen)
+
+    # Critical hit (White Divine Tiger dll)
+    att_crit = attacker.critical > 0 and rng.random() < attacker.critical
+    def_crit = defender.critical > 0 and rng.random() < defender.critical
+    if att_crit:
+        att_dmg *= 2
+    if def_crit:
+        def_dmg *= 2
+
+    return RoundLog(
+        round_number,
+        att_dmg, def_dmg,
+        att_crit, def_crit,
+        att_regen, def_regen,
+        max(0, attacker_hp - def_dmg), max(0, defender_hp - att_dmg),
+        rng.choice(FLAVOR_TECHNIQUES), rng.choice(FLAVOR_TECHNIQUES)
+    )
+
+
+def is_over(attacker_hp, defender_hp, round_number):
+    """Battle selesai jika salah satu HP habis atau sudah MAX_ROUNDS round"""
+    return attacker_hp <= 0 or defender_hp <= 0 or round_number >= MAX_ROUNDS
+
+
+def attacker_wins(attacker_hp, defender_hp):
+    """Attacker menang jika masih hidup dan HP-nya tidak lebih rendah dari defender"""
+    return not (attacker_hp <= 0 or defender_hp > attacker_hp)
+
+
+# Replay terkompresi: seed + dua snapshot cukup untuk menghitung ulang seluruh log
+Replay = namedtuple("Replay", ["seed", "attacker", "defender"])
+
+
+def simulate(attacker, defender, seed=None):
+    """Seluruh battle dalam satu pass dengan RNG ber-seed, return list RoundLog
+
+    Seed + snapshot yang sama selalu menghasilkan log yang sama, jadi replay
+    tidak perlu menyimpan log-nya.
+    """
+    rng = random.Random(seed)
+    attacker_hp = defender_hp = MAX_HP
+    logs = []
+    while not is_over(attacker_hp, defender_hp, len(logs)):
+        log = resolve_round(attacker, defender, attacker_hp, defender_hp, len(logs) + 1, rng)
+        attacker_hp, defender_hp = log.attacker_hp, log.defender_hp
+        logs.append(log)
+    return logs
+
+
+def replay_log(replay):
+    """Hitung ulang log dari Replay"""
+    return simulate(replay.attacker, replay.defender, replay.seed)
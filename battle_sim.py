@@ -0,0 +1,161 @@
+import argparse
+import random
+import statistics
+from collections import namedtuple
+
+from battle_engine import (
+    BASE_DAMAGE, MAX_DAMAGE, MAX_HP, MAX_ROUNDS, MIN_DAMAGE,
+    Combatant, attacker_wins, simulate
+)
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+# ===============================
+# Battle simulator - Monte Carlo ribuan PvP sekaligus dengan aturan yang
+# sama dengan battle_engine (sqrt rasio power, cap damage, crit, regen).
+# numpy adalah dependency wajib (pyproject / requirements): semua battle
+# dihitung per round secara vectorized. Fallback battle_engine.simulate
+# hanya jalur darurat jika numpy tidak terinstall - lebih lambat dan
+# jumlah battle dikurangi, jadi odds-nya lebih kasar.
+# ===============================
+SIM_FIGHTS = 10000
+SIM_FALLBACK_FIGHTS = 2000
+_fallback_warned = False
+
+Odds = namedtuple("Odds", ["fights", "attacker_win_rate", "average_rounds", "attacker_hp", "defender_hp"])
+
+
+def _base_damage(own_power, other_power):
+    return BASE_DAMAGE * ((own_power / max(1, other_power)) ** 0.5)
+
+
+def _simulate_numpy(attacker, defender, fights, seed):
+    rng = numpy.random.default_rng(seed)
+    attacker_hp = numpy.full(fights, MAX_HP, dtype=numpy.int64)
+    defender_hp = numpy.full(fights, MAX_HP, dtype=numpy.int64)
+    rounds = numpy.zeros(fights, dtype=numpy.int64)
+    ongoing = numpy.arange(fights)
+
+    att_base = _base_damage(attacker.power, defender.power)
+    def_base = _base_damage(defender.power, attacker.power)
+    att_regen = int(MAX_HP * attacker.regeneration) if attacker.regeneration > 0 else 0
+    def_regen = int(MAX_HP * defender.regeneration) if defender.regeneration > 0 else 0
+
+    for round_number in range(1, MAX_ROUNDS + 1):
+        count = len(ongoing)
+        if not count:
+            break
+        att_dmg = numpy.clip(numpy.floor(att_base * rng.uniform(0.8, 1.2, count)), MIN_DAMAGE, MAX_DAMAGE)
+        def_dmg = numpy.clip(numpy.floor(def_base * rng.uniform(0.8, 1.2, count)), MIN_DAMAGE, MAX_DAMAGE)
+        if attacker.critical > 0:
+            att_dmg = numpy.where(rng.random(count) < attacker.critical, att_dmg * 2, att_dmg)
+        if defender.critical > 0:
+            def_dmg = numpy.where(rng.random(count) < defender.critical, def_dmg * 2, def_dmg)
+
+        att_hp = numpy.minimum(MAX_HP, attacker_hp[ongoing] + att_regen)
+        def_hp = numpy.minimum(MAX_HP, defender_hp[ongoing] + def_regen)
+        att_hp = numpy.maximum(0, att_hp - def_dmg.astype(numpy.int64))
+        def_hp = numpy.maximum(0, def_hp - att_dmg.astype(numpy.int64))
+        attacker_hp[ongoing] = att_hp
+        defender_hp[ongoing] = def_hp
+        rounds[ongoing] = round_number
+        ongoing = ongoing[(att_hp > 0) & (def_hp > 0)]
+
+    wins = (attacker_hp > 0) & (defender_hp <= attacker_hp)
+    return Odds(
+        fights, float(wins.mean()), float(rounds.mean()),
+        float(attacker_hp.mean()), float(defender_hp.mean())
+    )
+
+
+def _simulate_python(attacker, defender, fights, seed):
+    rng = random.Random(seed)
+    wins = rounds = attacker_hp = defender_hp = 0
+    for _ in range(fights):
+        logs = simulate(attacker, defender, rng.getrandbits(32))
+        wins += attacker_wins(logs[-1].attacker_hp, logs[-1].defender_hp)
+        rounds += len(logs)
+        attacker_hp += logs[-1].attacker_hp
+        defender_hp += logs[-1].defender_hp
+    return Odds(fights, wins / fights, rounds / fights, attacker_hp / fights, defender_hp / fights)
+
+
+def simulate_odds(attacker, defender, fights=SIM_FIGHTS, seed=None):
+    """Peluang menang attacker dari `fights` battle acak (Combatant battle_engine)"""
+    global _fallback_warned
+    if numpy is not None:
+        return _simulate_numpy(attacker, defender, fights, seed)
+    if not _fallback_warned:
+        _fallback_warned = True
+        print(f"⚠️ numpy tidak terinstall, battle simulator memakai fallback python (maks {SIM_FALLBACK_FIGHTS} battle)")
+    return _simulate_python(attacker, defender, min(fights, SIM_FALLBACK_FIGHTS), seed)
+
+
+# ---------- balance report ----------
+
+def _bracket(player):
+    """(realm, nama stage tanpa [Entry]/[Middle]/[Peak])"""
+    return player["realm"], player["stage"].split(" [")[0]
+
+
+def balance_report(players, fights=SIM_FIGHTS, seed=None):
+    """Baris report per bracket realm/stage: median power, peluang menang vs bracket berikutnya dan p25 vs p75 dalam bracket"""
+    from progression import PROGRESSION
+
+    powers = {}
+    for player in players.values():
+        if isinstance(player, dict) and (player.get("realm"), player.get("stage")) in PROGRESSION:
+            powers.setdefault(_bracket(player), []).append(player.get("total_power") or 0)
+
+    # Urut sesuai progression (bukan alfabet)
+    order = {}
+    for realm, stage in PROGRESSION:
+        order.setdefault(_bracket({"realm": realm, "stage": stage}), len(order))
+    brackets = sorted(powers, key=order.get)
+
+    rows = []
+    for i, bracket in enumerate(brackets):
+        values = sorted(powers[bracket])
+        median = statistics.median(values)
+        row = {"bracket": bracket, "players": len(values), "median_power": median, "vs_next": None, "p25_vs_p75": None}
+        if i + 1 < len(brackets):
+            next_median = statistics.median(powers[brackets[i + 1]])
+            row["vs_next"] = simulate_odds(Combatant("a", median, 0, 0), Combatant("b", next_median, 0, 0), fights, seed).attacker_win_rate
+        if len(values) >= 4:
+            p25, p75 = values[len(values) // 4], values[(3 * len(values)) // 4]
+            row["p25_vs_p75"] = simulate_odds(Combatant("a", p25, 0, 0), Combatant("b", p75, 0, 0), fights, seed).attacker_win_rate
+        rows.append(row)
+    return rows
+
+
+if __name__ == "__main__":
+    # python battle_sim.py report
+    # python battle_sim.py odds --attacker 12000 --defender 15000
+    from player_store import create_backend
+
+    parser = argparse.ArgumentParser(description="Monte Carlo PvP simulator")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    report_parser = subparsers.add_parser("report", help="Balance report per bracket realm/stage dari data player")
+    report_parser.add_argument("--fights", type=int, default=SIM_FIGHTS)
+    odds_parser = subparsers.add_parser("odds", help="Peluang menang untuk dua nilai power")
+    odds_parser.add_argument("--attacker", type=int, required=True)
+    odds_parser.add_argument("--defender", type=int, required=True)
+    odds_parser.add_argument("--fights", type=int, default=SIM_FIGHTS)
+
+    args = parser.parse_args()
+    if args.command == "odds":
+        odds = simulate_odds(Combatant("a", args.attacker, 0, 0), Combatant("b", args.defender, 0, 0), args.fights)
+        print(f"{odds.fights:,} fights: attacker wins {odds.attacker_win_rate:.1%}, {odds.average_rounds:.1f} rounds avg")
+    elif args.command == "report":
+        rows = balance_report((create_backend().read() or {}).get("players", {}), args.fights)
+        if not rows:
+            print("⚠️ No players to report on")
+        print(f"{'Bracket':<42}{'Players':>8}{'Median':>16}{'vs next':>10}{'p25/p75':>10}")
+        for row in rows:
+            vs_next = "-" if row["vs_next"] is None else f"{row['vs_next']:.1%}"
+            spread = "-" if row["p25_vs_p75"] is None else f"{row['p25_vs_p75']:.1%}"
+            name = " / ".join(row["bracket"])
+            print(f"{name:<42}{row['players']:>8}{row['median_power']:>16,.0f}{vs_next:>10}{spread:>10}")
@@ -0,0 +1,52 @@
+"""Benchmark battle_engine: satu round dan satu battle penuh (tanpa bot / Discord)
+
+Jalankan dari root repo:
+    python benchmarks/bench_battle_engine.py --fights 20000
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from battle_engine import MAX_HP, attacker_wins, is_over, resolve_round, snapshot
+
+
+def fight(attacker, defender, rng):
+    """Satu battle penuh, return (jumlah round, attacker menang)"""
+    attacker_hp = defender_hp = MAX_HP
+    round_number = 0
+    while not is_over(attacker_hp, defender_hp, round_number):
+        round_number += 1
+        log = resolve_round(attacker, defender, attacker_hp, defender_hp, round_number, rng)
+        attacker_hp, defender_hp = log.attacker_hp, log.defender_hp
+    return round_number, attacker_wins(attacker_hp, defender_hp)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark battle_engine")
+    parser.add_argument("--fights", type=int, default=20000)
+    args = parser.parse_args()
+
+    rng = random.Random(42)
+    tiger = {"name": "White Divine Tiger", "bonus": {"attack": 0.50, "critical": 0.30, "speed": 0.40}}
+    attacker = snapshot("1", {"total_power": 12000, "current_beast": tiger["name"], "spirit_beasts": [tiger]})
+    defender = snapshot("2", {"total_power": 15000})
+
+    start = time.perf_counter()
+    rounds = wins = 0
+    for _ in range(args.fights):
+        fight_rounds, won = fight(attacker, defender, rng)
+        rounds += fight_rounds
+        wins += won
+    elapsed = time.perf_counter() - start
+
+    print(f"{args.fights:,} fights, {rounds:,} rounds in {elapsed * 1000:.1f} ms")
+    print(f"  per round {elapsed / rounds * 1e6:.2f} us, per fight {elapsed / args.fights * 1e6:.2f} us")
+    print(f"  attacker win rate {wins / args.fights:.1%}")
+
+
+if __name__ == "__main__":
+    main()
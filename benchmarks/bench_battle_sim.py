@@ -0,0 +1,40 @@
+"""Benchmark battle_sim.simulate_odds (target < 50 ms untuk 10k battle dengan numpy)
+
+Jalankan dari root repo:
+    python benchmarks/bench_battle_sim.py --fights 10000 --repeat 20
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import battle_sim
+from battle_engine import Combatant
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark Monte Carlo PvP simulator")
+    parser.add_argument("--fights", type=int, default=battle_sim.SIM_FIGHTS)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    pairs = {
+        "even": (Combatant("a", 12000, 0, 0), Combatant("b", 12500, 0, 0)),
+        "crit vs regen": (Combatant("a", 12000, 0, 0.30), Combatant("b", 15000, 0.40, 0)),
+    }
+    backend = "numpy" if battle_sim.numpy is not None else "python fallback"
+    print(f"backend: {backend}")
+
+    for name, (attacker, defender) in pairs.items():
+        battle_sim.simulate_odds(attacker, defender, args.fights, seed=0)  # warm-up
+        start = time.perf_counter()
+        for seed in range(args.repeat):
+            odds = battle_sim.simulate_odds(attacker, defender, args.fights, seed=seed)
+        millis = (time.perf_counter() - start) / args.repeat * 1000
+        print(f"  {name:<16}{odds.fights:>8,} fights {millis:>8.1f} ms  win {odds.attacker_win_rate:.1%}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+"""Benchmark tabel progression vs list.index untuk get_exp_cap / get_player_level
+
+Jalankan dari root repo:
+    python benchmarks/bench_progression.py --repeat 200000
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from progression import PROGRESSION, RACES, REALMS, REALM_ORDER, get_exp_cap, get_player_level
+
+
+def legacy_player_level(p):
+    """Cara lama: dua list.index + lookup race setiap panggilan"""
+    realm_idx = REALM_ORDER.index(p["realm"])
+    stage_idx = REALMS[p["realm"]]["stages"].index(p["stage"])
+    base_level = (realm_idx * 100) + (stage_idx * 3) + 1
+    race_data = RACES.get(p.get("race", "human"), RACES["human"])
+    if "exp" in race_data["bonuses"]:
+        base_level = int(base_level * (1 + race_data["bonuses"]["exp"]))
+    return base_level
+
+
+def legacy_exp_cap(p):
+    """Cara lama: list.index + pangkat float setiap panggilan"""
+    realm_name = p.get("realm", "Mortal Realm")
+    realm_data = REALMS.get(realm_name)
+    if not realm_data:
+        return 1000
+    try:
+        stage_idx = realm_data["stages"].index(p.get("stage"))
+    except ValueError:
+        stage_idx = 0
+    realm_idx = REALM_ORDER.index(realm_name)
+    req = int(1000 * (1.5 ** (stage_idx + 1)) * (10 ** (realm_idx if realm_idx < 1 else realm_idx + 1)) * realm_data.get("exp_multiplier", 1.0))
+    return max(req, 1000)
+
+
+def timed(func, players, repeat):
+    """Waktu rata-rata satu panggilan dalam nanodetik"""
+    count = len(players)
+    start = time.perf_counter()
+    for i in range(repeat):
+        func(players[i % count])
+    return (time.perf_counter() - start) / repeat * 1e9
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark tabel progression vs list.index")
+    parser.add_argument("--repeat", type=int, default=200000)
+    args = parser.parse_args()
+
+    rng = random.Random(42)
+    stages = list(PROGRESSION)
+    players = [
+        {"realm": realm, "stage": stage, "race": rng.choice(list(RACES))}
+        for realm, stage in (rng.choice(stages) for _ in range(1000))
+    ]
+
+    # Hasil tabel harus sama dengan perhitungan lama
+    for p in players:
+        assert get_player_level(p) == legacy_player_level(p)
+        assert get_exp_cap(p) == legacy_exp_cap(p)
+
+    late = [p for p in players if p["realm"] == REALM_ORDER[-1]]
+    results = {
+        "level (index)": timed(legacy_player_level, players, args.repeat),
+        "level (table)": timed(get_player_level, players, args.repeat),
+        "exp cap (index)": timed(legacy_exp_cap, players, args.repeat),
+        "exp cap (table)": timed(get_exp_cap, players, args.repeat),
+        "exp cap late (index)": timed(legacy_exp_cap, late, args.repeat),
+        "exp cap late (table)": timed(get_exp_cap, late, args.repeat),
+    }
+    print(f"{len(PROGRESSION)} stages, {args.repeat:,} calls")
+    for name, nanos in results.items():
+        print(f"  {name:<22}{nanos:>10,.0f} ns")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+"""Benchmark RankIndex vs sort per request untuk leaderboard / myrank
+
+Jalankan dari root repo:
+    python benchmarks/bench_rank_index.py --sizes 1000 10000 100000
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from player_store import RANK_INDEX_KEYS
+from rank_index import RankIndex
+
+
+def make_players(count, seed=42):
+    rng = random.Random(seed)
+    return {
+        str(10 ** 17 + i): {"total_power": rng.randint(10, 10 ** 7), "pvp_wins": 0, "pvp_losses": 0}
+        for i in range(count)
+    }
+
+
+def sort_page(players, offset, limit):
+    """Cara lama: sort semua player setiap command"""
+    ranked = sorted(players.items(), key=lambda x: x[1]["total_power"], reverse=True)
+    return [uid for uid, _ in ranked[offset:offset + limit]]
+
+
+def sort_rank(players, player_id):
+    """Cara lama myrank: sort lalu scan linear"""
+    ranked = sorted(players.items(), key=lambda x: x[1]["total_power"], reverse=True)
+    for rank, (uid, _) in enumerate(ranked, start=1):
+        if uid == player_id:
+            return rank
+    return None
+
+
+def timed(func, repeat):
+    """Waktu rata-rata satu panggilan dalam mikrodetik"""
+    start = time.perf_counter()
+    for _ in range(repeat):
+        func()
+    return (time.perf_counter() - start) / repeat * 1e6
+
+
+def bench(count, repeat):
+    rng = random.Random(7)
+    players = make_players(count)
+    ids = list(players)
+
+    start = time.perf_counter()
+    index = RankIndex(RANK_INDEX_KEYS["power"])
+    index.rebuild(players)
+    build_ms = (time.perf_counter() - start) * 1000
+
+    def update():
+        player_id = rng.choice(ids)
+        players[player_id]["total_power"] += rng.randint(1, 1000)
+        index.update(player_id, players[player_id])
+
+    sort_repeat = max(1, repeat // 100)
+    target = rng.choice(ids)
+    middle = count // 2
+    results = {
+        "page (sort)": timed(lambda: sort_page(players, middle, 10), sort_repeat),
+        "page (index)": timed(lambda: index.page(middle, 10), repeat),
+        "rank (sort)": timed(lambda: sort_rank(players, target), sort_repeat),
+        "rank (index)": timed(lambda: index.rank(target), repeat),
+        "update (index)": timed(update, repeat),
+    }
+
+    # Pastikan index tetap sama dengan hasil sort setelah update acak
+    assert index.page(0, 10) == sort_page(players, 0, 10)
+    return build_ms, results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark RankIndex vs sort per request")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 100000])
+    parser.add_argument("--repeat", type=int, default=2000)
+    args = parser.parse_args()
+
+    for count in args.sizes:
+        build_ms, results = bench(count, args.repeat)
+        print(f"{count:,} players (build index {build_ms:.1f} ms)")
+        for name, micros in results.items():
+            print(f"  {name:<16}{micros:>14,.1f} us")
+        print()
+
+
+if __name__ == "__main__":
+    main()
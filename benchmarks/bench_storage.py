@@ -0,0 +1,135 @@
+"""Benchmark format penyimpanan PLAYER_STORE dan kompresi backup
+
+Jalankan dari root repo:
+    python benchmarks/bench_storage.py --players 10000 --repeat 3
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import player_store
+from player_store import encode_json, _write_atomic
+from backup_engine import compress_backup, zstandard
+
+ELEMENTS = ["fire", "water", "earth", "wind", "lightning", "ice", "light", "dark"]
+TYPES = ["attack", "defense", "support", "movement"]
+DESCRIPTIONS = [
+    "Amplifies {element} cultivation speed",
+    "Teleports through {element} space",
+    "Cuts through space itself with condensed {element} qi",
+    "Forms an impenetrable barrier of {element} energy around the cultivator",
+]
+
+
+def make_player(rng, player_id):
+    """Satu player sintetis dengan bentuk yang sama seperti create_new_player + techniques"""
+    techniques = []
+    for i in range(rng.randint(2, 8)):
+        element = rng.choice(ELEMENTS)
+        technique_type = rng.choice(TYPES)
+        techniques.append({
+            "id": f"{technique_type}_{element}_{rng.randint(1000, 9999)}",
+            "name": f"Technique {i}",
+            "sect": "primordial_dao",
+            "type": technique_type,
+            "element": element,
+            "power_bonus": round(rng.uniform(0.1, 0.9), 2),
+            "description": rng.choice(DESCRIPTIONS).format(element=element),
+            "cost": rng.randint(100, 900),
+            "emoji": "💫",
+            "element_emoji": "🔥",
+            "requirements": {"realm": "Mortal Realm", "stage": "Yuan Sea [Peak]"}
+        })
+
+    return {
+        "realm": "Mortal Realm",
+        "stage": "Body Refining [Entry]",
+        "exp": rng.randint(0, 10 ** 9),
+        "qi": rng.randint(0, 10 ** 6),
+        "spirit_stones": rng.randint(0, 10 ** 5),
+        "equipment": {f"item_{i}": rng.randint(5, 2500) for i in range(rng.randint(0, 4))},
+        "techniques": techniques,
+        "current_technique": None,
+        "guild": None,
+        "base_power": rng.randint(10, 10 ** 6),
+        "total_power": rng.randint(10, 10 ** 7),
+        "pvp_wins": rng.randint(0, 500),
+        "pvp_losses": rng.randint(0, 500),
+        "spirit_beasts": [],
+        "inventory": {"spirit_herb": rng.randint(0, 50), "spirit_water": 0, "spirit_crystal": 0},
+        "achievements": ["first_steps"],
+        "race": "human",
+        "gender": "male",
+        "display_name": f"player_{player_id}",
+        "created_at": "2025-01-01T00:00:00",
+        "last_updated": "2025-01-01T00:00:00",
+        "daily_quests": {"cultivate": {"progress": 0, "completed": False, "claimed": False}},
+    }
+
+
+def make_dataset(players, seed=42):
+    rng = random.Random(seed)
+    return {
+        "players": {str(10 ** 17 + i): make_player(rng, i) for i in range(players)},
+        "total_players": players,
+        "guilds": {},
+        "server_stats": {"total_pvp_battles": 0},
+        "world_bosses": {},
+    }
+
+
+def bench_format(data, fmt, path, repeat):
+    """Waktu rata-rata encode + tulis atomik (sama seperti satu save_data di backend json)"""
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        _write_atomic(path, encode_json(data, fmt))
+        timings.append(time.perf_counter() - start)
+    return os.path.getsize(path), min(timings)
+
+
+def bench_compression(raw, compression, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        compressed = compress_backup(raw, compression)
+        timings.append(time.perf_counter() - start)
+    return len(compressed), min(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark format penyimpanan dan kompresi backup")
+    parser.add_argument("--players", type=int, default=10000)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    data = make_dataset(args.players)
+    print(f"Dataset: {args.players} players")
+    print(f"orjson: {'yes' if player_store.orjson else 'no (fast = compact json)'}")
+    print()
+
+    print(f"{'format':<10}{'bytes':>14}{'ms/save':>12}")
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "data.json")
+        for fmt in ("pretty", "compact", "fast"):
+            size, seconds = bench_format(data, fmt, path, args.repeat)
+            print(f"{fmt:<10}{size:>14,}{seconds * 1000:>12.1f}")
+
+    print()
+    print(f"{'backup':<10}{'bytes':>14}{'ms':>12}   (dari data.json pretty)")
+    raw = encode_json(data, "pretty").encode("utf-8")
+    compressions = ["none", "gzip"] + (["zstd"] if zstandard else [])
+    for compression in compressions:
+        size, seconds = bench_compression(raw, compression, args.repeat)
+        print(f"{compression:<10}{size:>14,}{seconds * 1000:>12.1f}")
+    if not zstandard:
+        print("zstd      (skip, package zstandard belum terinstall)")
+
+
+if __name__ == "__main__":
+    main()
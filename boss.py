@@ -3,7 +3,10 @@ import random
 import asyncio
 import time
 import math
-from utils import load_data, save_data, calculate_set_bonus
+from utils import load_data, save_player, calculate_set_bonus
+from player_store import player_txn
+from derived_stats import DERIVED_STATS
+from engagements import ENGAGEMENTS, busy_message
 
 # ===============================
 # BOSS DATA - REWARD EXP DIATAS 500.000! NO LEVEL REQUIREMENT!
@@ -232,7 +235,7 @@ def update_player(player_id, player_data):
     """Update player data melalui utils"""
     data = load_data()
     data["players"][str(player_id)] = player_data
-    return save_data(data)
+    return save_player(player_id)
 
 async def list_bosses(ctx):
     """List semua boss yang available"""
@@ -320,34 +323,41 @@ async def challenge_boss(ctx, boss_name):
         minutes = int((cooldown_remaining % 3600) // 60)
         return await ctx.send(f"⏰ Boss masih cooldown! Coba lagi dalam {hours} jam {minutes} menit.")
     
-    # Check if already in battle
+    # Check if already in battle (boss, PvP, world boss, dll)
     battle_id = f"boss_{player_id}"
-    if battle_id in ACTIVE_BOSS_BATTLES:
-        return await ctx.send("❌ Anda sudah sedang dalam boss battle!")
-    
-    # Start boss battle
-    ACTIVE_BOSS_BATTLES[battle_id] = {
-        "player_id": player_id,
-        "boss_name": boss_data["name"],
-        "boss_data": boss_data,
-        "boss_health": boss_data["health"],
-        "player_health": 1000 + (p.get("total_power", 0) // 100), # Boost player health based on power
-        "max_player_health": 1000 + (p.get("total_power", 0) // 100),
-        "phase": 1,
-        "round": 0,
-        "start_time": current_time,
-        "message": None,
-        "log": []
-    }
-    
-    # Add battle log
-    ACTIVE_BOSS_BATTLES[battle_id]["log"].append(f"⚔️ Battle dimulai! {ctx.author.name} vs {boss_data['name']}")
-    
-    # Kirim battle embed
-    embed = create_boss_battle_embed(battle_id, ctx)
-    message = await ctx.send(embed=embed)
-    ACTIVE_BOSS_BATTLES[battle_id]["message"] = message
+    conflict = ENGAGEMENTS.claim("boss", battle_id, player_id)
+    if conflict:
+        return await ctx.send(busy_message(conflict))
     
+    try:
+        # Start boss battle
+        ACTIVE_BOSS_BATTLES[battle_id] = {
+            "player_id": player_id,
+            "boss_name": boss_data["name"],
+            "boss_data": boss_data,
+            "boss_health": boss_data["health"],
+            "player_health": 1000 + (p.get("total_power", 0) // 100), # Boost player health based on power
+            "max_player_health": 1000 + (p.get("total_power", 0) // 100),
+            "phase": 1,
+            "round": 0,
+            "start_time": current_time,
+            "message": None,
+            "log": []
+        }
+
+        # Add battle log
+        ACTIVE_BOSS_BATTLES[battle_id]["log"].append(f"⚔️ Battle dimulai! {ctx.author.name} vs {boss_data['name']}")
+
+        # Kirim battle embed
+        embed = create_boss_battle_embed(battle_id, ctx)
+        message = await ctx.send(embed=embed)
+        ACTIVE_BOSS_BATTLES[battle_id]["message"] = message
+    except Exception:
+        # Task belum jalan, jadi finally-nya tidak akan melepas kunci player
+        ACTIVE_BOSS_BATTLES.pop(battle_id, None)
+        ENGAGEMENTS.release("boss", battle_id, player_id)
+        raise
+
     # Start battle task
     asyncio.create_task(boss_battle_task(battle_id, ctx))
 
@@ -430,6 +440,7 @@ async def boss_battle_task(battle_id, ctx):
     finally:
         if battle_id in ACTIVE_BOSS_BATTLES:
             del ACTIVE_BOSS_BATTLES[battle_id]
+        ENGAGEMENTS.release("boss", battle_id, ctx.author.id)
 
 async def boss_battle_round(battle_id, ctx):
     """Satu round boss battle"""
@@ -441,7 +452,7 @@ async def boss_battle_round(battle_id, ctx):
     
     # Player attack
     p = get_player(player_id)
-    player_damage = calculate_player_damage(p, boss_data)
+    player_damage = calculate_player_damage(p, boss_data, DERIVED_STATS.get(player_id, p)["beast_profile"])
     battle_data["boss_health"] = max(0, battle_data["boss_health"] - player_damage)
     
     # Add to log
@@ -476,8 +487,8 @@ async def boss_battle_round(battle_id, ctx):
     except:
         pass
 
-def calculate_player_damage(player_data, boss_data):
-    """Hitung damage player ke boss"""
+def calculate_player_damage(player_data, boss_data, beast=None):
+    """Hitung damage player ke boss; beast = BeastProfile (critical beast aktif)"""
     base_damage = player_data["total_power"]
     
     # Element advantage
@@ -487,6 +498,10 @@ def calculate_player_damage(player_data, boss_data):
     
     # Random variation
     damage = random.randint(int(base_damage * 0.8), int(base_damage * 1.2))
+
+    # Critical hit beast aktif (White Divine Tiger dll), sama seperti PvP
+    if beast is not None and beast.critical > 0 and random.random() < beast.critical:
+        damage *= 2
     return max(10, damage)
 
 def calculate_boss_damage(boss_data, phase):
@@ -562,74 +577,68 @@ async def finish_boss_battle(battle_id, ctx, victory):
     player_id = battle_data["player_id"]
     boss_data = battle_data["boss_data"]
     
-    p = get_player(player_id)
-    
-    if victory:
-        # VICTORY REWARDS
-        rewards = {
-            "exp": boss_data["reward_exp"],
-            "qi": boss_data["reward_qi"],
-            "spirit_stones": boss_data["reward_stones"]
-        }
+    async with player_txn(player_id, stats=True) as (p, stats):
+        if victory:
+            # VICTORY REWARDS
+            rewards = {
+                "exp": boss_data["reward_exp"],
+                "qi": boss_data["reward_qi"],
+                "spirit_stones": boss_data["reward_stones"]
+            }
         
-        p["exp"] += rewards["exp"]
-        p["qi"] += rewards["qi"]
-        p["spirit_stones"] += rewards["spirit_stones"]
+            p["exp"] += rewards["exp"]
+            p["qi"] += rewards["qi"]
+            p["spirit_stones"] += rewards["spirit_stones"]
         
-        # Track boss defeat
-        if "bosses_defeated" not in p:
-            p["bosses_defeated"] = []
-        if boss_data["name"] not in p["bosses_defeated"]:
-            p["bosses_defeated"].append(boss_data["name"])
+            # Track boss defeat
+            if "bosses_defeated" not in p:
+                p["bosses_defeated"] = []
+            if boss_data["name"] not in p["bosses_defeated"]:
+                p["bosses_defeated"].append(boss_data["name"])
         
-        # Set cooldown
-        if "last_boss_challenge" not in p:
-            p["last_boss_challenge"] = {}
-        p["last_boss_challenge"][boss_data["name"]] = time.time()
+            # Set cooldown
+            if "last_boss_challenge" not in p:
+                p["last_boss_challenge"] = {}
+            p["last_boss_challenge"][boss_data["name"]] = time.time()
         
-        # Random loot
-        loot = get_boss_loot(boss_data["name"])
-        if loot:
-            p["inventory"][loot["id"]] = p["inventory"].get(loot["id"], 0) + 1
+            # Random loot
+            loot = get_boss_loot(boss_data["name"])
+            if loot:
+                p["inventory"][loot["id"]] = p["inventory"].get(loot["id"], 0) + 1
         
-        # Update player
-        update_player(player_id, p)
+            # Update server stats (player + stats di-commit sekali saat keluar dari txn)
+            stats["bosses_defeated"] = stats.get("bosses_defeated", 0) + 1
         
-        # Update server stats
-        data = load_data()
-        data["server_stats"]["bosses_defeated"] = data["server_stats"].get("bosses_defeated", 0) + 1
-        save_data(data)
+            # Victory embed
+            embed = discord.Embed(
+                title=f"🎉 LEGENDARY VICTORY! {boss_data['name']} Defeated!",
+                description=f"{ctx.author.mention} berhasil mengalahkan {boss_data['emoji']} {boss_data['name']}!",
+                color=0x00ff00
+            )
         
-        # Victory embed
-        embed = discord.Embed(
-            title=f"🎉 LEGENDARY VICTORY! {boss_data['name']} Defeated!",
-            description=f"{ctx.author.mention} berhasil mengalahkan {boss_data['emoji']} {boss_data['name']}!",
-            color=0x00ff00
-        )
-        
-        reward_text = f"EXP: +{rewards['exp']:,}\nQi: +{rewards['qi']}\nSpirit Stones: +{rewards['spirit_stones']}"
-        if loot:
-            reward_text += f"\n🎁 **RARE LOOT:** {loot['emoji']} {loot['name']}"
+            reward_text = f"EXP: +{rewards['exp']:,}\nQi: +{rewards['qi']}\nSpirit Stones: +{rewards['spirit_stones']}"
+            if loot:
+                reward_text += f"\n🎁 **RARE LOOT:** {loot['emoji']} {loot['name']}"
         
-        embed.add_field(name="💰 REWARDS", value=reward_text, inline=False)
-        embed.add_field(name="⏰ Cooldown", value="Bisa challenge lagi dalam 24 jam", inline=True)
-        embed.add_field(name="🏆 Total Wins", value=f"{len(p.get('bosses_defeated', []))} bosses", inline=True)
+            embed.add_field(name="💰 REWARDS", value=reward_text, inline=False)
+            embed.add_field(name="⏰ Cooldown", value="Bisa challenge lagi dalam 24 jam", inline=True)
+            embed.add_field(name="🏆 Total Wins", value=f"{len(p.get('bosses_defeated', []))} bosses", inline=True)
         
-    else:
-        # DEFEAT
-        embed = discord.Embed(
-            title=f"💀 DEFEAT! {boss_data['name']} Wins!",
-            description=f"{ctx.author.mention} dikalahkan oleh {boss_data['emoji']} {boss_data['name']}!",
-            color=0xff0000
-        )
+        else:
+            # DEFEAT
+            embed = discord.Embed(
+                title=f"💀 DEFEAT! {boss_data['name']} Wins!",
+                description=f"{ctx.author.mention} dikalahkan oleh {boss_data['emoji']} {boss_data['name']}!",
+                color=0xff0000
+            )
         
-        embed.add_field(name="💡 Tips", value="• Level up lebih tinggi\n• Gunakan element advantage\n• Upgrade equipment\n• Pelajari technique baru", inline=False)
-        embed.add_field(name="⏰ Cooldown", value="Bisa coba lagi dalam 1 jam", inline=True)
+            embed.add_field(name="💡 Tips", value="• Level up lebih tinggi\n• Gunakan element advantage\n• Upgrade equipment\n• Pelajari technique baru", inline=False)
+            embed.add_field(name="⏰ Cooldown", value="Bisa coba lagi dalam 1 jam", inline=True)
         
-        # Shorter cooldown for defeat
-        if "last_boss_challenge" not in p:
-            p["last_boss_challenge"] = {}
-        p["last_boss_challenge"][boss_data["name"]] = time.time() - 82800
+            # Shorter cooldown for defeat
+            if "last_boss_challenge" not in p:
+                p["last_boss_challenge"] = {}
+            p["last_boss_challenge"][boss_data["name"]] = time.time() - 82800
     
     try:
         await battle_data["message"].edit(embed=embed)
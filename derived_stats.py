@@ -0,0 +1,141 @@
+# ===============================
+# Derived stats - nilai turunan player (multiplier teknik, set bonus,
+# power equipment, bonus race & spirit beast) di-cache per player.
+# Cache hanya dihitung ulang saat version counter equipment / techniques /
+# beasts / race naik, jadi loop cultivation & battle cukup O(1).
+# ===============================
+from collections import namedtuple
+
+STAT_PARTS = ("equipment", "techniques", "beasts", "race")
+
+# Profil spirit beast player: regen & crit dari beast aktif, multiplier dari semua beast
+BeastProfile = namedtuple("BeastProfile", ["name", "regeneration", "critical", "exp", "qi", "power"])
+
+
+def beast_multipliers(beasts):
+    """Multiplier (exp, qi, power) dari semua spirit beast yang dimiliki"""
+    exp_bonus = qi_bonus = power_bonus = 1.0
+    for beast in beasts:
+        for bonus_type, bonus_value in beast.get("bonus", {}).items():
+            if bonus_type == "exp":
+                exp_bonus += bonus_value
+            elif bonus_type in ["qi", "spiritual_energy"]:
+                qi_bonus += bonus_value
+            elif bonus_type in ["power", "attack"]:
+                power_bonus += bonus_value
+            elif bonus_type == "all":
+                exp_bonus += bonus_value
+                qi_bonus += bonus_value
+                power_bonus += bonus_value
+            elif bonus_type == "defense":
+                power_bonus += bonus_value * 0.5  # Defense helps power slightly
+            elif bonus_type == "critical":
+                power_bonus += bonus_value * 0.8  # Crit is very strong
+    return exp_bonus, qi_bonus, power_bonus
+
+
+def beast_profile(player):
+    """BeastProfile player: satu scan roster untuk beast aktif dan multiplier"""
+    beasts = player.get("spirit_beasts") or []
+    current = player.get("current_beast")
+    active = {}
+    if current:
+        for beast in beasts:
+            if beast["name"] == current:
+                active = beast.get("bonus", {})
+                break
+    return BeastProfile(
+        current if active else None,
+        active.get("regeneration", 0),
+        active.get("critical", 0),
+        *beast_multipliers(beasts)
+    )
+
+
+class DerivedStats:
+    """Cache stats turunan per player
+
+    invalidate(uid, part) dipanggil setiap equipment/techniques/beasts/race
+    berubah. Selain version counter, key cache juga memuat fingerprint O(1)
+    (jumlah item, race, beast aktif) sebagai pengaman untuk mutasi yang lupa
+    memanggil invalidate. Identitas object tidak dipakai, jadi view
+    peek_player (MappingProxyType / salinan lazy) tetap kena cache; data yang
+    diganti utuh (reload / save_data) membuang cache lewat reset().
+    """
+
+    def __init__(self):
+        self.versions = {}  # uid -> {part: version}
+        self.cache = {}  # uid -> (key, stats)
+        self._set_bonus = None
+        self._races = None
+
+    def configure(self, set_bonus, races):
+        """Pasang calculate_set_bonus dan tabel RACES (didefinisikan di main)"""
+        self._set_bonus = set_bonus
+        self._races = races
+
+    def invalidate(self, user_id, *parts):
+        """Naikkan version counter bagian yang berubah (tanpa parts = semua bagian)"""
+        versions = self.versions.setdefault(str(user_id), {})
+        for part in parts or STAT_PARTS:
+            versions[part] = versions.get(part, 0) + 1
+
+    def observe(self, player_id, player):
+        """Listener PLAYER_STORE.mark_player: buang cache player yang dihapus"""
+        if player is None:
+            self.cache.pop(player_id, None)
+            self.versions.pop(player_id, None)
+
+    def reset(self):
+        """Listener PLAYER_STORE reset: data diganti utuh (reload / save_data), buang semua cache"""
+        self.cache.clear()
+
+    def _fingerprint(self, p):
+        return (
+            len(p.get("equipment") or {}),
+            len(p.get("techniques") or []),
+            len(p.get("spirit_beasts") or []),
+            p.get("current_beast"),
+            p.get("race")
+        )
+
+    def _compute(self, p):
+        equipment = p.get("equipment") or {}
+        race_data = self._races.get(p.get("race", "human"), self._races["human"])
+        return {
+            "technique_multiplier": 1 + sum(t["power_bonus"] for t in p.get("techniques") or []),
+            "set_bonus": self._set_bonus(equipment),
+            "equipment_power": sum(equipment.values()),
+            "race_bonuses": race_data["bonuses"],
+            "beast_profile": beast_profile(p)
+        }
+
+    def get(self, user_id, p):
+        """Stats turunan player dari cache, dihitung ulang hanya jika key berubah"""
+        user_id = str(user_id)
+        versions = self.versions.get(user_id, {})
+        key = (tuple(versions.get(part, 0) for part in STAT_PARTS), self._fingerprint(p))
+        entry = self.cache.get(user_id)
+        if entry is not None and entry[0] == key:
+            return entry[1]
+        stats = self._compute(p)
+        self.cache[user_id] = (key, stats)
+        return stats
+
+    def total_power(self, user_id, p, base_power=None):
+        """Rumus total_power tunggal: (base + equipment) * multiplier teknik * (1 + set bonus)
+
+        base_power: pengganti p["base_power"] (mis. preview tanpa mengubah data player).
+        """
+        stats = self.get(user_id, p)
+        if base_power is None:
+            base_power = p["base_power"]
+        return int((base_power + stats["equipment_power"]) * stats["technique_multiplier"] * (1 + stats["set_bonus"]))
+
+    def refresh_power(self, user_id, p):
+        """Hitung ulang p["total_power"] (setelah base_power atau stats berubah)"""
+        p["total_power"] = self.total_power(user_id, p)
+        return p["total_power"]
+
+
+DERIVED_STATS = DerivedStats()
@@ -0,0 +1,82 @@
+import time
+from collections import namedtuple
+
+# ===============================
+# Engagement registry - satu aktivitas combat/eksplorasi per player.
+# PvP, boss, world boss, treasure hunt, formation dan AI exploration
+# mengunci player di sini sebelum kirim message / ubah data, jadi
+# challenge terbalik (B vs A saat A vs B jalan) atau boss + world boss
+# bersamaan langsung ditolak. Claim tidak pernah await, jadi cek + kunci
+# atomic di event loop.
+# ===============================
+ACTIVITY_NAMES = {
+    "pvp": "PvP battle",
+    "boss": "boss battle",
+    "world_boss": "world boss battle",
+    "treasure_hunt": "treasure hunt",
+    "formation": "cultivation formation",
+    "exploration": "AI exploration",
+}
+
+# until: timestamp kunci habis sendiri (aktivitas berbasis durasi), None = sampai di-release
+Engagement = namedtuple("Engagement", ["user_id", "activity", "handle", "until"])
+
+
+def busy_message(engagement):
+    """Pesan penolakan untuk engagement yang bentrok"""
+    activity = ACTIVITY_NAMES.get(engagement.activity, engagement.activity)
+    return f"⏳ <@{engagement.user_id}> masih dalam {activity}! Selesaikan dulu sebelum memulai aktivitas lain."
+
+
+class EngagementRegistry:
+    """player id -> Engagement, semua operasi O(1) per player"""
+
+    def __init__(self):
+        self.engaged = {}  # str uid -> Engagement
+
+    def get(self, user_id, now=None):
+        """Engagement player yang masih berlaku (yang sudah lewat `until` dibuang)"""
+        user_id = str(user_id)
+        engagement = self.engaged.get(user_id)
+        if engagement is not None and engagement.until is not None:
+            if engagement.until <= (time.time() if now is None else now):
+                del self.engaged[user_id]
+                return None
+        return engagement
+
+    def busy(self, *user_ids):
+        """Engagement pertama di antara user_ids (None jika semua bebas)"""
+        for user_id in user_ids:
+            engagement = self.get(user_id)
+            if engagement is not None:
+                return engagement
+        return None
+
+    def claim(self, activity, handle, *user_ids, until=None):
+        """Kunci semua user_ids sekaligus
+
+        Return Engagement yang bentrok (tidak ada yang dikunci) atau None jika berhasil.
+        """
+        conflict = self.busy(*user_ids)
+        if conflict is not None:
+            return conflict
+        for user_id in user_ids:
+            self.engaged[str(user_id)] = Engagement(str(user_id), activity, handle, until)
+        return None
+
+    def extend(self, activity, handle, until, *user_ids):
+        """Ganti `until` user_ids yang memegang (activity, handle), mis. formation mulai aktif"""
+        for user_id in user_ids:
+            engagement = self.engaged.get(str(user_id))
+            if engagement is not None and engagement[1:3] == (activity, handle):
+                self.engaged[str(user_id)] = engagement._replace(until=until)
+
+    def release(self, activity, handle, *user_ids):
+        """Lepas kunci user_ids yang masih memegang (activity, handle); aktivitas lain tidak tersentuh"""
+        for user_id in user_ids:
+            engagement = self.engaged.get(str(user_id))
+            if engagement is not None and engagement[1:3] == (activity, handle):
+                del self.engaged[str(user_id)]
+
+
+ENGAGEMENTS = EngagementRegistry()
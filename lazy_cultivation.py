@@ -0,0 +1,122 @@
+import random
+import time
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+# ===============================
+# Lazy idle cultivation - saat mulai hanya start_time, rate dan seed RNG
+# yang disimpan di data player; gain dihitung sekaligus (closed form)
+# saat player dibaca, berhenti, atau mencapai EXP cap
+# ===============================
+LAZY_CULTIVATION_KEY = "idle_cultivation"
+
+# Stream RNG terpisah per jenis gain agar hasilnya tidak saling mempengaruhi
+STREAM_QI, STREAM_POWER, STREAM_SPIRIT_STONES = 1, 2, 3
+
+# Ukuran chunk draw fallback tanpa numpy (membatasi memori untuk downtime panjang)
+DRAW_CHUNK = 100000
+
+
+def new_state(rates, now=None):
+    """State yang disimpan di player[LAZY_CULTIVATION_KEY] saat cultivation dimulai"""
+    return {
+        "start": time.time() if now is None else now,
+        "ticks": 0,
+        "seed": random.getrandbits(32),
+        "rates": rates,
+        "gained": 0
+    }
+
+
+def _seed(state, stream):
+    """Seed deterministik per (seed, tick yang sudah dihitung, stream)"""
+    return (state["seed"] << 40) ^ (state["ticks"] << 4) ^ stream
+
+
+def sum_draws(seed, count, low, high, bonus=0):
+    """Jumlah `count` kali randint(low, high), tiap draw dikali (1 + bonus) lalu dibulatkan ke bawah
+
+    Dengan numpy semua draw dibuat sekaligus (vectorized). Tanpa numpy tetap
+    exact (distribusi sama dengan loop per tick): draw diambil per chunk
+    lewat random.choices dari tabel nilai yang sudah dikali bonus.
+    """
+    if count <= 0:
+        return 0
+    if numpy is not None:
+        draws = numpy.random.default_rng(seed).integers(low, high + 1, size=count)
+        if bonus:
+            draws = numpy.floor(draws * (1 + bonus)).astype(numpy.int64)
+        return int(draws.sum())
+
+    rng = random.Random(seed)
+    values = [int(v * (1 + bonus)) for v in range(low, high + 1)]
+    total = 0
+    while count > 0:
+        chunk = min(count, DRAW_CHUNK)
+        total += sum(rng.choices(values, k=chunk))
+        count -= chunk
+    return total
+
+
+def settle(p, exp_cap, tick=1.0, now=None):
+    """Terapkan semua tick yang belum dihitung ke data player, return jumlah tick yang diterapkan
+
+    Tick berhenti dihitung begitu EXP cap tercapai (sama seperti loop per detik).
+    total_power tidak dihitung di sini, caller yang menghitung ulang.
+    """
+    state = p.get(LAZY_CULTIVATION_KEY)
+    if not state:
+        return 0
+
+    elapsed = int(((time.time() if now is None else now) - state["start"]) // tick)
+    pending = elapsed - state["ticks"]
+    if pending <= 0:
+        return 0
+
+    rates = state["rates"]
+    room = max(0, exp_cap - p["exp"])
+    if rates["exp"] > 0:
+        count = min(pending, -(-room // rates["exp"]))
+    else:
+        count = pending if room else 0
+    if count <= 0:
+        return 0
+
+    gain = min(count * rates["exp"], room)
+    p["exp"] += gain
+    p["qi"] += sum_draws(_seed(state, STREAM_QI), count, *rates["qi"], bonus=rates.get("qi_bonus", 0))
+    p["base_power"] += sum_draws(_seed(state, STREAM_POWER), count, *rates["power"])
+    p["spirit_stones"] += sum_draws(_seed(state, STREAM_SPIRIT_STONES), count, *rates["spirit_stones"])
+
+    # Update daily quest progress (satu progress per tick)
+    quest = p["daily_quests"].get("cultivate_5")
+    if quest is not None:
+        quest["progress"] += count
+        if quest["progress"] >= quest.get("progress_needed", 5):
+            quest["completed"] = True
+
+    state["ticks"] += count
+    state["gained"] += gain
+    return count
+
+
+def rerate(p, rates, exp_cap, tick=1.0, now=None):
+    """Settle tick tertunda dengan rate lama, lalu tick berikutnya memakai `rates`
+
+    Return jumlah tick yang di-settle (caller menghitung ulang total_power jika > 0).
+    """
+    state = p[LAZY_CULTIVATION_KEY]
+    settled = settle(p, exp_cap, tick, now)
+    state["rates"] = rates
+    return settled
+
+
+def ticks_until_cap(p, exp_cap):
+    """Sisa tick sampai EXP cap, None jika rate EXP 0"""
+    rates = p[LAZY_CULTIVATION_KEY]["rates"]
+    if rates["exp"] <= 0:
+        return None
+    return -(-max(0, exp_cap - p["exp"]) // rates["exp"])
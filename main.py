@@ -5,6 +5,7 @@ import json
 import random
 import asyncio
 import datetime
+from types import MappingProxyType
 import shutil
 import time
 import math
@@ -72,7 +73,19 @@ if not BOT_TOKEN:
 # ===============================
 # Import dari utils instead of circular import
 # ===============================
-from utils import load_data, save_data, calculate_set_bonus
+from utils import load_data, save_data, save_player, save_section, bump_server_stat, calculate_set_bonus, backup_data
+from player_store import PLAYER_STORE, PVP_MIN_MATCHES, player_txn
+from name_resolver import NAME_RESOLVER
+from power_stats import POWER_STATS
+from backup_engine import BACKUP_ENGINE, parse_backup_time
+from schema import migrate_data
+from lazy_cultivation import LAZY_CULTIVATION_KEY, new_state as new_lazy_state, rerate as rerate_lazy, settle as settle_lazy, ticks_until_cap
+from session_state import SESSION_STATE
+from derived_stats import DERIVED_STATS
+from engagements import ENGAGEMENTS, busy_message
+from battle_sim import simulate_odds
+from battle_engine import Combatant, snapshot as combatant_snapshot, resolve_round, is_over, attacker_wins, simulate, replay_log, Replay
+from progression import RACES, REALMS, REALM_ORDER, PROGRESSION, stage_info, get_exp_cap, get_player_level
 
 # ===============================
 # Data penyimpanan dengan backup system
@@ -90,120 +103,14 @@ ACTIVE_QUESTS = {}
 PENDING_REGISTRATIONS = {}
 
 # ===============================
-# Race System - BARU
+# Gender (RACES, REALMS, REALM_ORDER ada di progression.py)
 # ===============================
-RACES = {
-    "human": {
-        "name": "Human",
-        "emoji": "👨",
-        "bonuses": {"exp": 0.10, "qi": 0.15, "technique": 0.20},
-        "description": "Versatile cultivators with balanced growth and technique mastery"
-    },
-    "demon": {
-        "name": "Demon",
-        "emoji": "😈", 
-        "bonuses": {"power": 0.25, "attack": 0.20, "defense": -0.10},
-        "description": "Powerful but reckless cultivators with immense combat prowess"
-    },
-    "half_demon": {
-        "name": "Half-Demon",
-        "emoji": "😠",
-        "bonuses": {"power": 0.15, "exp": 0.10, "qi": 0.05},
-        "description": "Balanced hybrid with both human versatility and demonic power"
-    },
-    "beast": {
-        "name": "Beast Race",
-        "emoji": "🐺",
-        "bonuses": {"defense": 0.20, "health": 0.25, "speed": 0.15},
-        "description": "Natural survivors with enhanced physical attributes and instincts"
-    },
-    "celestial": {
-        "name": "Celestial",
-        "emoji": "👼",
-        "bonuses": {"qi": 0.30, "healing": 0.25, "exp": 0.10},
-        "description": "Divine beings with exceptional Qi control and healing abilities",
-        "hidden": True
-    }
-}
-
 GENDERS = {
     "male": {"name": "Male", "emoji": "♂️"},
     "female": {"name": "Female", "emoji": "♀️"},
     "other": {"name": "Other", "emoji": "⚧️"}
 }
 
-# ===============================
-# Realms, Stages, dan EXP Cap - SISTEM YANG LEBIH CHALLENGING
-# ===============================
-REALMS = {
-    "Mortal Realm": {
-        "stages": [
-            "Body Refining [Entry]", "Body Refining [Middle]", "Body Refining [Peak]",
-            "Qi Gathering [Entry]", "Qi Gathering [Middle]", "Qi Gathering [Peak]", 
-            "Inner Pill [Entry]", "Inner Pill [Middle]", "Inner Pill [Peak]",
-            "Yuan Sea [Entry]", "Yuan Sea [Middle]", "Yuan Sea [Peak]",
-            "Becoming God [Entry]", "Becoming God [Middle]", "Becoming God [Peak]",
-            "Divine Bridge [Entry]", "Divine Bridge [Middle]", "Divine Bridge [Peak]",
-            "Nirvana [Entry]", "Nirvana [Middle]", "Nirvana [Peak]",
-            "Destiny [Entry]", "Destiny [Middle]", "Destiny [Peak]",
-            "Life and Death [Entry]", "Life and Death [Middle]", "Life and Death [Peak]",
-            "Ascended [Entry]", "Ascended [Middle]", "Ascended [Peak]"
-        ],
-        "exp_multiplier": 1.0,
-        "power_multiplier": 1.0,
-        "spirit_stone_gain": 1,
-        "color": 0x964B00,
-        "discovery_chance": 0.3
-    },
-    "Immortal Realm": {
-        "stages": [
-            "Half-Immortal [Entry]", "Half-Immortal [Middle]", "Half-Immortal [Peak]",
-            "True Immortal [Entry]", "True Immortal [Middle]", "True Immortal [Peak]",
-            "Profound Immortal [Entry]", "Profound Immortal [Middle]", "Profound Immortal [Peak]",
-            "Golden Immortal [Entry]", "Golden Immortal [Middle]", "Golden Immortal [Peak]",
-            "Mystic Immortal [Entry]", "Mystic Immortal [Middle]", "Mystic Immortal [Peak]",
-            "Supreme Immortal [Entry]", "Supreme Immortal [Middle]", "Supreme Immortal [Peak]",
-            "Immortal Lord [Entry]", "Immortal Lord [Middle]", "Immortal Lord [Peak]",
-            "Immortal Saint [Entry]", "Immortal Saint [Middle]", "Immortal Saint [Peak]",
-            "Immortal Ancestor [Entry]", "Immortal Ancestor [Middle]", "Immortal Ancestor [Peak]",
-            "Immortal Venerable [Entry]", "Immortal Venerable [Middle]", "Immortal Venerable [Peak]",
-            "Immortal King [Entry]", "Immortal King [Middle]", "Immortal King [Peak]",
-            "Immortal Emperor [Entry]", "Immortal Emperor [Middle]", "Immortal Emperor [Peak]"
-        ],
-        "exp_multiplier": 50000.0,
-        "power_multiplier": 25.0,
-        "spirit_stone_gain": 50,
-        "color": 0x00FF00,
-        "discovery_chance": 0.5
-    },
-    "God Realm": {
-        "stages": [
-            "Lesser God [Entry]", "Lesser God [Middle]", "Lesser God [Peak]",
-            "True God [Entry]", "True God [Middle]", "True God [Peak]",
-            "Elder God [Entry]", "Elder God [Middle]", "Elder God [Peak]",
-            "High God [Entry]", "High God [Middle]", "High God [Peak]",
-            "Ancient God [Entry]", "Ancient God [Middle]", "Ancient God [Peak]",
-            "Primordial God [Entry]", "Primordial God [Middle]", "Primordial God [Peak]",
-            "Supreme God [Entry]", "Supreme God [Middle]", "Supreme God [Peak]",
-            "Divine Lord [Entry]", "Divine Lord [Middle]", "Divine Lord [Peak]",
-            "Divine Saint [Entry]", "Divine Saint [Middle]", "Divine Saint [Peak]",
-            "Divine Ancestor [Entry]", "Divine Ancestor [Middle]", "Divine Ancestor [Peak]",
-            "God Sovereign [Entry]", "God Sovereign [Middle]", "God Sovereign [Peak]",
-            "God Emperor [Entry]", "God Emperor [Middle]", "God Emperor [Peak]", 
-            "God King [Entry]", "God King [Middle]", "God King [Peak]",
-            "Celestial Overlord [Entry]", "Celestial Overlord [Middle]", "Celestial Overlord [Peak]",
-            "Universe Creator [Entry]", "Universe Creator [Middle]", "Universe Creator [Peak]"
-        ],
-        "exp_multiplier": 500000.0,
-        "power_multiplier": 100.0,
-        "spirit_stone_gain": 250,
-        "color": 0xFFD700,
-        "discovery_chance": 0.7
-    }
-}
-
-REALM_ORDER = list(REALMS.keys())
-
 # ===============================
 # Guild/Sect System - DIPERBAIKI
 # ===============================
@@ -742,7 +649,9 @@ NPC_COMBAT_BONUSES = {
 
 def get_player_combat_assistant(player_id):
     """Get player's selected combat assistant NPC"""
-    p = get_player(player_id)
+    p = peek_player(player_id)
+    if not p:
+        return None
     return p.get("combat_assistant", None)
 
 def can_use_npc_assistant(player_id, npc_id):
@@ -1273,203 +1182,14 @@ DAILY_QUESTS = [
 # ===============================
 # Helper functions - DIPERBAIKI
 # ===============================
-def create_default_data():
-    """Buat data default jika file tidak ada"""
-    default_data = {
-        "players": {},
-        "last_backup": 0,
-        "total_players": 0,
-        "server_stats": {
-            "total_pvp_battles": 0,
-            "total_breakthroughs": 0,
-            "total_dungeons": 0,
-            "total_techniques_learned": 0,
-            "total_spirit_beasts": 0,
-            "total_pills_crafted": 0,
-            "last_update": datetime.datetime.now().isoformat()
-        },
-        "guilds": {},
-        "market_items": [],
-        "server_events": {},
-        "daily_quests_reset": datetime.datetime.now().isoformat()
-    }
-    save_data(default_data)
-    return default_data
-
 def load_data():
-    """Load data dengan error handling"""
-    try:
-        if not os.path.exists(DATA_FILE):
-            return create_default_data()
-
-        with open(DATA_FILE, "r") as f:
-            data = json.load(f)
-
-        # Validasi struktur data
-        if "players" not in data:
-            return create_default_data()
-
-        # Update dengan field baru jika missing
-        default_fields = {
-            "guilds": {},
-            "market_items": [],
-            "server_events": {},
-            "server_stats": {
-                "total_pvp_battles": 0,
-                "total_breakthroughs": 0,
-                "total_dungeons": 0,
-                "total_techniques_learned": 0,
-                "total_spirit_beasts": 0,
-                "total_pills_crafted": 0,
-                "last_update": datetime.datetime.now().isoformat()
-            },
-            "daily_quests_reset": datetime.datetime.now().isoformat()
-        }
-
-        for field, default_value in default_fields.items():
-            if field not in data:
-                data[field] = default_value
-
-        # Update player data dengan field baru
-        for player_id, player_data in data["players"].items():
-            new_fields = {
-                "breakthroughs": player_data.get("breakthroughs", 0),
-                "daily_quests": player_data.get("daily_quests", {}),
-                "last_daily_claim": player_data.get("last_daily_claim", "0"),
-                "discovered_techniques": player_data.get("discovered_techniques", []),
-                "guild_contributions": player_data.get("guild_contributions", 0),
-                "login_streak": player_data.get("login_streak", 0),
-                "last_login": player_data.get("last_login", "0")
-            }
-
-            for field, default_value in new_fields.items():
-                if field not in player_data:
-                    player_data[field] = default_value
-
-        return data
-
-    except json.JSONDecodeError:
-        print("❌ Error decoding JSON, restoring from backup...")
-        return restore_from_backup()
-    except Exception as e:
-        print(f"❌ Error loading data: {e}")
-        return create_default_data()
+    """Ambil data dari PLAYER_STORE (in-memory, data.json tidak dibaca ulang)"""
+    return PLAYER_STORE.get()
 
 def save_data(data):
-    """Save data dengan backup otomatis setiap 5 menit"""
-    try:
-        # Backup data lama sebelum menimpa jika sudah 5 menit sejak backup terakhir
-        current_time = int(time.time())
-        last_backup = data.get("last_backup", 0)
-        
-        # Ensure last_backup is an integer
-        if not isinstance(last_backup, (int, float)):
-            last_backup = 0
-
-        if os.path.exists(DATA_FILE) and (current_time - last_backup >= 300):
-            backup_data()
-            data["last_backup"] = current_time
-
-        # Update timestamp
-        data["server_stats"]["last_update"] = datetime.datetime.now().isoformat()
-
-        with open(DATA_FILE, "w") as f:
-            json.dump(data, f, indent=4, ensure_ascii=False)
-
-        # print("💾 Data saved successfully!") # Reduced noise
-        return True
-
-    except Exception as e:
-        print(f"❌ Error saving data: {e}")
-        return False
-
-def backup_data():
-    """Buat backup data"""
-    try:
-        if os.path.exists(DATA_FILE):
-            timestamp = int(time.time())
-            backup_path = os.path.join(BACKUP_DIR, f"backup_{timestamp}.json")
-            shutil.copy2(DATA_FILE, backup_path)
-
-            # Hapus backup lama (simpan hanya 5 terbaru)
-            backups = sorted([f for f in os.listdir(BACKUP_DIR) if f.startswith("backup_")])
-            if len(backups) > 5:
-                for old_backup in backups[:-5]:
-                    os.remove(os.path.join(BACKUP_DIR, old_backup))
-
-            print(f"📦 Backup created: backup_{timestamp}.json")
-            return True
-
-    except Exception as e:
-        print(f"❌ Error creating backup: {e}")
-        return False
-
-def restore_from_backup():
-    """Restore data dari backup terbaru"""
-    try:
-        if not os.path.exists(BACKUP_DIR):
-            print("⚠️ No backup directory found")
-            return create_default_data()
-
-        backups = [f for f in os.listdir(BACKUP_DIR) if f.startswith("backup_") and f.endswith(".json")]
-        if not backups:
-            print("⚠️ No backup files found")
-            return create_default_data()
-
-        backups.sort(reverse=True)
-        latest_backup = os.path.join(BACKUP_DIR, backups[0])
-
-        print(f"🔧 Restoring from backup: {latest_backup}")
-        shutil.copy2(latest_backup, DATA_FILE)
-        return load_data()
-
-    except Exception as e:
-        print(f"❌ Error restoring backup: {e}")
-        return create_default_data()
-
-def get_player_level(p):
-    """Hitung level player berdasarkan realm dan stage dengan race bonus"""
-    realm_idx = REALM_ORDER.index(p["realm"])
-    stage_idx = REALMS[p["realm"]]["stages"].index(p["stage"])
-
-    base_level = (realm_idx * 100) + (stage_idx * 3) + 1
-
-    # Apply race bonus jika ada
-    race_data = RACES.get(p.get("race", "human"), RACES["human"])
-    if "exp" in race_data["bonuses"]:
-        base_level = int(base_level * (1 + race_data["bonuses"]["exp"]))
-
-    return base_level
-
-def get_exp_cap(p):
-    """Calculate the EXP cap for the current realm and stage"""
-    # Increase base EXP for Catto and other players to prevent hitting cap too early
-    realm_name = p.get("realm", "Mortal Realm")
-    stage_name = p.get("stage", "Qi Condensation [Entry]")
-    
-    realm_data = REALMS.get(realm_name)
-    if not realm_data:
-        return 1000
-        
-    stages = realm_data["stages"]
-    try:
-        stage_idx = stages.index(stage_name)
-    except ValueError:
-        stage_idx = 0
-        
-    realm_idx = REALM_ORDER.index(realm_name)
-    exp_multiplier = realm_data.get("exp_multiplier", 1.0)
-    
-    # Base requirement formula
-    base_val = 1000 # Increased from 100 to 1000
-    
-    # Half-Immortal (Immortal Realm, Stage 0) should be around 500M
-    # Stage 0, Realm 1: 1000 * (1.5^1) * (10^realm_idx) * multiplier
-    # With multiplier 50000: 1000 * 1.5 * 10 * 50000 = 750,000,000 (750M) - Correct range
-    
-    req = int(base_val * (1.5 ** (stage_idx + 1)) * (10 ** (realm_idx if realm_idx < 1 else realm_idx + 1)) * exp_multiplier)
-        
-    return max(req, 1000)
+    """Tandai seluruh data dirty, PLAYER_STORE yang flush ke disk secara berkala"""
+    PLAYER_STORE.put(data)
+    return True
 
 def generate_random_technique(player_realm, player_stage):
     """Generate random cultivation technique dengan AI"""
@@ -1478,8 +1198,8 @@ def generate_random_technique(player_realm, player_stage):
     element = random.choice(list(ELEMENT_TYPES.keys()))
 
     # Determine power based on realm
-    realm_idx = REALM_ORDER.index(player_realm)
-    stage_idx = REALMS[player_realm]["stages"].index(player_stage)
+    info = PROGRESSION[(player_realm, player_stage)]
+    realm_idx, stage_idx = info.realm_index, info.stage_index
     base_power = (realm_idx * 0.1) + (stage_idx * 0.02)
 
     # Power bonus range
@@ -1525,73 +1245,30 @@ def generate_random_technique(player_realm, player_stage):
     }
 
 def get_player(uid):
-    """Dapatkan data player, return None jika belum terdaftar"""
+    """Dapatkan data player untuk diubah (simpan lagi lewat update_player), None jika belum terdaftar"""
     data = load_data()
     uid_str = str(uid)
 
     if uid_str not in data["players"]:
         return None
 
+    # Field player lama sudah dilengkapi oleh migrasi schema saat startup
     player_data = data["players"][uid_str]
+    settle_lazy_cultivation(uid_str, player_data)
+    return player_data
 
-    # Update player lama dengan field baru jika perlu
-    new_fields = {
-        "spirit_stones": player_data.get("spirit_stones", 50),
-        "techniques": player_data.get("techniques", []),
-        "current_technique": player_data.get("current_technique", None),
-        "sect": player_data.get("sect", None),
-        "guild": player_data.get("guild", None),
-        "guild_role": player_data.get("guild_role", None),
-        "base_power": player_data.get("power", 10),
-        "total_power": player_data.get("power", 10),
-        "last_technique_find": player_data.get("last_technique_find", "0"),
-        "last_daily_quest": player_data.get("last_daily_quest", "0"),
-        "techniques_learned": player_data.get("techniques_learned", 0),
-        "daily_streak": player_data.get("daily_streak", 0),
-        "spirit_beasts": player_data.get("spirit_beasts", []),
-        "current_beast": player_data.get("current_beast", None),
-        "inventory": player_data.get("inventory", {
-            "spirit_herb": 0, "spirit_water": 0, "spirit_crystal": 0,
-            "dragon_scale": 0, "phoenix_feather": 0, "dragon_heart": 0
-        }),
-        "pills_crafted": player_data.get("pills_crafted", 0),
-        "achievements": player_data.get("achievements", []),
-        "race": player_data.get("race", "human"),
-        "gender": player_data.get("gender", "other"),
-        "display_name": player_data.get("display_name", ""),
-        "created_at": player_data.get("created_at", datetime.datetime.now().isoformat()),
-        "last_updated": datetime.datetime.now().isoformat(),
-        "breakthroughs": player_data.get("breakthroughs", 0),
-        "daily_quests": player_data.get("daily_quests", {}),
-        "last_daily_claim": player_data.get("last_daily_claim", "0"),
-        "discovered_techniques": player_data.get("discovered_techniques", []),
-        "guild_contributions": player_data.get("guild_contributions", 0),
-        "login_streak": player_data.get("login_streak", 0),
-        "last_login": player_data.get("last_login", "0")
-    }
-
-    for field, default_value in new_fields.items():
-        if field not in player_data:
-            player_data[field] = default_value
-
-    # Auto-assign faction for legacy players (Human/Demon)
-    if "faction" not in player_data:
-        race = player_data.get("race", "human")
-        if race == "human":
-            player_data["faction"] = "Orthodox Alliance"
-        elif race == "demon":
-            player_data["faction"] = "Demonic Cult"
-
-    # Jika ada power lama, convert ke base_power
-    if "power" in player_data and "base_power" not in player_data:
-        player_data["base_power"] = player_data["power"]
-        player_data["total_power"] = player_data["power"]
-
-    # Check and update achievements
-    check_achievements(uid_str, player_data)
+def peek_player(uid):
+    """Read-only view data player untuk command display (tanpa achievement check / write)
 
-    save_data(data)
-    return player_data
+    Lazy cultivation yang tertunda hanya dihitung di salinan untuk display;
+    data asli di-settle oleh get_player berikutnya atau timer EXP cap.
+    """
+    player_data = load_data()["players"].get(str(uid))
+    if player_data is None:
+        return None
+    if LAZY_CULTIVATION_KEY in player_data:
+        player_data = lazy_cultivation_view(str(uid), player_data)
+    return MappingProxyType(player_data)
 
 def create_new_player(uid, race, gender, name):
     """Buat player baru dengan race dan gender"""
@@ -1665,7 +1342,8 @@ def create_new_player(uid, race, gender, name):
         }
 
     data["total_players"] += 1
-    save_data(data)
+    save_player(uid_str)
+    save_section("meta")
     return data["players"][uid_str]
 
 def update_player(uid, pdata):
@@ -1676,7 +1354,12 @@ def update_player(uid, pdata):
     if uid_str in data["players"]:
         pdata["last_updated"] = datetime.datetime.now().isoformat()
         data["players"][uid_str] = pdata
-        return save_data(data)
+
+        # Realm / race bisa berubah: rate lazy cultivation ikut diperbarui
+        refresh_lazy_rates(uid_str, pdata)
+        # Achievement hanya dicek saat stats berubah
+        check_achievements(uid_str, pdata)
+        return save_player(uid_str)
 
     return False
 
@@ -1702,6 +1385,11 @@ def calculate_set_bonus(equipment_dict):
 
     return total_bonus
 
+# Cache derived stats (set bonus, multiplier teknik, bonus race/beast) per player
+DERIVED_STATS.configure(calculate_set_bonus, RACES)
+PLAYER_STORE.add_player_listener(DERIVED_STATS.observe)
+PLAYER_STORE.add_reset_listener(DERIVED_STATS.reset)
+
 def get_realm_order_index(realm_name):
     """Get realm order for equipment access checks"""
     realm_order = ["Mortal Realm", "Immortal Realm", "God Realm"]
@@ -1729,8 +1417,7 @@ def get_all_players():
     return data["players"]
 
 def check_achievements(player_id, player_data):
-    """Check and award achievements"""
-    data = load_data()
+    """Check and award achievements (dipanggil dari update_player)"""
     new_achievements = []
 
     for achievement_id, achievement_data in ACHIEVEMENTS.items():
@@ -1753,11 +1440,16 @@ def check_achievements(player_id, player_data):
 
             new_achievements.append(achievement_data)
 
-    if new_achievements:
-        update_player(player_id, player_data)
-
     return new_achievements
 
+def commit_player(user_id, p):
+    """Commit hook player_txn: sama dengan update_player (rate lazy cultivation + achievement)"""
+    refresh_lazy_rates(user_id, p)
+    return check_achievements(user_id, p)
+
+# Achievement juga dicek untuk player yang diubah lewat player_txn
+PLAYER_STORE.set_commit_hook(commit_player)
+
 def reset_daily_quests():
     """Reset daily quests for all players"""
     data = load_data()
@@ -1783,91 +1475,116 @@ def reset_daily_quests():
 # ===============================
 # Battle System Functions
 # ===============================
+# Mode PvP: "live" (task + countdown + edit per round) atau "instant" (dihitung sekali, satu embed)
+BATTLE_MODE = os.environ.get("BATTLE_MODE", "live")
+BATTLE_REPLAY_INTERVAL = 2
+PVP_EXP_REWARD = 50
+PVP_SPIRIT_STONE_REWARD = 10
+PVP_EXP_PENALTY = 20
+# Replay battle instant terakhir per player (seed + snapshot, log dihitung ulang saat diputar)
+BATTLE_REPLAYS = {}
+
+def battle_power(player_id, player):
+    """(power battle, nama NPC assistant) - total_power plus bonus NPC combat assistant jika ada"""
+    if NPC_SYSTEM_LOADED:
+        assistant_id = get_player_combat_assistant(player_id)
+        if assistant_id and can_use_npc_assistant(player_id, assistant_id):
+            from npc_system import get_npc_data
+            npc_data = get_npc_data(str(player_id), assistant_id)
+            bonuses = apply_npc_combat_assistance(player, npc_data['specialty'])
+            return bonuses['enhanced_power'], npc_data['name']
+    return player["total_power"], None
+
+def player_combatant(player_id, player, power):
+    """Snapshot Combatant dengan profil beast dari derived stats (tanpa scan roster)"""
+    beast = DERIVED_STATS.get(player_id, player)["beast_profile"]
+    return combatant_snapshot(player_id, player, power, beast)
+
 async def start_battle(attacker_id, defender_id, ctx):
     """Mulai real-time battle"""
     battle_id = f"{attacker_id}_{defender_id}"
 
-    if battle_id in ACTIVE_BATTLES:
-        return await ctx.send("⏳ Battle sedang berlangsung!")
+    # Kunci kedua player (juga menolak challenge terbalik / boss yang sedang jalan)
+    conflict = ENGAGEMENTS.claim("pvp", battle_id, attacker_id, defender_id)
+    if conflict:
+        return await ctx.send(busy_message(conflict))
 
-    attacker = get_player(attacker_id)
-    defender = get_player(defender_id)
+    try:
+        attacker = peek_player(attacker_id)
+        defender = peek_player(defender_id)
+
+        # Apply NPC combat assistance if available
+        attacker_power, attacker_assistant = battle_power(attacker_id, attacker)
+        defender_power, defender_assistant = battle_power(defender_id, defender)
+
+        # Setup battle data
+        battle_data = {
+            "attacker": attacker_id,
+            "defender": defender_id,
+            "attacker_hp": 100,
+            "defender_hp": 100,
+            "attacker_power": attacker_power,
+            "defender_power": defender_power,
+            "attacker_assistant": attacker_assistant,
+            "defender_assistant": defender_assistant,
+            "round": 0,
+            "message": None,
+            "active": True,
+            "channel_id": ctx.channel.id,
+            # Snapshot petarung diambil sekali, round berikutnya tidak membaca data player lagi
+            "combatants": [
+                player_combatant(attacker_id, attacker, attacker_power),
+                player_combatant(defender_id, defender, defender_power)
+            ]
+        }
 
-    # Apply NPC combat assistance if available
-    attacker_power = attacker["total_power"]
-    defender_power = defender["total_power"]
-    
-    attacker_assistant = None
-    defender_assistant = None
-    
-    if NPC_SYSTEM_LOADED:
-        # Check for combat assistants
-        attacker_assistant_id = get_player_combat_assistant(attacker_id)
-        defender_assistant_id = get_player_combat_assistant(defender_id)
-        
-        if attacker_assistant_id and can_use_npc_assistant(attacker_id, attacker_assistant_id):
-            from npc_system import get_npc_data
-            attacker_npc_data = get_npc_data(str(attacker_id), attacker_assistant_id)
-            attacker_bonuses = apply_npc_combat_assistance(attacker, attacker_npc_data['specialty'])
-            attacker_power = attacker_bonuses['enhanced_power']
-            attacker_assistant = attacker_npc_data['name']
-        
-        if defender_assistant_id and can_use_npc_assistant(defender_id, defender_assistant_id):
-            from npc_system import get_npc_data
-            defender_npc_data = get_npc_data(str(defender_id), defender_assistant_id)
-            defender_bonuses = apply_npc_combat_assistance(defender, defender_npc_data['specialty'])
-            defender_power = defender_bonuses['enhanced_power']
-            defender_assistant = defender_npc_data['name']
-
-    # Setup battle data
-    ACTIVE_BATTLES[battle_id] = {
-        "attacker": attacker_id,
-        "defender": defender_id,
-        "attacker_hp": 100,
-        "defender_hp": 100,
-        "attacker_power": attacker_power,
-        "defender_power": defender_power,
-        "attacker_assistant": attacker_assistant,
-        "defender_assistant": defender_assistant,
-        "round": 0,
-        "message": None,
-        "active": True,
-        "channel_id": ctx.channel.id
-    }
+        if BATTLE_MODE == "instant":
+            try:
+                return await instant_battle(battle_data, ctx)
+            finally:
+                ENGAGEMENTS.release("pvp", battle_id, attacker_id, defender_id)
+        ACTIVE_BATTLES[battle_id] = battle_data
 
-    # Kirim battle message
-    embed = discord.Embed(
-        title="⚔️ Battle Started!",
-        description=f"<@{attacker_id}> vs <@{defender_id}>",
-        color=0xff0000
-    )
-    
-    attacker_power_text = f"{attacker_power:,}"
-    if attacker_assistant:
-        attacker_power_text += f"\n🤝 **Assistant:** {attacker_assistant}"
-    
-    defender_power_text = f"{defender_power:,}"
-    if defender_assistant:
-        defender_power_text += f"\n🤝 **Assistant:** {defender_assistant}"
-    
-    embed.add_field(name="Attacker Power", value=attacker_power_text, inline=True)
-    embed.add_field(name="Defender Power", value=defender_power_text, inline=True)
-    embed.add_field(name="HP", value="❤️ 100% | ❤️ 100%", inline=False)
-    embed.set_footer(text="Battle dimulai dalam 3...")
+        # Kirim battle message
+        embed = discord.Embed(
+            title="⚔️ Battle Started!",
+            description=f"<@{attacker_id}> vs <@{defender_id}>",
+            color=0xff0000
+        )
 
-    message = await ctx.send(embed=embed)
-    ACTIVE_BATTLES[battle_id]["message"] = message
+        attacker_power_text = f"{attacker_power:,}"
+        if attacker_assistant:
+            attacker_power_text += f"\n🤝 **Assistant:** {attacker_assistant}"
+
+        defender_power_text = f"{defender_power:,}"
+        if defender_assistant:
+            defender_power_text += f"\n🤝 **Assistant:** {defender_assistant}"
+
+        embed.add_field(name="Attacker Power", value=attacker_power_text, inline=True)
+        embed.add_field(name="Defender Power", value=defender_power_text, inline=True)
+        embed.add_field(name="HP", value="❤️ 100% | ❤️ 100%", inline=False)
+        embed.set_footer(text="Battle dimulai dalam 3...")
+
+        message = await ctx.send(embed=embed)
+        ACTIVE_BATTLES[battle_id]["message"] = message
+    except Exception:
+        # Battle task belum jalan, jadi finally-nya tidak akan melepas kunci kedua player
+        ACTIVE_BATTLES.pop(battle_id, None)
+        ENGAGEMENTS.release("pvp", battle_id, attacker_id, defender_id)
+        raise
 
     # Start battle task
     asyncio.create_task(battle_task(battle_id, ctx))
 
-async def battle_task(battle_id, ctx):
-    """Background task untuk battle"""
+async def battle_task(battle_id, ctx, resume=False):
+    """Background task untuk battle (resume=True: lanjut dari round tersimpan setelah restart)"""
     try:
         battle_data = ACTIVE_BATTLES[battle_id]
 
         # Countdown
         for i in range(3, 0, -1):
+            if resume:
+                break
             if not battle_data["active"]:
                 return
             embed = battle_data["message"].embeds[0]
@@ -1876,8 +1593,7 @@ async def battle_task(battle_id, ctx):
             await asyncio.sleep(1)
 
         # Battle rounds
-        while (battle_data["attacker_hp"] > 0 and battle_data["defender_hp"] > 0 and 
-               battle_data["active"] and battle_data["round"] < 10):
+        while battle_data["active"] and not is_over(battle_data["attacker_hp"], battle_data["defender_hp"], battle_data["round"]):
 
             battle_data["round"] += 1
             await battle_round(battle_id, ctx)
@@ -1890,109 +1606,44 @@ async def battle_task(battle_id, ctx):
         print(f"Error in battle task: {e}")
     finally:
         if battle_id in ACTIVE_BATTLES:
-            del ACTIVE_BATTLES[battle_id]
+            battle_data = ACTIVE_BATTLES.pop(battle_id)
+            ENGAGEMENTS.release("pvp", battle_id, battle_data["attacker"], battle_data["defender"])
 
 async def battle_round(battle_id, ctx):
-    """Satu round battle"""
+    """Satu round battle: hitung lewat battle_engine, lalu render ke message"""
     battle_data = ACTIVE_BATTLES[battle_id]
-    attacker = get_player(battle_data["attacker"])
-    defender = get_player(battle_data["defender"])
+    attacker, defender = battle_data["combatants"]
 
-    # Calculate basic damage based on power ratio to prevent "instant kill" and lucky wins
-    # att_dmg = max(5, random.randint(10, 20) * battle_data["attacker_power"] // 100)
-    
-    # New scaling: Damage is based on power difference and level
-    power_ratio = battle_data["attacker_power"] / max(1, battle_data["defender_power"])
-    def_ratio = battle_data["defender_power"] / max(1, battle_data["attacker_power"])
-    
-    base_dmg = 15
-    att_dmg = int(base_dmg * (power_ratio ** 0.5) * random.uniform(0.8, 1.2))
-    def_dmg = int(base_dmg * (def_ratio ** 0.5) * random.uniform(0.8, 1.2))
-    
-    # Ensure minimum damage but cap it to prevent instant kills in round 1
-    att_dmg = max(5, min(40, att_dmg))
-    def_dmg = max(5, min(40, def_dmg))
+    log = resolve_round(attacker, defender, battle_data["attacker_hp"], battle_data["defender_hp"], battle_data["round"])
+    battle_data["attacker_hp"] = log.attacker_hp
+    battle_data["defender_hp"] = log.defender_hp
 
+    try:
+        await battle_data["message"].edit(embed=battle_round_embed(battle_data, log))
+    except:
+        pass
+
+def battle_round_embed(battle_data, log):
+    """Embed satu round dari RoundLog"""
     # HP bars
-    att_hp_bar = "❤️" * (battle_data["attacker_hp"] // 10) + "♡" * (10 - battle_data["attacker_hp"] // 10)
-    def_hp_bar = "❤️" * (battle_data["defender_hp"] // 10) + "♡" * (10 - battle_data["defender_hp"] // 10)
-
-    # Apply Regeneration (Immortal Phoenix etc)
-    att_regen = 0
-    def_regen = 0
-    
-    attacker_data = get_player(battle_data["attacker"])
-    defender_data = get_player(battle_data["defender"])
-    
-    # Check Active Beast Bonuses for Regeneration
-    if attacker_data.get("current_beast"):
-        for beast in attacker_data.get("spirit_beasts", []):
-            if beast["name"] == attacker_data["current_beast"]:
-                regen_val = beast.get("bonus", {}).get("regeneration", 0)
-                if regen_val > 0:
-                    att_regen = int(100 * regen_val)
-                    battle_data["attacker_hp"] = min(100, battle_data["attacker_hp"] + att_regen)
-
-    if defender_data.get("current_beast"):
-        for beast in defender_data.get("spirit_beasts", []):
-            if beast["name"] == defender_data["current_beast"]:
-                regen_val = beast.get("bonus", {}).get("regeneration", 0)
-                if regen_val > 0:
-                    def_regen = int(100 * regen_val)
-                    battle_data["defender_hp"] = min(100, battle_data["defender_hp"] + def_regen)
-
-    # Apply Critical Hits (White Divine Tiger etc)
-    att_is_crit = False
-    def_is_crit = False
-    
-    if attacker_data.get("current_beast"):
-        for beast in attacker_data.get("spirit_beasts", []):
-            if beast["name"] == attacker_data["current_beast"]:
-                crit_chance = beast.get("bonus", {}).get("critical", 0)
-                if random.random() < crit_chance:
-                    att_is_crit = True
-                    att_dmg = int(att_dmg * 2)
-
-    if defender_data.get("current_beast"):
-        for beast in defender_data.get("spirit_beasts", []):
-            if beast["name"] == defender_data["current_beast"]:
-                crit_chance = beast.get("bonus", {}).get("critical", 0)
-                if random.random() < crit_chance:
-                    def_is_crit = True
-                    def_dmg = int(def_dmg * 2)
-
-    # Update damage application with potential crits
-    battle_data["defender_hp"] = max(0, battle_data["defender_hp"] - att_dmg)
-    battle_data["attacker_hp"] = max(0, battle_data["attacker_hp"] - def_dmg)
-
-    # Technique flavor text
-    techniques = [
-        "menggunakan *Palm of Thousand Winds*",
-        "melancarkan *Heavenly Sword Strike*",
-        "mengaktifkan *Dragon Breath Aura*",
-        "menyerang dengan *Shadow Step Punch*",
-        "memanggil *Golden Bell Shield* namun tetap terkena",
-        "menggunakan *Jade Flute Melody*"
-    ]
-    att_tech = random.choice(techniques)
-    def_tech = random.choice(techniques)
+    att_hp_bar = "❤️" * (log.attacker_hp // 10) + "♡" * (10 - log.attacker_hp // 10)
+    def_hp_bar = "❤️" * (log.defender_hp // 10) + "♡" * (10 - log.defender_hp // 10)
 
-    # Update message
     embed = discord.Embed(
-        title=f"⚔️ Round {battle_data['round']}",
+        title=f"⚔️ Round {log.round}",
         description=f"<@{battle_data['attacker']}> vs <@{battle_data['defender']}>",
         color=0xff0000
     )
 
     log_msg = ""
-    if att_is_crit: log_msg += "💥 **CRITICAL HIT!** "
-    log_msg += f"🔸 <@{battle_data['attacker']}> {att_tech} dealing **{att_dmg} damage**!"
-    if att_regen > 0: log_msg += f" (+{att_regen} HP Regen)"
+    if log.attacker_crit: log_msg += "💥 **CRITICAL HIT!** "
+    log_msg += f"🔸 <@{battle_data['attacker']}> {log.attacker_technique} dealing **{log.attacker_damage} damage**!"
+    if log.attacker_regen > 0: log_msg += f" (+{log.attacker_regen} HP Regen)"
     log_msg += "\n"
     
-    if def_is_crit: log_msg += "💥 **CRITICAL HIT!** "
-    log_msg += f"🔹 <@{battle_data['defender']}> {def_tech} dealing **{def_dmg} damage**!"
-    if def_regen > 0: log_msg += f" (+{def_regen} HP Regen)"
+    if log.defender_crit: log_msg += "💥 **CRITICAL HIT!** "
+    log_msg += f"🔹 <@{battle_data['defender']}> {log.defender_technique} dealing **{log.defender_damage} damage**!"
+    if log.defender_regen > 0: log_msg += f" (+{log.defender_regen} HP Regen)"
 
     embed.add_field(
         name="Combat Log", 
@@ -2002,69 +1653,62 @@ async def battle_round(battle_id, ctx):
 
     embed.add_field(
         name="Health",
-        value=f"**Attacker:** {att_hp_bar} {battle_data['attacker_hp']}%\n"
-              f"**Defender:** {def_hp_bar} {battle_data['defender_hp']}%",
+        value=f"**Attacker:** {att_hp_bar} {log.attacker_hp}%\n"
+              f"**Defender:** {def_hp_bar} {log.defender_hp}%",
         inline=False
     )
+    return embed
+
+async def finish_battle(battle_id, ctx):
+    """Selesaikan battle dan berikan rewards"""
+    battle_data = ACTIVE_BATTLES[battle_id]
+
+    winner_id, loser_id, winner, loser = await commit_battle_result(battle_data)
+    embed = battle_result_embed(winner_id, loser_id, winner, loser)
 
     try:
         await battle_data["message"].edit(embed=embed)
     except:
         pass
 
-async def finish_battle(battle_id, ctx):
-    """Selesaikan battle dan berikan rewards"""
-    battle_data = ACTIVE_BATTLES[battle_id]
-    attacker = get_player(battle_data["attacker"])
-    defender = get_player(battle_data["defender"])
-
-    # Determine winner
-    if battle_data["attacker_hp"] <= 0 or battle_data["defender_hp"] > battle_data["attacker_hp"]:
-        winner_id = battle_data["defender"]
-        loser_id = battle_data["attacker"]
-        result = f"<@{winner_id}> wins!"
-    else:
+async def commit_battle_result(battle_data):
+    """Tentukan pemenang dari HP akhir lalu commit rewards sekali, return (winner_id, loser_id, winner, loser)"""
+    if attacker_wins(battle_data["attacker_hp"], battle_data["defender_hp"]):
         winner_id = battle_data["attacker"]
         loser_id = battle_data["defender"]
-        result = f"<@{winner_id}> wins!"
-
-    # Update player stats
-    winner = get_player(winner_id)
-    loser = get_player(loser_id)
-
-    winner["pvp_wins"] += 1
-    loser["pvp_losses"] += 1
+    else:
+        winner_id = battle_data["defender"]
+        loser_id = battle_data["attacker"]
 
-    exp_reward = 50
-    spirit_stone_reward = 10
+    # Update player stats + server stats, di-commit sekali di akhir blok
+    async with player_txn(winner_id, loser_id, stats=True) as (winner, loser, stats):
+        winner["pvp_wins"] += 1
+        loser["pvp_losses"] += 1
 
-    winner["exp"] = min(winner["exp"] + exp_reward, get_exp_cap(winner))
-    winner["spirit_stones"] += spirit_stone_reward
-    loser["exp"] = max(0, loser["exp"] - 20)
+        winner["exp"] = min(winner["exp"] + PVP_EXP_REWARD, get_exp_cap(winner))
+        winner["spirit_stones"] += PVP_SPIRIT_STONE_REWARD
+        loser["exp"] = max(0, loser["exp"] - PVP_EXP_PENALTY)
 
-    # Update daily quest progress
-    winner["daily_quests"]["pvp_battle"]["progress"] += 1
-    if winner["daily_quests"]["pvp_battle"]["progress"] >= winner["daily_quests"]["pvp_battle"].get("progress_needed", 1):
-        winner["daily_quests"]["pvp_battle"]["completed"] = True
+        # Update daily quest progress
+        winner["daily_quests"]["pvp_battle"]["progress"] += 1
+        if winner["daily_quests"]["pvp_battle"]["progress"] >= winner["daily_quests"]["pvp_battle"].get("progress_needed", 1):
+            winner["daily_quests"]["pvp_battle"]["completed"] = True
 
-    update_player(winner_id, winner)
-    update_player(loser_id, loser)
+        stats["total_pvp_battles"] = stats.get("total_pvp_battles", 0) + 1
 
-    # Update server stats
-    data = load_data()
-    data["server_stats"]["total_pvp_battles"] += 1
-    save_data(data)
+    return winner_id, loser_id, winner, loser
 
-    # Final message
+def battle_result_embed(winner_id, loser_id, winner, loser):
+    """Embed hasil akhir battle (rewards + record)"""
     embed = discord.Embed(
         title="🎉 Battle Finished!",
-        description=result,
+        description=f"<@{winner_id}> wins!",
         color=0x00ff00
     )
 
     embed.add_field(
         name="Rewards",
-        value=f"<@{winner_id}>: +{exp_reward} EXP, +{spirit_stone_reward} Spirit Stones\n<@{loser_id}>: -20 EXP",
+        value=f"<@{winner_id}>: +{PVP_EXP_REWARD} EXP, +{PVP_SPIRIT_STONE_REWARD} Spirit Stones\n<@{loser_id}>: -{PVP_EXP_PENALTY} EXP",
         inline=False
     )
 
@@ -2073,11 +1717,34 @@ async def finish_battle(battle_id, ctx):
         value=f"<@{winner_id}>: {winner['pvp_wins']}W/{winner['pvp_losses']}L\n<@{loser_id}>: {loser['pvp_wins']}W/{loser['pvp_losses']}L",
         inline=True
     )
-
-    try:
-        await battle_data["message"].edit(embed=embed)
-    except:
-        pass
+    return embed
+
+def battle_log_text(logs):
+    """Round log ringkas, satu baris per round"""
+    lines = []
+    for log in logs:
+        att = f"{'💥' if log.attacker_crit else '🔸'}{log.attacker_damage}"
+        dfn = f"{'💥' if log.defender_crit else '🔹'}{log.defender_damage}"
+        lines.append(f"R{log.round}: {att} | {dfn} → ❤️ {log.attacker_hp}% / {log.defender_hp}%")
+    return "\n".join(lines)
+
+async def instant_battle(battle_data, ctx):
+    """Mode instant: seluruh battle dihitung sekali dengan RNG ber-seed, commit sekali, kirim satu embed"""
+    attacker, defender = battle_data["combatants"]
+    replay = Replay(random.getrandbits(32), attacker, defender)
+    logs = simulate(attacker, defender, replay.seed)
+    battle_data["attacker_hp"] = logs[-1].attacker_hp
+    battle_data["defender_hp"] = logs[-1].defender_hp
+    battle_data["round"] = len(logs)
+
+    winner_id, loser_id, winner, loser = await commit_battle_result(battle_data)
+    BATTLE_REPLAYS[str(battle_data["attacker"])] = replay
+    BATTLE_REPLAYS[str(battle_data["defender"])] = replay
+
+    embed = battle_result_embed(winner_id, loser_id, winner, loser)
+    embed.add_field(name="⚔️ Round Log", value=battle_log_text(logs), inline=False)
+    embed.set_footer(text="Gunakan !pvp_replay untuk memutar ulang battle ini")
+    await ctx.send(embed=embed)
 
 # ===============================
 # Idle Cultivation System Functions
@@ -2134,7 +1801,14 @@ async def stop_cultivation(user_id, reason="manual"):
     cultivation_data = ACTIVE_CULTIVATIONS[user_id]
     cultivation_data["active"] = False
 
-    p = get_player(user_id)
+    # Lazy cultivation: get_player sudah menghitung gain terakhir, lalu state dihapus
+    if cultivation_data.get("lazy"):
+        lazy_player = get_player(user_id)
+        if lazy_player is not None and LAZY_CULTIVATION_KEY in lazy_player:
+            cultivation_data["total_gained"] = lazy_player.pop(LAZY_CULTIVATION_KEY)["gained"]
+            update_player(user_id, lazy_player)
+
+    p = peek_player(user_id)
     if p is None:
         if user_id in ACTIVE_CULTIVATIONS:
             del ACTIVE_CULTIVATIONS[user_id]
@@ -2175,77 +1849,315 @@ async def stop_cultivation(user_id, reason="manual"):
     if user_id in ACTIVE_CULTIVATIONS:
         del ACTIVE_CULTIVATIONS[user_id]
 
-async def idle_cultivation_task(user_id, player_data, realm_data):
-    """Background task untuk idle cultivation"""
-    try:
-        while user_id in ACTIVE_CULTIVATIONS and ACTIVE_CULTIVATIONS[user_id]["active"]:
-            p = get_player(user_id)
-            exp_cap = get_exp_cap(p)
+# Satu scheduler untuk semua idle cultivation (bukan satu task per player)
+CULTIVATION_TICK = 1.0
+CULTIVATION_TASK = None
 
-            # Cek jika sudah cap
-            if p["exp"] >= exp_cap:
-                break
+def cultivation_tick(user_id, p):
+    """Terapkan gain satu tick ke data player di memory, return jumlah EXP yang didapat"""
+    realm_data = REALMS[p["realm"]]
+    exp_cap = get_exp_cap(p)
 
-            # Calculate gains - Adjusting base_gain to be much smaller
-            # User reported millions per second. 
-            # Current multiplier for God realm is 500,000. 
-            # If base_gain is 10,000, gain = 10k * 500k = 5,000,000,000 (5 billion)
-            # We need to reduce base_gain significantly for idle cultivation.
-            base_gain = 5 # Reduced from 10,000 to 5
-            gain = int(base_gain * realm_data["exp_multiplier"])
-            qi_gain = random.randint(10, 50)
-            power_gain = random.randint(5, 15)
-            
-            # Ensure min <= max for spirit stones in idle
-            ss_max_idle = max(10, realm_data["spirit_stone_gain"])
-            spirit_stones_gain = random.randint(10, ss_max_idle)
-
-            # Apply race bonuses
-            race_data = RACES.get(p.get("race", "human"), RACES["human"])
-            if "exp" in race_data["bonuses"]:
-                gain = int(gain * (1 + race_data["bonuses"]["exp"]))
-            if "qi" in race_data["bonuses"]:
-                qi_gain = int(qi_gain * (1 + race_data["bonuses"]["qi"]))
-
-            # Adjust gain jika melebihi cap
-            if p["exp"] + gain > exp_cap:
-                gain = exp_cap - p["exp"]
-
-            # Update player
-            p["exp"] += gain
-            p["qi"] += qi_gain
-            p["base_power"] += power_gain
-            p["spirit_stones"] += spirit_stones_gain
+    # Calculate gains - Adjusting base_gain to be much smaller
+    # User reported millions per second. 
+    # Current multiplier for God realm is 500,000. 
+    # If base_gain is 10,000, gain = 10k * 500k = 5,000,000,000 (5 billion)
+    # We need to reduce base_gain significantly for idle cultivation.
+    base_gain = 5 # Reduced from 10,000 to 5
+    gain = int(base_gain * realm_data["exp_multiplier"])
+    qi_gain = random.randint(10, 50)
+    power_gain = random.randint(5, 15)
 
-            # Update daily quest progress
-            p["daily_quests"]["cultivate_5"]["progress"] += 1
-            if p["daily_quests"]["cultivate_5"]["progress"] >= p["daily_quests"]["cultivate_5"].get("progress_needed", 5):
-                p["daily_quests"]["cultivate_5"]["completed"] = True
+    # Ensure min <= max for spirit stones in idle
+    ss_max_idle = max(10, realm_data["spirit_stone_gain"])
+    spirit_stones_gain = random.randint(10, ss_max_idle)
 
-            # Update power dengan teknik bonuses
-            technique_bonus = 1 + sum(t['power_bonus'] for t in p["techniques"])
-            set_bonus = calculate_set_bonus(p["equipment"])
-            p["total_power"] = int(p["base_power"] * technique_bonus * (1 + set_bonus))
+    # Apply race bonuses (dari cache derived stats)
+    race_bonuses = DERIVED_STATS.get(user_id, p)["race_bonuses"]
+    if "exp" in race_bonuses:
+        gain = int(gain * (1 + race_bonuses["exp"]))
+    if "qi" in race_bonuses:
+        qi_gain = int(qi_gain * (1 + race_bonuses["qi"]))
 
-            update_player(user_id, p)
+    # Adjust gain jika melebihi cap
+    if p["exp"] + gain > exp_cap:
+        gain = exp_cap - p["exp"]
 
-            # Update cultivation data
-            ACTIVE_CULTIVATIONS[user_id]["total_gained"] += gain
+    # Update player
+    p["exp"] += gain
+    p["qi"] += qi_gain
+    p["base_power"] += power_gain
+    p["spirit_stones"] += spirit_stones_gain
+
+    # Update daily quest progress
+    p["daily_quests"]["cultivate_5"]["progress"] += 1
+    if p["daily_quests"]["cultivate_5"]["progress"] >= p["daily_quests"]["cultivate_5"].get("progress_needed", 5):
+        p["daily_quests"]["cultivate_5"]["completed"] = True
 
-            # Update message setiap 30 detik
-            if time.time() - ACTIVE_CULTIVATIONS[user_id].get("last_update", 0) >= 30:
-                await update_cultivation_message(user_id, p, realm_data)
-                ACTIVE_CULTIVATIONS[user_id]["last_update"] = time.time()
+    # Update power (multiplier teknik & set bonus dari cache derived stats)
+    DERIVED_STATS.refresh_power(user_id, p)
+    return gain
 
-            # Wait 1 second (User requested 10k per second)
-            await asyncio.sleep(1)
+async def cultivation_scheduler():
+    """Background task: tick semua entry ACTIVE_CULTIVATIONS dalam satu pass per detik
 
-    except Exception as e:
-        print(f"Error in cultivation task: {e}")
-    finally:
-        # Cleanup
+    Gain diterapkan langsung ke data di PLAYER_STORE; player cukup ditandai dirty,
+    writer thread yang menulis ke disk (satu batch untuk semua cultivator).
+    """
+    while True:
+        tick_start = time.monotonic()
+        now = time.time()
+        finished = []
+
+        for user_id, cultivation_data in list(ACTIVE_CULTIVATIONS.items()):
+            # Entry mode lazy tidak butuh kerja per detik
+            if not cultivation_data["active"] or cultivation_data.get("lazy"):
+                continue
+            try:
+                p = get_player(user_id)
+
+                # Cek jika sudah cap
+                if p is None or p["exp"] >= get_exp_cap(p):
+                    finished.append(user_id)
+                    continue
+
+                cultivation_data["total_gained"] += cultivation_tick(user_id, p)
+                update_player(user_id, p)
+
+                # Update message setiap 30 detik (edit Discord tidak menahan tick)
+                if now - cultivation_data.get("last_update", 0) >= 30:
+                    cultivation_data["last_update"] = now
+                    asyncio.create_task(update_cultivation_message(user_id, p, REALMS[p["realm"]]))
+            except Exception as e:
+                print(f"Error in cultivation task: {e}")
+                finished.append(user_id)
+
+        for user_id in finished:
+            ACTIVE_CULTIVATIONS[user_id]["active"] = False
+            asyncio.create_task(stop_cultivation(user_id, "completed"))
+
+        await asyncio.sleep(max(0, CULTIVATION_TICK - (time.monotonic() - tick_start)))
+
+def start_cultivation_scheduler():
+    """Jalankan cultivation_scheduler sekali saja"""
+    global CULTIVATION_TASK
+    if CULTIVATION_TASK is None or CULTIVATION_TASK.done():
+        CULTIVATION_TASK = asyncio.create_task(cultivation_scheduler())
+    return CULTIVATION_TASK
+
+# Mode idle cultivation: "tick" (scheduler per detik) atau "lazy" (gain dihitung saat dibaca)
+CULTIVATION_MODE = os.environ.get("CULTIVATION_MODE", "tick")
+
+def cultivation_rates(p):
+    """Rate per tick untuk mode lazy, sama dengan perhitungan cultivation_tick"""
+    realm_data = REALMS[p["realm"]]
+    race_data = RACES.get(p.get("race", "human"), RACES["human"])
+
+    exp_gain = int(5 * realm_data["exp_multiplier"])
+    if "exp" in race_data["bonuses"]:
+        exp_gain = int(exp_gain * (1 + race_data["bonuses"]["exp"]))
+
+    return {
+        "exp": exp_gain,
+        "qi": [10, 50],
+        "qi_bonus": race_data["bonuses"].get("qi", 0),
+        "power": [5, 15],
+        "spirit_stones": [10, max(10, realm_data["spirit_stone_gain"])]
+    }
+
+def settle_lazy_cultivation(user_id, p):
+    """Hitung gain lazy cultivation yang tertunda (dipanggil get_player)"""
+    if LAZY_CULTIVATION_KEY not in p:
+        return
+    if settle_lazy(p, get_exp_cap(p), CULTIVATION_TICK):
+        # Update power (multiplier teknik & set bonus dari cache derived stats)
+        DERIVED_STATS.refresh_power(user_id, p)
+        save_player(user_id)
+
+def refresh_lazy_rates(user_id, p):
+    """Pakai rate baru setelah write yang mengubah rate (breakthrough realm, reroll race)
+
+    get_player sudah settle sebelum mutasi; tick sejak itu dihitung dengan rate
+    lama, lalu tick berikutnya memakai rate baru. Timer EXP cap lama tetap jalan
+    dan menjadwalkan ulang sendiri di lazy_cap_check.
+    """
+    state = p.get(LAZY_CULTIVATION_KEY)
+    if not state:
+        return False
+    rates = cultivation_rates(p)
+    if rates == state["rates"]:
+        return False
+    if rerate_lazy(p, rates, get_exp_cap(p), CULTIVATION_TICK):
+        DERIVED_STATS.refresh_power(user_id, p)
+    return True
+
+def lazy_cultivation_view(user_id, p):
+    """Salinan player dengan gain lazy cultivation tertunda sudah dihitung (data asli tidak diubah)"""
+    view = dict(p)
+    view[LAZY_CULTIVATION_KEY] = dict(p[LAZY_CULTIVATION_KEY])
+    if "daily_quests" in p:
+        view["daily_quests"] = dict(p["daily_quests"])
+        if "cultivate_5" in view["daily_quests"]:
+            view["daily_quests"]["cultivate_5"] = dict(view["daily_quests"]["cultivate_5"])
+    if settle_lazy(view, get_exp_cap(view), CULTIVATION_TICK):
+        # Power dari cache stats player asli, hanya base_power yang berbeda
+        view["total_power"] = DERIVED_STATS.total_power(user_id, p, view["base_power"])
+    return view
+
+def track_lazy_cultivation(user_id, p, message=None):
+    """Daftarkan entry ACTIVE_CULTIVATIONS untuk lazy cultivation + jadwalkan cek EXP cap"""
+    state = p[LAZY_CULTIVATION_KEY]
+    ACTIVE_CULTIVATIONS[user_id] = {
+        "message": message,
+        "start_time": state["start"],
+        "total_gained": state["gained"],
+        "active": True,
+        "last_update": 0,
+        "lazy": True
+    }
+    schedule_lazy_cap_check(user_id, p)
+
+def schedule_lazy_cap_check(user_id, p):
+    """Satu timer di waktu EXP cap diperkirakan tercapai (bukan kerja per detik)"""
+    remaining = ticks_until_cap(p, get_exp_cap(p))
+    if remaining is None:
+        return
+    state = p[LAZY_CULTIVATION_KEY]
+    due = state["start"] + (state["ticks"] + remaining) * CULTIVATION_TICK
+    delay = max(CULTIVATION_TICK, due - time.time())
+    seed = state["seed"]
+    asyncio.get_running_loop().call_later(delay, lambda: asyncio.create_task(lazy_cap_check(user_id, seed)))
+
+async def lazy_cap_check(user_id, seed):
+    """Timer EXP cap: settle, lalu selesai jika sudah cap atau jadwalkan ulang (cap bisa berubah)"""
+    entry = ACTIVE_CULTIVATIONS.get(user_id)
+    if entry is None or not entry.get("lazy") or not entry["active"]:
+        return
+    p = get_player(user_id)
+    # Timer dari sesi cultivation sebelumnya (seed beda) diabaikan
+    if p is None or p.get(LAZY_CULTIVATION_KEY, {}).get("seed") != seed:
+        return
+    if p["exp"] >= get_exp_cap(p):
+        await stop_cultivation(user_id, "completed")
+    else:
+        schedule_lazy_cap_check(user_id, p)
+
+def resume_lazy_cultivations():
+    """Dipanggil on_ready: lazy cultivation tersimpan di data player, jadi lanjut setelah restart"""
+    for uid, p in load_data()["players"].items():
+        if isinstance(p, dict) and LAZY_CULTIVATION_KEY in p and int(uid) not in ACTIVE_CULTIVATIONS:
+            track_lazy_cultivation(int(uid), p)
+
+# ===============================
+# Session state - sesi aktif dilanjutkan setelah restart
+# ===============================
+SESSIONS_RESTORED = False
+# Sama dengan timeout wait_for di continue_exploration
+EXPLORATION_TIMEOUT = 300
+
+async def fetch_session_message(ref):
+    """Ambil ulang discord.Message dari referensi {channel_id, message_id}, None jika sudah tidak ada"""
+    if not ref:
+        return None
+    try:
+        channel = bot.get_channel(ref["channel_id"]) or await bot.fetch_channel(ref["channel_id"])
+        return await channel.fetch_message(ref["message_id"])
+    except Exception:
+        return None
+
+async def restore_sessions():
+    """Dipanggil on_ready: muat registry sesi tersimpan, re-attach message, hitung progress selama bot mati, lanjutkan task"""
+    global SESSIONS_RESTORED
+    if SESSIONS_RESTORED:
+        return
+    SESSIONS_RESTORED = True
+
+    SESSION_STATE.track("cultivations", ACTIVE_CULTIVATIONS, int)
+    SESSION_STATE.track("battles", ACTIVE_BATTLES)
+    SESSION_STATE.track("explorations", ACTIVE_EXPLORATIONS, int)
+    SESSION_STATE.track("treasure_hunts", active_explorations)
+    SESSION_STATE.track("formations", active_formations)
+
+    saved_at, sessions = SESSION_STATE.load()
+    now = time.time()
+    restored = 0
+
+    # Idle cultivation: tick yang terlewat selama bot mati dihitung sekaligus (closed form lazy)
+    for user_id, entry in sessions.get("cultivations", {}).items():
+        message = await fetch_session_message(entry.get("message"))
         if user_id in ACTIVE_CULTIVATIONS:
-            await stop_cultivation(user_id, "completed")
+            # Lazy cultivation sudah dilanjutkan dari data player, cukup pasang message-nya
+            if ACTIVE_CULTIVATIONS[user_id]["message"] is None:
+                ACTIVE_CULTIVATIONS[user_id]["message"] = message
+            restored += 1
+            continue
+        p = get_player(user_id)
+        if entry.get("lazy") or not entry.get("active") or p is None:
+            continue
+        if saved_at:
+            p[LAZY_CULTIVATION_KEY] = new_lazy_state(cultivation_rates(p), now=saved_at)
+            settle_lazy_cultivation(user_id, p)
+            entry["total_gained"] += p.pop(LAZY_CULTIVATION_KEY)["gained"]
+            update_player(user_id, p)
+        entry["message"] = message
+        ACTIVE_CULTIVATIONS[user_id] = entry
+        restored += 1
+
+    # Battle: lanjut dari round terakhir, message baru jika message lama hilang
+    for battle_id, entry in sessions.get("battles", {}).items():
+        if not entry.get("active") or battle_id in ACTIVE_BATTLES or "combatants" not in entry:
+            continue
+        channel = bot.get_channel(entry["channel_id"])
+        entry["message"] = await fetch_session_message(entry.get("message"))
+        if entry["message"] is None and channel is not None:
+            embed = discord.Embed(
+                title="⚔️ Battle Resumed!",
+                description=f"<@{entry['attacker']}> vs <@{entry['defender']}>",
+                color=0xff0000
+            )
+            try:
+                entry["message"] = await channel.send(embed=embed)
+            except Exception:
+                pass
+        entry["combatants"] = [Combatant(*combatant) for combatant in entry["combatants"]]
+        ENGAGEMENTS.claim("pvp", battle_id, entry["attacker"], entry["defender"])
+        ACTIVE_BATTLES[battle_id] = entry
+        asyncio.create_task(battle_task(battle_id, channel, resume=True))
+        restored += 1
+
+    # AI exploration: tunggu reaction lagi di message yang sama, kecuali sudah lewat timeout
+    downtime = now - saved_at if saved_at else 0
+    for user_id, entry in sessions.get("explorations", {}).items():
+        if user_id in ACTIVE_EXPLORATIONS:
+            continue
+        message = await fetch_session_message(entry.get("message"))
+        if message is None:
+            continue
+        if downtime >= EXPLORATION_TIMEOUT:
+            try:
+                await message.channel.send(f"⏰ <@{user_id}> Your adventure times out. You return safely from the wilderness.")
+            except Exception:
+                pass
+            continue
+        entry["message"] = message
+        ENGAGEMENTS.claim("exploration", user_id, user_id)
+        ACTIVE_EXPLORATIONS[user_id] = entry
+        asyncio.create_task(continue_exploration(message.channel, user_id))
+        restored += 1
+
+    # Treasure hunt & formation berbasis start_time + duration, progress dihitung saat dicek
+    for key, entry in sessions.get("treasure_hunts", {}).items():
+        active_explorations.setdefault(key, entry)
+        ENGAGEMENTS.claim("treasure_hunt", key, key, until=entry["start_time"] + entry["duration"])
+        restored += 1
+    for key, entry in sessions.get("formations", {}).items():
+        active_formations.setdefault(key, entry)
+        ENGAGEMENTS.claim("formation", key, *entry["participants"], until=formation_end(entry))
+        restored += 1
+
+    if restored:
+        print(f"♻️ Restored {restored} active sessions")
+    SESSION_STATE.start()
 
 # ===============================
 # Bot setup
@@ -2280,10 +2192,26 @@ async def on_ready():
     except Exception as e:
         print(f"Warning: Daily quest reset failed: {e}")
 
-    try:
-        backup_data()
-    except Exception as e:
-        print(f"Warning: Backup failed: {e}")
+    # Write-behind flush untuk PLAYER_STORE (base backup pertama dibuat writer thread)
+    PLAYER_STORE.start()
+
+    # Satu scheduler untuk semua idle cultivation, lazy cultivation dilanjutkan dari data player
+    start_cultivation_scheduler()
+    resume_lazy_cultivations()
+
+    # Sesi aktif (cultivation, battle, explore, treasure hunt, formation) dari sebelum restart
+    await restore_sessions()
+
+    # Sketch distribusi power (dari server_stats, atau dibangun dari data player)
+    POWER_STATS.load(load_data())
+
+    # Cache nama user untuk leaderboard / guild list, di-warm dari display_name player
+    NAME_RESOLVER.start(bot, load_data()["players"])
+
+    # Snapshot leaderboard (on_ready bisa terpanggil lagi saat reconnect, task cukup satu)
+    global LEADERBOARD_TASK
+    if LEADERBOARD_TASK is None or LEADERBOARD_TASK.done():
+        LEADERBOARD_TASK = asyncio.create_task(leaderboard_snapshot_loop())
     
     # Start world boss tasks jika system loaded
     if WORLD_BOSS_SYSTEM_LOADED:
@@ -2305,7 +2233,7 @@ async def on_message(message):
 
     # Process commands normally first, but if they need a faction choice, intercept
     if message.content.startswith(bot.command_prefix):
-        p = get_player(message.author.id)
+        p = peek_player(message.author.id)
         if p and "faction" not in p and p.get("race") in ["half_demon", "beast"]:
             # Check if they are already in the process of choosing
             flag_key = f"faction_choice_{message.author.id}"
@@ -2331,6 +2259,7 @@ async def on_message(message):
             try:
                 msg = await bot.wait_for('message', check=check, timeout=60.0)
                 faction = "Orthodox Alliance" if msg.content == '1' else "Demonic Cult"
+                p = get_player(message.author.id)
                 p["faction"] = faction
                 update_player(message.author.id, p)
                 await message.channel.send(f"✅ You have joined the **{faction}**! You can now use commands.")
@@ -2489,6 +2418,9 @@ async def register(ctx):
             player_data["faction"] = faction
             update_player(ctx.author.id, player_data)
 
+            # Pastikan akun baru sudah tersimpan di disk sebelum konfirmasi
+            await PLAYER_STORE.persist()
+
             embed = discord.Embed(
                 title="🎉 Registration Successful!",
                 description=f"Selamat datang {ctx.author.mention} di dunia cultivation!",
@@ -2519,7 +2451,7 @@ async def register(ctx):
 async def profile(ctx, member: discord.Member = None):
     """Lihat profil player dengan detail race dan gender"""
     target = member or ctx.author
-    p = get_player(target.id)
+    p = peek_player(target.id)
 
     if not p:
         if target == ctx.author:
@@ -2841,15 +2773,17 @@ async def explore(ctx):
     user_id = ctx.author.id
     p = get_player(user_id)
     
-    if user_id in ACTIVE_EXPLORATIONS:
-        return await ctx.send("⏳ You're already on an adventure! Use `!stop_explore` to end it.")
-    
     if not HF_TOKEN:
         return await ctx.send("❌ AI exploration system is unavailable. Missing API token.")
     
     # Initialize exploration health if not exists
     if p is None:
         return await ctx.send("❌ Player not found! Use `!register` first.")
+
+    # Satu adventure per player, dan tidak sambil battle / treasure hunt
+    conflict = ENGAGEMENTS.claim("exploration", user_id, user_id)
+    if conflict:
+        return await ctx.send(busy_message(conflict))
     if "exploration_health" not in p or p["exploration_health"] is None:
         p["exploration_health"] = 100
     
@@ -2916,8 +2850,14 @@ Keep responses under 150 words total."""
         await continue_exploration(ctx, user_id)
         
     except Exception as e:
+        end_exploration(user_id)
         await ctx.send(f"❌ Error starting AI adventure: {str(e)}")
 
+def end_exploration(user_id):
+    """Hapus exploration aktif dan lepas engagement-nya"""
+    ACTIVE_EXPLORATIONS.pop(user_id, None)
+    ENGAGEMENTS.release("exploration", user_id, user_id)
+
 async def continue_exploration(ctx, user_id):
     """Continue the AI-driven exploration based on player choice"""
     if user_id not in ACTIVE_EXPLORATIONS:
@@ -2936,7 +2876,7 @@ async def continue_exploration(ctx, user_id):
         
         if str(reaction.emoji) == '❌':
             # Player chooses to stop
-            del ACTIVE_EXPLORATIONS[user_id]
+            end_exploration(user_id)
             embed = discord.Embed(
                 title="🏠 Adventure Ended",
                 description="You decide to return safely from your exploration.",
@@ -2952,7 +2892,7 @@ async def continue_exploration(ctx, user_id):
         if choice_num:
             p = get_player(user_id)
             if p is None:
-                del ACTIVE_EXPLORATIONS[user_id]
+                end_exploration(user_id)
                 return
             
             # Calculate outcome
@@ -2964,7 +2904,7 @@ async def continue_exploration(ctx, user_id):
             # Check for death
             if p["exploration_health"] <= 0:
                 # DEATH - End exploration
-                del ACTIVE_EXPLORATIONS[user_id]
+                end_exploration(user_id)
                 p["exploration_health"] = 100  # Reset for next time
                 
                 embed = discord.Embed(
@@ -3073,7 +3013,7 @@ Keep under 150 words."""
     except asyncio.TimeoutError:
         # Timeout - end exploration
         if user_id in ACTIVE_EXPLORATIONS:
-            del ACTIVE_EXPLORATIONS[user_id]
+            end_exploration(user_id)
         await ctx.send("⏰ Your adventure times out. You return safely from the wilderness.")
 
 @bot.command()
@@ -3083,7 +3023,7 @@ async def stop_explore(ctx):
     
     if user_id in ACTIVE_EXPLORATIONS:
         turns = ACTIVE_EXPLORATIONS[user_id].get("turn", 1)
-        del ACTIVE_EXPLORATIONS[user_id]
+        end_exploration(user_id)
         
         embed = discord.Embed(
             title="🏠 Exploration Ended",
@@ -3205,25 +3145,23 @@ async def boss(ctx, action: str = None, boss_name: str = None):
 @bot.command()
 async def myrealm(ctx):
     """Lihat info detail tentang realm kamu sekarang"""
-    p = get_player(ctx.author.id)
+    p = peek_player(ctx.author.id)
     if not p:
         return await ctx.send("❌ Anda belum terdaftar! Gunakan `!register` untuk memulai.")
 
     realm_data = REALMS[p["realm"]]
-    current_stage_idx = realm_data["stages"].index(p["stage"])
-    current_exp_cap = get_exp_cap(p)
+    info = PROGRESSION[(p["realm"], p["stage"])]
+    current_stage_idx = info.stage_index
+    current_exp_cap = info.exp_cap
 
     next_stage = None
     exp_needed = None
-    if current_stage_idx + 1 < len(realm_data["stages"]):
-        next_stage = realm_data["stages"][current_stage_idx + 1]
+    if info.next_realm == p["realm"]:
+        next_stage = info.next_stage
         exp_needed = int((current_stage_idx + 2) * 100 * realm_data["exp_multiplier"])
-    else:
-        realm_idx = REALM_ORDER.index(p["realm"])
-        if realm_idx + 1 < len(REALM_ORDER):
-            next_realm = REALM_ORDER[realm_idx + 1]
-            next_stage = f"Ascend to {next_realm}"
-            exp_needed = current_exp_cap
+    elif info.next_realm is not None:
+        next_stage = f"Ascend to {info.next_realm}"
+        exp_needed = current_exp_cap
 
     embed = discord.Embed(
         title=f"🌠 {ctx.author.name}'s Realm Progress",
@@ -3272,24 +3210,18 @@ async def myrealm(ctx):
 @bot.command()
 async def progress(ctx):
     """Lihat progress cultivation secara keseluruhan"""
-    p = get_player(ctx.author.id)
+    p = peek_player(ctx.author.id)
     if not p:
         return await ctx.send("❌ Anda belum terdaftar! Gunakan `!register` untuk memulai.")
 
     realm_data = REALMS[p["realm"]]
-    current_stage_idx = realm_data["stages"].index(p["stage"])
-    current_exp_cap = get_exp_cap(p)
+    info = PROGRESSION[(p["realm"], p["stage"])]
+    current_stage_idx = info.stage_index
+    current_exp_cap = info.exp_cap
     stage_progress = (p["exp"] / current_exp_cap) * 100
 
-    total_stages = sum(len(REALMS[realm]["stages"]) for realm in REALMS)
-    current_global_stage = 0
-
-    for realm in REALM_ORDER:
-        if realm == p["realm"]:
-            current_global_stage += current_stage_idx + 1
-            break
-        else:
-            current_global_stage += len(REALMS[realm]["stages"])
+    total_stages = len(PROGRESSION)
+    current_global_stage = info.ordinal + 1
 
     global_progress = (current_global_stage / total_stages) * 100
 
@@ -3325,7 +3257,7 @@ async def progress(ctx):
             next_milestone = realm_data["stages"][current_stage_idx + 1]
             next_exp_needed = int((current_stage_idx + 2) * 100 * realm_data["exp_multiplier"])
         else:
-            next_realm_idx = REALM_ORDER.index(p["realm"]) + 1
+            next_realm_idx = info.realm_index + 1
             if next_realm_idx < len(REALM_ORDER):
                 next_milestone = REALM_ORDER[next_realm_idx]
                 next_realm_data = REALMS[REALM_ORDER[next_realm_idx]]
@@ -3367,7 +3299,12 @@ async def cultivate(ctx):
         qi_gain = int(qi_gain * (1 + race_data["bonuses"]["qi"]))
 
     power_gain = random.randint(50, 150)
-    
+
+    # Apply spirit beast bonus
+    gain, qi_gain, power_gain = apply_beast_bonuses(
+        DERIVED_STATS.get(ctx.author.id, p)["beast_profile"], gain, qi_gain, power_gain
+    )
+
     # Ensure min <= max for spirit stones
     ss_max = max(100, realm_data["spirit_stone_gain"] * 10)
     spirit_stones_gain = random.randint(100, ss_max)
@@ -3387,8 +3324,7 @@ async def cultivate(ctx):
     if p["daily_quests"]["cultivate_5"]["progress"] >= p["daily_quests"]["cultivate_5"].get("progress_needed", 5):
         p["daily_quests"]["cultivate_5"]["completed"] = True
 
-    technique_bonus = 1 + sum(t['power_bonus'] for t in p["techniques"])
-    p["total_power"] = int(p["base_power"] * technique_bonus)
+    DERIVED_STATS.refresh_power(ctx.author.id, p)
 
     update_player(ctx.author.id, p)
 
@@ -3425,7 +3361,6 @@ async def start_cultivate(ctx):
     if not p:
         return await ctx.send("❌ Anda belum terdaftar! Gunakan `!register` untuk memulai.")
 
-    realm_data = REALMS[p["realm"]]
     exp_cap = get_exp_cap(p)
 
     # Cek jika sudah mencapai cap
@@ -3448,6 +3383,13 @@ async def start_cultivate(ctx):
 
     message = await ctx.send(embed=embed)
 
+    if CULTIVATION_MODE == "lazy":
+        # Hanya start_time, rate dan seed yang disimpan; gain dihitung saat player dibaca
+        p[LAZY_CULTIVATION_KEY] = new_lazy_state(cultivation_rates(p))
+        update_player(ctx.author.id, p)
+        track_lazy_cultivation(ctx.author.id, p, message)
+        return
+
     # Start idle cultivation
     ACTIVE_CULTIVATIONS[ctx.author.id] = {
         "message": message,
@@ -3457,8 +3399,8 @@ async def start_cultivate(ctx):
         "last_update": 0
     }
 
-    # Start background task
-    asyncio.create_task(idle_cultivation_task(ctx.author.id, p, realm_data))
+    # Scheduler pusat yang menjalankan tick (dipastikan sudah jalan)
+    start_cultivation_scheduler()
 
 # ===============================
 # Command: stop_cultivate
@@ -3485,7 +3427,7 @@ async def cultivate_status(ctx):
     duration = time.time() - cultivation_data["start_time"]
     hours = duration / 3600
 
-    p = get_player(ctx.author.id)
+    p = peek_player(ctx.author.id)
     if not p:
         return await ctx.send("❌ Anda belum terdaftar! Gunakan `!register` untuk mulai.")
         
@@ -3522,7 +3464,7 @@ async def breakthrough(ctx):
         
     realm_data = REALMS[p["realm"]]
     stages = realm_data["stages"]
-    current_stage_idx = stages.index(p["stage"])
+    current_stage_idx = PROGRESSION[(p["realm"], p["stage"])].stage_index
 
     # Current stage EXP cap adalah requirement breakthrough
     required_exp = get_exp_cap(p)
@@ -3575,15 +3517,13 @@ async def breakthrough(ctx):
             p["daily_quests"]["breakthrough"]["completed"] = True
 
         # Recalculate total power
-        technique_bonus = 1 + sum(t['power_bonus'] for t in p["techniques"])
-        set_bonus = calculate_set_bonus(p["equipment"])
-        p["total_power"] = int(p["base_power"] * technique_bonus * (1 + set_bonus))
+        DERIVED_STATS.refresh_power(ctx.author.id, p)
 
         message = f"🔥 {ctx.author.mention} broke through to **{next_stage}**! ({excess_exp} EXP carried over)"
 
     else:
         # Naik ke realm berikutnya
-        realm_idx = REALM_ORDER.index(p["realm"])
+        realm_idx = PROGRESSION[(p["realm"], p["stage"])].realm_index
         if realm_idx + 1 < len(REALM_ORDER):
             next_realm = REALM_ORDER[realm_idx + 1]
             p["realm"] = next_realm
@@ -3601,9 +3541,7 @@ async def breakthrough(ctx):
                 p["daily_quests"]["breakthrough"]["completed"] = True
 
             # Recalculate total power
-            technique_bonus = 1 + sum(t['power_bonus'] for t in p["techniques"])
-            set_bonus = calculate_set_bonus(p["equipment"])
-            p["total_power"] = int(p["base_power"] * technique_bonus * (1 + set_bonus))
+            DERIVED_STATS.refresh_power(ctx.author.id, p)
 
             message = f"🌟 {ctx.author.mention} ascended to **{next_realm}**! ({excess_exp} EXP carried over)"
             
@@ -3612,7 +3550,7 @@ async def breakthrough(ctx):
             if next_realm in ["Immortal", "God Realm", "God"]:
                 if f"first_{next_realm.lower()}" not in data:
                     data[f"first_{next_realm.lower()}"] = str(ctx.author.id)
-                    save_data(data)
+                    save_section("meta")
                     announcement_embed = discord.Embed(
                         title="🌌 LEGENDARY ASCENSION 🌌",
                         description=f"***The heavens tremble as the first {next_realm} is born!***\n\n"
@@ -3626,9 +3564,7 @@ async def breakthrough(ctx):
 
     update_player(ctx.author.id, p)
 
-    data = load_data()
-    data["server_stats"]["total_breakthroughs"] += 1
-    save_data(data)
+    bump_server_stat("total_breakthroughs")
 
     # Kirim embed yang informatif
     embed = discord.Embed(
@@ -3716,7 +3652,8 @@ async def learn_technique(ctx, technique_id: str):
     p["spirit_stones"] -= technique["cost"]
     p["techniques"].append(technique)
     p["techniques_learned"] += 1
-    p["total_power"] = int(p["base_power"] * (1 + sum(t['power_bonus'] for t in p["techniques"])))
+    DERIVED_STATS.invalidate(ctx.author.id, "techniques")
+    DERIVED_STATS.refresh_power(ctx.author.id, p)
 
     # Remove from discovered techniques
     p["discovered_techniques"] = [tech for tech in p.get("discovered_techniques", []) if tech.get("id") != technique_id]
@@ -3734,9 +3671,7 @@ async def learn_technique(ctx, technique_id: str):
 
     update_player(ctx.author.id, p)
 
-    data = load_data()
-    data["server_stats"]["total_techniques_learned"] += 1
-    save_data(data)
+    bump_server_stat("total_techniques_learned")
 
     embed = discord.Embed(
         title="🎓 Technique Learned!",
@@ -3799,7 +3734,7 @@ if WORLD_BOSS_SYSTEM_LOADED:
 @bot.command()
 async def my_techniques(ctx):
     """Lihat semua teknik yang sudah dipelajari"""
-    p = get_player(ctx.author.id)
+    p = peek_player(ctx.author.id)
     if not p:
         return await ctx.send("❌ Anda belum terdaftar! Gunakan `!register` untuk memulai.")
 
@@ -3844,7 +3779,7 @@ async def my_techniques(ctx):
 @bot.command()
 async def discovered_techniques(ctx):
     """Lihat teknik yang sudah ditemukan tapi belum dipelajari"""
-    p = get_player(ctx.author.id)
+    p = peek_player(ctx.author.id)
     if not p:
         return await ctx.send("❌ Anda belum terdaftar! Gunakan `!register` untuk memulai.")
 
@@ -3875,7 +3810,7 @@ async def discovered_techniques(ctx):
 # ===============================
 @bot.command()
 async def status(ctx):
-    p = get_player(ctx.author.id)
+    p = peek_player(ctx.author.id)
     if not p:
         return await ctx.send("❌ Anda belum terdaftar! Gunakan `!register` untuk memulai.")
 
@@ -3906,9 +3841,8 @@ async def status(ctx):
     )
 
     # Power stats
-    technique_bonus = sum(t['power_bonus'] for t in p['techniques'])
-    set_bonus = calculate_set_bonus(p['equipment'])
-    total_bonus = technique_bonus + set_bonus
+    derived = DERIVED_STATS.get(ctx.author.id, p)
+    total_bonus = derived["technique_multiplier"] - 1 + derived["set_bonus"]
 
     embed.add_field(
         name="⭐ Power Stats",
@@ -3940,7 +3874,7 @@ async def status(ctx):
 @bot.command()
 async def shop(ctx, realm: str = None):
     """Lihat item yang tersedia di shop - gunakan !shop [realm] untuk filter"""
-    p = get_player(ctx.author.id)
+    p = peek_player(ctx.author.id)
     if not p:
         return await ctx.send("❌ Anda belum terdaftar! Gunakan `!register` untuk memulai.")
 
@@ -4065,9 +3999,8 @@ async def buy(ctx, item_id: str):
     p["equipment"][item_id] = item_data["power"]
 
     # Recalculate total power
-    technique_bonus = 1 + sum(t['power_bonus'] for t in p["techniques"])
-    set_bonus = calculate_set_bonus(p["equipment"])
-    p["total_power"] = int((p["base_power"] + sum(p["equipment"].values())) * technique_bonus * (1 + set_bonus))
+    DERIVED_STATS.invalidate(ctx.author.id, "equipment")
+    DERIVED_STATS.refresh_power(ctx.author.id, p)
 
     update_player(ctx.author.id, p)
 
@@ -4089,7 +4022,7 @@ async def buy(ctx, item_id: str):
 @bot.command()
 async def inventory(ctx):
     """Lihat inventory dan equipment yang dimiliki"""
-    p = get_player(ctx.author.id)
+    p = peek_player(ctx.author.id)
     if not p:
         return await ctx.send("❌ Anda belum terdaftar! Gunakan `!register` untuk memulai.")
 
@@ -4213,9 +4146,8 @@ async def sell(ctx, item_id: str):
     p["qi"] += sell_price
 
     # Recalculate power
-    technique_bonus = 1 + sum(t['power_bonus'] for t in p["techniques"])
-    set_bonus = calculate_set_bonus(p["equipment"])
-    p["total_power"] = int((p["base_power"] + sum(p["equipment"].values())) * technique_bonus * (1 + set_bonus))
+    DERIVED_STATS.invalidate(ctx.author.id, "equipment")
+    DERIVED_STATS.refresh_power(ctx.author.id, p)
 
     update_player(ctx.author.id, p)
 
@@ -4243,8 +4175,8 @@ async def pvp(ctx, member: discord.Member):
     if member.bot:
         return await ctx.send("❌ Anda tidak bisa battle dengan bot!")
 
-    attacker = get_player(ctx.author.id)
-    defender = get_player(member.id)
+    attacker = peek_player(ctx.author.id)
+    defender = peek_player(member.id)
 
     if not attacker or not defender:
         return await ctx.send("❌ Salah satu player belum terdaftar! Gunakan `!register` untuk memulai.")
@@ -4253,35 +4185,255 @@ async def pvp(ctx, member: discord.Member):
     if defender["total_power"] < 10:
         return await ctx.send("❌ Player tersebut terlalu lemah untuk battle!")
 
+    conflict = ENGAGEMENTS.busy(ctx.author.id, member.id)
+    if conflict:
+        return await ctx.send(busy_message(conflict))
+
     embed = discord.Embed(
         title="⚔️ Battle Challenge",
         description=f"{ctx.author.mention} menantang {member.mention} untuk battle!",
         color=0xff0000
     )
-    embed.add_field(name="Attacker Power", value=attacker["total_power"], inline=True)
-    embed.add_field(name="Defender Power", value=defender["total_power"], inline=True)
-    embed.add_field(name="Cooldown", value="5 menit", inline=True)
+    embed.add_field(name="Attacker Power", value=attacker["total_power"], inline=True)
+    embed.add_field(name="Defender Power", value=defender["total_power"], inline=True)
+    embed.add_field(name="Cooldown", value="5 menit", inline=True)
+
+    message = await ctx.send(embed=embed)
+
+    # Add reaction for acceptance
+    await message.add_reaction('✅')
+    await message.add_reaction('❌')
+
+    def check(reaction, user):
+        return user == member and str(reaction.emoji) in ['✅', '❌'] and reaction.message.id == message.id
+
+    try:
+        reaction, user = await bot.wait_for('reaction_add', timeout=60.0, check=check)
+
+        if str(reaction.emoji) == '✅':
+            await ctx.send(f"🎉 {member.mention} menerima tantangan! Memulai battle...")
+            await start_battle(ctx.author.id, member.id, ctx)
+        else:
+            await ctx.send(f"❌ {member.mention} menolak tantangan battle.")
+
+    except asyncio.TimeoutError:
+        await ctx.send("⏰ Waktu penerimaan battle habis!")
+
+@bot.command()
+async def pvp_odds(ctx, member: discord.Member = None):
+    """Perkiraan peluang menang PvP melawan player lain (simulasi Monte Carlo)"""
+    if member is None:
+        return await ctx.send("❌ Gunakan: `!pvp_odds @user`")
+    if member.id == ctx.author.id:
+        return await ctx.send("❌ Tidak bisa menghitung peluang melawan diri sendiri!")
+
+    attacker = peek_player(ctx.author.id)
+    defender = peek_player(member.id)
+    if attacker is None:
+        return await ctx.send("❌ Anda belum terdaftar! Gunakan `!register` untuk memulai.")
+    if defender is None:
+        return await ctx.send("❌ Player tersebut belum terdaftar!")
+
+    combatants = [
+        player_combatant(ctx.author.id, attacker, battle_power(ctx.author.id, attacker)[0]),
+        player_combatant(member.id, defender, battle_power(member.id, defender)[0])
+    ]
+    odds = await asyncio.to_thread(simulate_odds, *combatants)
+
+    embed = discord.Embed(
+        title="🎲 PvP Odds",
+        description=f"{ctx.author.mention} vs {member.mention}",
+        color=0xff9900
+    )
+    embed.add_field(name="Win Chance", value=f"**{odds.attacker_win_rate:.1%}**", inline=True)
+    embed.add_field(name="Avg Rounds", value=f"{odds.average_rounds:.1f}", inline=True)
+    embed.add_field(
+        name="Avg HP Left",
+        value=f"You: {odds.attacker_hp:.0f}% | Them: {odds.defender_hp:.0f}%",
+        inline=True
+    )
+    embed.set_footer(text=f"Berdasarkan {odds.fights:,} simulasi battle")
+    await ctx.send(embed=embed)
+
+@bot.command()
+async def pvp_replay(ctx):
+    """Putar ulang battle instant terakhir kamu, satu round per beberapa detik"""
+    replay = BATTLE_REPLAYS.get(str(ctx.author.id))
+    if replay is None:
+        return await ctx.send("❌ Belum ada battle instant yang bisa diputar ulang!")
+
+    battle_data = {"attacker": replay.attacker.player_id, "defender": replay.defender.player_id}
+    logs = replay_log(replay)
+
+    embed = discord.Embed(
+        title="📼 Battle Replay",
+        description=f"<@{battle_data['attacker']}> vs <@{battle_data['defender']}>",
+        color=0xff0000
+    )
+    embed.add_field(name="HP", value="❤️ 100% | ❤️ 100%", inline=False)
+    message = await ctx.send(embed=embed)
+
+    for log in logs:
+        await asyncio.sleep(BATTLE_REPLAY_INTERVAL)
+        try:
+            await message.edit(embed=battle_round_embed(battle_data, log))
+        except:
+            return
+
+    winner_id = battle_data["attacker"] if attacker_wins(logs[-1].attacker_hp, logs[-1].defender_hp) else battle_data["defender"]
+    await ctx.send(f"🏁 Replay selesai: <@{winner_id}> wins!")
+
+# ===============================
+# Leaderboard snapshot - halaman teratas power / PvP dan !top dibangun
+# di background, command cukup mengirim embed yang sudah jadi
+# ===============================
+LEADERBOARD_REFRESH_INTERVAL = int(os.environ.get("LEADERBOARD_REFRESH_INTERVAL", "30"))
+LEADERBOARD_CACHED_PAGES = int(os.environ.get("LEADERBOARD_CACHED_PAGES", "3"))
+LEADERBOARD_CACHE = {}  # ("power"|"pvp"|"pvp_winrate", page) / ("top", count) -> discord.Embed
+LEADERBOARD_TASK = None
+
+def stamp_snapshot(embed, footer):
+    """Tandai embed sebagai snapshot: footer + timestamp pembuatan (Discord menampilkan umurnya)"""
+    embed.set_footer(text=f"{footer} | Snapshot, diperbarui tiap {LEADERBOARD_REFRESH_INTERVAL}s")
+    embed.timestamp = datetime.datetime.now(datetime.timezone.utc)
+    return embed
+
+async def build_leaderboard_embed(page, snapshot=False):
+    """Embed satu halaman leaderboard power"""
+    items_per_page = 10
+    total_players = PLAYER_STORE.count_players()
+    total_pages = (total_players + items_per_page - 1) // items_per_page
+
+    # Ambil satu halaman saja, terurut berdasarkan total power
+    start_idx = (page - 1) * items_per_page
+    page_players = PLAYER_STORE.ranked_players("power", items_per_page, start_idx)
+    names = await NAME_RESOLVER.resolve_many([uid for uid, _ in page_players])
+
+    # Title unik dibaca sekali per halaman, bukan per baris
+    data = load_data()
+    first_immortal = data.get("first_immortal")
+    first_god = data.get("first_god")
+
+    embed = discord.Embed(
+        title="🏆 Cultivation Leaderboard",
+        description=f"Top cultivators by power (Page {page}/{total_pages})",
+        color=0xffd700
+    )
+
+    for i, (uid, player) in enumerate(page_players, start=start_idx + 1):
+        username = names.get(uid, f"Unknown User ({uid})")
+
+        # Unique Titles Logic for Leaderboard
+        title_suffix = ""
+        if i == 1 and page == 1:
+            title_suffix += " 🏆 [Strongest Under Heaven]"
+
+        if first_immortal == str(uid):
+            title_suffix += " ✨ [Immortal Lord]"
+        elif first_god == str(uid):
+            title_suffix += " 🌌 [God of Creation]"
+
+        embed.add_field(
+            name=f"{i}. {username}{title_suffix}",
+            value=f"**Power:** {player['total_power']:,} | **Realm:** {player['realm']}\n**Stage:** {player['stage']} | **Wins:** {player['pvp_wins']}",
+            inline=False
+        )
+
+    footer = f"Total players: {total_players} | Use !leaderboard [page] untuk halaman lain"
+    if snapshot:
+        return stamp_snapshot(embed, footer)
+    embed.set_footer(text=footer)
+    return embed
+
+async def build_pvp_embed(order, page, snapshot=False):
+    """Embed satu halaman ranking PvP (order "pvp" atau "pvp_winrate")"""
+    items_per_page = 10
+    total_players = PLAYER_STORE.count_ranked(order)
+    total_pages = (total_players + items_per_page - 1) // items_per_page
+
+    # Ambil satu halaman saja dari PvP rank index
+    start_idx = (page - 1) * items_per_page
+    page_players = PLAYER_STORE.ranked_players(order, items_per_page, start_idx)
+    names = await NAME_RESOLVER.resolve_many([uid for uid, _ in page_players])
+
+    if order == "pvp_winrate":
+        title = "⚔️ PvP Win Rate Leaderboard"
+        description = f"Best win rate, minimal {PVP_MIN_MATCHES} match (Page {page}/{total_pages})"
+    else:
+        title = "⚔️ PvP Leaderboard"
+        description = f"Top PvP fighters (Page {page}/{total_pages})"
+
+    embed = discord.Embed(
+        title=title,
+        description=description,
+        color=0xff0000
+    )
+
+    for i, (uid, player) in enumerate(page_players, start=start_idx + 1):
+        username = names.get(uid, f"Unknown User ({uid})")
+
+        win_rate = player["pvp_wins"] / max(1, player["pvp_wins"] + player["pvp_losses"]) * 100
+
+        embed.add_field(
+            name=f"{i}. {username}",
+            value=f"**Wins:** {player['pvp_wins']} | **Losses:** {player['pvp_losses']}\n**Win Rate:** {win_rate:.1f}% | **Power:** {player['total_power']}",
+            inline=False
+        )
+
+    footer = f"Total players: {total_players} | Use !pvp_rank [page] [wins/winrate]"
+    if snapshot:
+        return stamp_snapshot(embed, footer)
+    embed.set_footer(text=footer)
+    return embed
+
+def build_top_embed(count, ranked, names, snapshot=False):
+    """Embed !top dari list (uid, player) yang sudah terurut"""
+    embed = discord.Embed(
+        title=f"🏆 Top {count} Cultivators",
+        description="Most powerful cultivators in the realm",
+        color=0xffd700
+    )
 
-    message = await ctx.send(embed=embed)
+    for i, (uid, player) in enumerate(ranked[:count], start=1):
+        username = names.get(uid, f"Unknown User ({uid})")
 
-    # Add reaction for acceptance
-    await message.add_reaction('✅')
-    await message.add_reaction('❌')
+        embed.add_field(
+            name=f"{i}. {username}",
+            value=f"**Power:** {player['total_power']} | **Realm:** {player['realm']}\n**Stage:** {player['stage']} | **Wins:** {player['pvp_wins']}",
+            inline=False
+        )
 
-    def check(reaction, user):
-        return user == member and str(reaction.emoji) in ['✅', '❌'] and reaction.message.id == message.id
+    if snapshot:
+        return stamp_snapshot(embed, f"Top {count} dari {PLAYER_STORE.count_players()} players")
+    return embed
 
-    try:
-        reaction, user = await bot.wait_for('reaction_add', timeout=60.0, check=check)
+async def refresh_leaderboard_cache():
+    """Bangun ulang semua embed snapshot lalu ganti isi cache sekaligus"""
+    snapshot = {}
+    for order in ("power", "pvp", "pvp_winrate"):
+        total_pages = (PLAYER_STORE.count_ranked(order) + 9) // 10
+        for page in range(1, min(total_pages, LEADERBOARD_CACHED_PAGES) + 1):
+            if order == "power":
+                snapshot[(order, page)] = await build_leaderboard_embed(page, snapshot=True)
+            else:
+                snapshot[(order, page)] = await build_pvp_embed(order, page, snapshot=True)
 
-        if str(reaction.emoji) == '✅':
-            await ctx.send(f"🎉 {member.mention} menerima tantangan! Memulai battle...")
-            await start_battle(ctx.author.id, member.id, ctx)
-        else:
-            await ctx.send(f"❌ {member.mention} menolak tantangan battle.")
+    ranked = PLAYER_STORE.ranked_players("power", 20)
+    names = await NAME_RESOLVER.resolve_many([uid for uid, _ in ranked])
+    for count in range(1, 21):
+        snapshot[("top", count)] = build_top_embed(count, ranked, names, snapshot=True)
 
-    except asyncio.TimeoutError:
-        await ctx.send("⏰ Waktu penerimaan battle habis!")
+    LEADERBOARD_CACHE.clear()
+    LEADERBOARD_CACHE.update(snapshot)
+
+async def leaderboard_snapshot_loop():
+    """Background task: refresh snapshot leaderboard setiap LEADERBOARD_REFRESH_INTERVAL detik"""
+    while True:
+        try:
+            await refresh_leaderboard_cache()
+        except Exception as e:
+            print(f"❌ Error refreshing leaderboard snapshot: {e}")
+        await asyncio.sleep(LEADERBOARD_REFRESH_INTERVAL)
 
 # ===============================
 # Command: leaderboard
@@ -4289,59 +4441,19 @@ async def pvp(ctx, member: discord.Member):
 @bot.command()
 async def leaderboard(ctx, page: int = 1):
     """Lihat ranking cultivator"""
-    players = get_all_players()
+    total_players = PLAYER_STORE.count_players()
 
-    if not players:
+    if not total_players:
         return await ctx.send("❌ Belum ada player yang terdaftar!")
 
-    # Sort players by total power
-    sorted_players = sorted(
-        [(uid, data) for uid, data in players.items() if data is not None],
-        key=lambda x: x[1].get("total_power", 0),
-        reverse=True
-    )
-
     items_per_page = 10
-    total_pages = (len(sorted_players) + items_per_page - 1) // items_per_page
+    total_pages = (total_players + items_per_page - 1) // items_per_page
 
     if page < 1 or page > total_pages:
         return await ctx.send(f"❌ Halaman {page} tidak valid! Total halaman: {total_pages}")
 
-    start_idx = (page - 1) * items_per_page
-    end_idx = start_idx + items_per_page
-    page_players = sorted_players[start_idx:end_idx]
-
-    embed = discord.Embed(
-        title="🏆 Cultivation Leaderboard",
-        description=f"Top cultivators by power (Page {page}/{total_pages})",
-        color=0xffd700
-    )
-
-    for i, (uid, player) in enumerate(page_players, start=start_idx + 1):
-        try:
-            user = await bot.fetch_user(int(uid))
-            username = user.name
-        except:
-            username = f"Unknown User ({uid})"
-
-        # Unique Titles Logic for Leaderboard
-        title_suffix = ""
-        if i == 1 and page == 1:
-            title_suffix += " 🏆 [Strongest Under Heaven]"
-        
-        data = load_data()
-        if data.get("first_immortal") == str(uid):
-            title_suffix += " ✨ [Immortal Lord]"
-        elif data.get("first_god") == str(uid):
-            title_suffix += " 🌌 [God of Creation]"
-
-        embed.add_field(
-            name=f"{i}. {username}{title_suffix}",
-            value=f"**Power:** {player['total_power']:,} | **Realm:** {player['realm']}\n**Stage:** {player['stage']} | **Wins:** {player['pvp_wins']}",
-            inline=False
-        )
-
-    embed.set_footer(text=f"Total players: {len(sorted_players)} | Use !leaderboard [page] untuk halaman lain")
+    # Halaman teratas diambil dari snapshot, sisanya dibangun langsung
+    embed = LEADERBOARD_CACHE.get(("power", page)) or await build_leaderboard_embed(page)
     await ctx.send(embed=embed)
 
 # ===============================
@@ -4350,31 +4462,19 @@ async def leaderboard(ctx, page: int = 1):
 @bot.command()
 async def myrank(ctx):
     """Lihat ranking Anda"""
-    players = get_all_players()
     player_id = str(ctx.author.id)
+    player_data = peek_player(player_id)
 
-    if player_id not in players:
+    if player_data is None:
         return await ctx.send("❌ Anda belum terdaftar! Gunakan `!register` untuk memulai.")
 
-    # Sort players by total power
-    sorted_players = sorted(
-        [(uid, data) for uid, data in players.items() if data is not None],
-        key=lambda x: x[1].get("total_power", 0),
-        reverse=True
-    )
-
-    # Find player's rank
-    player_rank = None
-    for rank, (uid, _) in enumerate(sorted_players, start=1):
-        if uid == player_id:
-            player_rank = rank
-            break
+    # Find player's rank (O(log n) lewat rank index)
+    player_rank = PLAYER_STORE.rank_of(player_id, "power")
 
     if player_rank is None:
         return await ctx.send("❌ Ranking tidak ditemukan!")
 
-    player_data = players[player_id]
-    total_players = len(sorted_players)
+    total_players = PLAYER_STORE.count_players()
     percentile = (player_rank / total_players) * 100
 
     embed = discord.Embed(
@@ -4390,9 +4490,14 @@ async def myrank(ctx):
     embed.add_field(name="Total Players", value=total_players, inline=True)
     embed.add_field(name="Percentile", value=f"Top {percentile:.1f}%", inline=True)
 
+    # Posisi di dalam realm sendiri (perkiraan dari sketch per realm)
+    realm_percentile = POWER_STATS.percentile(player_data["total_power"], player_data["realm"])
+    if realm_percentile is not None:
+        embed.add_field(name="Realm Percentile", value=f"Top {realm_percentile:.1f}% di {player_data['realm']}", inline=True)
+
     # Progress to next rank
     if player_rank > 1:
-        next_player_power = sorted_players[player_rank-2][1]["total_power"]
+        next_player_power = PLAYER_STORE.ranked_players("power", 1, player_rank-2)[0][1]["total_power"]
         power_needed = next_player_power - player_data["total_power"] + 1
         embed.add_field(
             name="Next Rank",
@@ -4406,52 +4511,29 @@ async def myrank(ctx):
 # Command: pvp_rank
 # ===============================
 @bot.command()
-async def pvp_rank(ctx, page: int = 1):
-    """Lihat ranking PvP"""
-    players = get_all_players()
-
-    if not players:
+async def pvp_rank(ctx, page: int = 1, view: str = "wins"):
+    """Lihat ranking PvP (!pvp_rank [page] winrate = urut win rate, minimal 10 match)"""
+    order = "pvp_winrate" if view.lower() in ("winrate", "wr") else "pvp"
+    total_players = PLAYER_STORE.count_ranked(order)
+
+    if not total_players:
+        if order == "pvp_winrate":
+            return await ctx.send(f"❌ Belum ada player dengan minimal {PVP_MIN_MATCHES} match PvP!")
         return await ctx.send("❌ Belum ada player yang terdaftar!")
 
-    # Sort players by PvP wins
-    sorted_players = sorted(
-        [(uid, data) for uid, data in players.items() if data is not None],
-        key=lambda x: (x[1].get("pvp_wins", 0), -x[1].get("pvp_losses", 0)),
-        reverse=True
-    )
-
     items_per_page = 10
-    total_pages = (len(sorted_players) + items_per_page - 1) // items_per_page
+    total_pages = (total_players + items_per_page - 1) // items_per_page
 
     if page < 1 or page > total_pages:
         return await ctx.send(f"❌ Halaman {page} tidak valid! Total halaman: {total_pages}")
 
-    start_idx = (page - 1) * items_per_page
-    end_idx = start_idx + items_per_page
-    page_players = sorted_players[start_idx:end_idx]
-
-    embed = discord.Embed(
-        title="⚔️ PvP Leaderboard",
-        description=f"Top PvP fighters (Page {page}/{total_pages})",
-        color=0xff0000
-    )
-
-    for i, (uid, player) in enumerate(page_players, start=start_idx + 1):
-        try:
-            user = await bot.fetch_user(int(uid))
-            username = user.name
-        except:
-            username = f"Unknown User ({uid})"
-
-        win_rate = player["pvp_wins"] / max(1, player["pvp_wins"] + player["pvp_losses"]) * 100
-
-        embed.add_field(
-            name=f"{i}. {username}",
-            value=f"**Wins:** {player['pvp_wins']} | **Losses:** {player['pvp_losses']}\n**Win Rate:** {win_rate:.1f}% | **Power:** {player['total_power']}",
-            inline=False
-        )
+    cached = LEADERBOARD_CACHE.get((order, page))
+    embed = cached.copy() if cached else await build_pvp_embed(order, page)
 
-    embed.set_footer(text=f"Total players: {len(sorted_players)} | Use !pvp_rank [page] untuk halaman lain")
+    # Rank sendiri selalu terbaru (O(log n) dari rank index), ditambahkan di depan footer
+    my_rank = PLAYER_STORE.rank_of(ctx.author.id, order)
+    if my_rank:
+        embed.set_footer(text=f"Your rank: #{my_rank} | {embed.footer.text}")
     await ctx.send(embed=embed)
 
 # ===============================
@@ -4463,36 +4545,15 @@ async def top(ctx, count: int = 5):
     if count < 1 or count > 20:
         return await ctx.send("❌ Jumlah harus antara 1-20!")
 
-    players = get_all_players()
-
-    if not players:
+    if not PLAYER_STORE.count_players():
         return await ctx.send("❌ Belum ada player yang terdaftar!")
 
-    # Sort players by total power
-    sorted_players = sorted(
-        [(uid, data) for uid, data in players.items() if data is not None],
-        key=lambda x: x[1].get("total_power", 0),
-        reverse=True
-    )[:count]
-
-    embed = discord.Embed(
-        title=f"🏆 Top {count} Cultivators",
-        description="Most powerful cultivators in the realm",
-        color=0xffd700
-    )
-
-    for i, (uid, player) in enumerate(sorted_players, start=1):
-        try:
-            user = await bot.fetch_user(int(uid))
-            username = user.name
-        except:
-            username = f"Unknown User ({uid})"
-
-        embed.add_field(
-            name=f"{i}. {username}",
-            value=f"**Power:** {player['total_power']} | **Realm:** {player['realm']}\n**Stage:** {player['stage']} | **Wins:** {player['pvp_wins']}",
-            inline=False
-        )
+    embed = LEADERBOARD_CACHE.get(("top", count))
+    if embed is None:
+        # Sort players by total power
+        sorted_players = PLAYER_STORE.ranked_players("power", count)
+        names = await NAME_RESOLVER.resolve_many([uid for uid, _ in sorted_players])
+        embed = build_top_embed(count, sorted_players, names)
 
     await ctx.send(embed=embed)
 
@@ -4502,7 +4563,7 @@ async def top(ctx, count: int = 5):
 @bot.command()
 async def dungeons(ctx):
     """Lihat semua dungeon yang tersedia"""
-    p = get_player(ctx.author.id)
+    p = peek_player(ctx.author.id)
     if not p:
         return await ctx.send("❌ Anda belum terdaftar! Gunakan `!register` untuk memulai.")
 
@@ -4596,9 +4657,7 @@ async def enter(ctx, *, dungeon_name: str):
         update_player(ctx.author.id, p)
 
         # Update server stats
-        data = load_data()
-        data["server_stats"]["total_dungeons"] += 1
-        save_data(data)
+        bump_server_stat("total_dungeons")
 
         # PERBAIKAN: Embed harus berada di dalam blok if success
         embed = discord.Embed(
@@ -4728,33 +4787,12 @@ SPIRIT_BEASTS = {
     ]
 }
 
-def apply_beast_bonuses(player_data, base_gain, qi_gain, power_gain):
-    """Terapkan bonus dari spirit beasts"""
-    total_exp_bonus = 1.0
-    total_qi_bonus = 1.0
-    total_power_bonus = 1.0
-
-    for beast in player_data.get("spirit_beasts", []):
-        for bonus_type, bonus_value in beast.get("bonus", {}).items():
-            if bonus_type == "exp":
-                total_exp_bonus += bonus_value
-            elif bonus_type in ["qi", "spiritual_energy"]:
-                total_qi_bonus += bonus_value
-            elif bonus_type in ["power", "attack"]:
-                total_power_bonus += bonus_value
-            elif bonus_type == "all":
-                total_exp_bonus += bonus_value
-                total_qi_bonus += bonus_value
-                total_power_bonus += bonus_value
-            elif bonus_type == "defense":
-                total_power_bonus += (bonus_value * 0.5) # Defense helps power slightly
-            elif bonus_type == "critical":
-                total_power_bonus += (bonus_value * 0.8) # Crit is very strong
-
+def apply_beast_bonuses(profile, base_gain, qi_gain, power_gain):
+    """Terapkan bonus dari spirit beasts (BeastProfile dari derived stats)"""
     return (
-        int(base_gain * total_exp_bonus),
-        int(qi_gain * total_qi_bonus),
-        int(power_gain * total_power_bonus)
+        int(base_gain * profile.exp),
+        int(qi_gain * profile.qi),
+        int(power_gain * profile.power)
     )
 
 
@@ -4828,11 +4866,10 @@ async def tame(ctx, *, beast_name: str = None):
     # Apply race specific taming chance or cost reduction (Optional logic can go here)
 
     p["spirit_beasts"].append(found_beast)
+    DERIVED_STATS.invalidate(ctx.author.id, "beasts")
 
     # Update server stats
-    data = load_data()
-    data["server_stats"]["total_spirit_beasts"] = data["server_stats"].get("total_spirit_beasts", 0) + 1
-    save_data(data)
+    bump_server_stat("total_spirit_beasts")
 
     update_player(ctx.author.id, p)
 
@@ -4860,7 +4897,7 @@ async def tame(ctx, *, beast_name: str = None):
 @bot.command()
 async def my_beasts(ctx):
     """View all your tamed spirit beasts"""
-    p = get_player(ctx.author.id)
+    p = peek_player(ctx.author.id)
     if not p:
         return await ctx.send("❌ Anda belum terdaftar! Gunakan `!register` untuk memulai.")
 
@@ -4942,6 +4979,7 @@ async def set_beast(ctx, beast_name: str = None):
         return await ctx.send("❌ Spirit beast tidak ditemukan! Pastikan Anda sudah menjinakkannya.")
 
     p["current_beast"] = found_beast["name"]
+    DERIVED_STATS.invalidate(ctx.author.id, "beasts")
     update_player(ctx.author.id, p)
 
     bonus_text = ", ".join([f"+{int(v*100)}% {k}" for k, v in found_beast["bonus"].items()])
@@ -5042,16 +5080,12 @@ async def craft(ctx, pill_name: str):
         p["daily_quests"]["find_treasure"]["completed"] = True
 
     # Recalculate total power
-    technique_bonus = 1 + sum(t['power_bonus'] for t in p["techniques"])
-    set_bonus = calculate_set_bonus(p["equipment"])
-    p["total_power"] = int((p["base_power"] + sum(p["equipment"].values())) * technique_bonus * (1 + set_bonus))
+    DERIVED_STATS.refresh_power(ctx.author.id, p)
 
     update_player(ctx.author.id, p)
 
     # Update server stats
-    data = load_data()
-    data["server_stats"]["total_pills_crafted"] = data["server_stats"].get("total_pills_crafted", 0) + 1
-    save_data(data)
+    bump_server_stat("total_pills_crafted")
 
     embed = discord.Embed(
         title="🎉 Pill Crafting Successful!",
@@ -5069,7 +5103,7 @@ async def craft(ctx, pill_name: str):
 @bot.command()
 async def achievements(ctx):
     """Lihat achievements yang tersedia"""
-    p = get_player(ctx.author.id)
+    p = peek_player(ctx.author.id)
     if not p:
         return await ctx.send("❌ Anda belum terdaftar! Gunakan `!register` untuk memulai.")
 
@@ -5137,39 +5171,42 @@ ACHIEVEMENTS = {
 @bot.command()
 async def create_guild(ctx, guild_name: str):
     """Buat guild baru"""
-    p = get_player(ctx.author.id)
-    if not p:
-        return await ctx.send("❌ Anda belum terdaftar! Gunakan `!register` untuk memulai.")
-
-    if p["guild"]:
-        return await ctx.send("❌ Anda sudah berada dalam guild! Keluar dulu untuk membuat guild baru.")
-
-    if p["spirit_stones"] < GUILD_COSTS["create"]:
-        return await ctx.send(f"❌ Tidak cukup Spirit Stones! Butuh {GUILD_COSTS['create']}, Anda memiliki {p['spirit_stones']}.")
-
-    data = load_data()
+    error = None
+    txn = player_txn(ctx.author.id)
+    async with txn as (p,):
+        data = load_data()
+        if not p:
+            error = "❌ Anda belum terdaftar! Gunakan `!register` untuk memulai."
+        elif p["guild"]:
+            error = "❌ Anda sudah berada dalam guild! Keluar dulu untuk membuat guild baru."
+        elif p["spirit_stones"] < GUILD_COSTS["create"]:
+            error = f"❌ Tidak cukup Spirit Stones! Butuh {GUILD_COSTS['create']}, Anda memiliki {p['spirit_stones']}."
+        elif guild_name in data["guilds"]:
+            # Check if guild name already exists
+            error = "❌ Nama guild sudah digunakan!"
+
+        if error:
+            txn.abort()
+        else:
+            # Create guild
+            p["spirit_stones"] -= GUILD_COSTS["create"]
+            p["guild"] = guild_name
+            p["guild_role"] = "Leader"
+
+            data["guilds"][guild_name] = {
+                "name": guild_name,
+                "leader": ctx.author.id,
+                "members": [ctx.author.id],
+                "level": 1,
+                "treasury": 0,
+                "created_at": datetime.datetime.now().isoformat(),
+                "description": f"Guild yang dipimpin oleh {ctx.author.name}"
+            }
 
-    # Check if guild name already exists
-    if guild_name in data["guilds"]:
-        return await ctx.send("❌ Nama guild sudah digunakan!")
-
-    # Create guild
-    p["spirit_stones"] -= GUILD_COSTS["create"]
-    p["guild"] = guild_name
-    p["guild_role"] = "Leader"
-
-    data["guilds"][guild_name] = {
-        "name": guild_name,
-        "leader": ctx.author.id,
-        "members": [ctx.author.id],
-        "level": 1,
-        "treasury": 0,
-        "created_at": datetime.datetime.now().isoformat(),
-        "description": f"Guild yang dipimpin oleh {ctx.author.name}"
-    }
+            save_section("guilds")
 
-    update_player(ctx.author.id, p)
-    save_data(data)
+    if error:
+        return await ctx.send(error)
 
     embed = discord.Embed(
         title="🏰 Guild Created!",
@@ -5186,35 +5223,35 @@ async def create_guild(ctx, guild_name: str):
 @bot.command()
 async def join_guild(ctx, guild_name: str):
     """Bergabung dengan guild yang ada"""
-    p = get_player(ctx.author.id)
-    if not p:
-        return await ctx.send("❌ Anda belum terdaftar! Gunakan `!register` untuk memulai.")
-
-    if p["guild"]:
-        return await ctx.send("❌ Anda sudah berada dalam guild! Keluar dulu untuk bergabung dengan guild lain.")
-
-    if p["spirit_stones"] < GUILD_COSTS["join"]:
-        return await ctx.send(f"❌ Tidak cukup Spirit Stones! Butuh {GUILD_COSTS['join']}, Anda memiliki {p['spirit_stones']}.")
-
-    data = load_data()
-
-    if guild_name not in data["guilds"]:
-        return await ctx.send("❌ Guild tidak ditemukan!")
-
-    guild = data["guilds"][guild_name]
-
-    if ctx.author.id in guild["members"]:
-        return await ctx.send("❌ Anda sudah menjadi member guild ini!")
-
-    # Join guild
-    p["spirit_stones"] -= GUILD_COSTS["join"]
-    p["guild"] = guild_name
-    p["guild_role"] = "Member"
+    error = None
+    txn = player_txn(ctx.author.id)
+    async with txn as (p,):
+        data = load_data()
+        guild = data["guilds"].get(guild_name)
+        if not p:
+            error = "❌ Anda belum terdaftar! Gunakan `!register` untuk memulai."
+        elif p["guild"]:
+            error = "❌ Anda sudah berada dalam guild! Keluar dulu untuk bergabung dengan guild lain."
+        elif p["spirit_stones"] < GUILD_COSTS["join"]:
+            error = f"❌ Tidak cukup Spirit Stones! Butuh {GUILD_COSTS['join']}, Anda memiliki {p['spirit_stones']}."
+        elif guild is None:
+            error = "❌ Guild tidak ditemukan!"
+        elif ctx.author.id in guild["members"]:
+            error = "❌ Anda sudah menjadi member guild ini!"
+
+        if error:
+            txn.abort()
+        else:
+            # Join guild
+            p["spirit_stones"] -= GUILD_COSTS["join"]
+            p["guild"] = guild_name
+            p["guild_role"] = "Member"
 
-    guild["members"].append(ctx.author.id)
+            guild["members"].append(ctx.author.id)
+            save_section("guilds")
 
-    update_player(ctx.author.id, p)
-    save_data(data)
+    if error:
+        return await ctx.send(error)
 
     embed = discord.Embed(
         title="🏰 Joined Guild!",
@@ -5231,34 +5268,34 @@ async def join_guild(ctx, guild_name: str):
 @bot.command()
 async def leave_guild(ctx):
     """Keluar dari guild"""
-    p = get_player(ctx.author.id)
-    if not p:
-        return await ctx.send("❌ Anda belum terdaftar! Gunakan `!register` untuk memulai.")
-
-    if not p["guild"]:
-        return await ctx.send("❌ Anda tidak berada dalam guild manapun!")
-
-    data = load_data()
-    guild_name = p["guild"]
-
-    if guild_name not in data["guilds"]:
-        p["guild"] = None
-        p["guild_role"] = None
-        update_player(ctx.author.id, p)
-        return await ctx.send("❌ Guild tidak ditemukan! Anda telah dikeluarkan.")
-
-    guild = data["guilds"][guild_name]
-
-    if ctx.author.id == guild["leader"]:
-        return await ctx.send("❌ Leader tidak bisa keluar guild! Transfer kepemimpinan dulu atau bubarkan guild.")
-
-    # Leave guild
-    guild["members"].remove(ctx.author.id)
-    p["guild"] = None
-    p["guild_role"] = None
+    error = None
+    txn = player_txn(ctx.author.id)
+    async with txn as (p,):
+        data = load_data()
+        if not p:
+            error = "❌ Anda belum terdaftar! Gunakan `!register` untuk memulai."
+            txn.abort()
+        elif not p["guild"]:
+            error = "❌ Anda tidak berada dalam guild manapun!"
+            txn.abort()
+        elif p["guild"] not in data["guilds"]:
+            # Guild sudah tidak ada: tetap lepas player dari guild tersebut (commit)
+            p["guild"] = None
+            p["guild_role"] = None
+            error = "❌ Guild tidak ditemukan! Anda telah dikeluarkan."
+        elif ctx.author.id == data["guilds"][p["guild"]]["leader"]:
+            error = "❌ Leader tidak bisa keluar guild! Transfer kepemimpinan dulu atau bubarkan guild."
+            txn.abort()
+        else:
+            # Leave guild
+            guild_name = p["guild"]
+            data["guilds"][guild_name]["members"].remove(ctx.author.id)
+            p["guild"] = None
+            p["guild_role"] = None
+            save_section("guilds")
 
-    update_player(ctx.author.id, p)
-    save_data(data)
+    if error:
+        return await ctx.send(error)
 
     await ctx.send(f"🏰 Anda telah keluar dari guild **{guild_name}**!")
 
@@ -5268,7 +5305,7 @@ async def guild_info(ctx, guild_name: str = None):
     data = load_data()
 
     if not guild_name:
-        p = get_player(ctx.author.id)
+        p = peek_player(ctx.author.id)
         if not p or not p["guild"]:
             return await ctx.send("❌ Anda tidak berada dalam guild! Gunakan `!guild_info [nama_guild]`")
         guild_name = p["guild"]
@@ -5284,11 +5321,9 @@ async def guild_info(ctx, guild_name: str = None):
         color=0x7289da
     )
 
-    try:
-        leader = await bot.fetch_user(guild["leader"])
-        leader_name = leader.name
-    except:
-        leader_name = f"Unknown User ({guild['leader']})"
+    # Leader + 10 member pertama di-resolve sekaligus (cache dulu, fetch hanya yang belum ada)
+    names = await NAME_RESOLVER.resolve_many([guild["leader"]] + guild["members"][:10])
+    leader_name = names.get(str(guild["leader"]), f"Unknown User ({guild['leader']})")
 
     embed.add_field(name="Leader", value=leader_name, inline=True)
     embed.add_field(name="Level", value=guild["level"], inline=True)
@@ -5299,11 +5334,10 @@ async def guild_info(ctx, guild_name: str = None):
     # Show member list (first 10)
     members_text = ""
     for i, member_id in enumerate(guild["members"][:10]):
-        try:
-            member = await bot.fetch_user(member_id)
+        if str(member_id) in names:
             role = "👑" if member_id == guild["leader"] else "👤"
-            members_text += f"{role} {member.name}\n"
-        except:
+            members_text += f"{role} {names[str(member_id)]}\n"
+        else:
             members_text += f"👤 Unknown User ({member_id})\n"
 
     if len(guild["members"]) > 10:
@@ -5328,12 +5362,10 @@ async def guilds(ctx):
         color=0x7289da
     )
 
+    names = await NAME_RESOLVER.resolve_many([guild_data["leader"] for guild_data in data["guilds"].values()])
+
     for guild_name, guild_data in data["guilds"].items():
-        try:
-            leader = await bot.fetch_user(guild_data["leader"])
-            leader_name = leader.name
-        except:
-            leader_name = f"Unknown User ({guild_data['leader']})"
+        leader_name = names.get(str(guild_data["leader"]), f"Unknown User ({guild_data['leader']})")
 
         embed.add_field(
             name=f"{guild_name} (Level {guild_data['level']})",
@@ -5347,34 +5379,37 @@ async def guilds(ctx):
 @bot.command()
 async def guild_donate(ctx, amount: int):
     """Donasikan Spirit Stones ke guild treasury"""
-    p = get_player(ctx.author.id)
-    if not p:
-        return await ctx.send("❌ Anda belum terdaftar! Gunakan `!register` untuk memulai.")
-
-    if not p["guild"]:
-        return await ctx.send("❌ Anda tidak berada dalam guild!")
-
-    if amount <= 0:
-        return await ctx.send("❌ Jumlah donasi harus positif!")
-
-    if p["spirit_stones"] < amount:
-        return await ctx.send(f"❌ Tidak cukup Spirit Stones! Anda memiliki {p['spirit_stones']}.")
-
-    data = load_data()
-    guild_name = p["guild"]
-
-    if guild_name not in data["guilds"]:
-        return await ctx.send("❌ Guild tidak ditemukan!")
+    error = None
+    txn = player_txn(ctx.author.id)
+    async with txn as (p,):
+        data = load_data()
+        if not p:
+            error = "❌ Anda belum terdaftar! Gunakan `!register` untuk memulai."
+        elif not p["guild"]:
+            error = "❌ Anda tidak berada dalam guild!"
+        elif amount <= 0:
+            error = "❌ Jumlah donasi harus positif!"
+        elif p["spirit_stones"] < amount:
+            error = f"❌ Tidak cukup Spirit Stones! Anda memiliki {p['spirit_stones']}."
+        elif p["guild"] not in data["guilds"]:
+            error = "❌ Guild tidak ditemukan!"
+
+        if error:
+            txn.abort()
+        else:
+            guild_name = p["guild"]
+            guild = data["guilds"][guild_name]
 
-    guild = data["guilds"][guild_name]
+            # Donate to guild
+            p["spirit_stones"] -= amount
+            p["guild_contributions"] += amount
+            guild["treasury"] += amount
+            contributions = p["guild_contributions"]
 
-    # Donate to guild
-    p["spirit_stones"] -= amount
-    p["guild_contributions"] += amount
-    guild["treasury"] += amount
+            save_section("guilds")
 
-    update_player(ctx.author.id, p)
-    save_data(data)
+    if error:
+        return await ctx.send(error)
 
     embed = discord.Embed(
         title="💰 Guild Donation!",
@@ -5383,7 +5418,7 @@ async def guild_donate(ctx, amount: int):
     )
     embed.add_field(name="Amount", value=f"{amount} Spirit Stones", inline=True)
     embed.add_field(name="New Treasury", value=f"{guild['treasury']} Spirit Stones", inline=True)
-    embed.add_field(name="Your Contributions", value=f"{p['guild_contributions']} Spirit Stones", inline=True)
+    embed.add_field(name="Your Contributions", value=f"{contributions} Spirit Stones", inline=True)
 
     await ctx.send(embed=embed)
 
@@ -5413,7 +5448,7 @@ async def guild_benefits(ctx):
 @bot.command()
 async def daily_quests(ctx):
     """Lihat daily quests yang tersedia"""
-    p = get_player(ctx.author.id)
+    p = peek_player(ctx.author.id)
     if not p:
         return await ctx.send("❌ Anda belum terdaftar! Gunakan `!register` untuk memulai.")
 
@@ -5449,75 +5484,81 @@ async def daily_quests(ctx):
 @bot.command()
 async def claim_daily(ctx):
     """Klaim reward daily quest yang sudah completed"""
-    p = get_player(ctx.author.id)
-    if not p:
-        return await ctx.send("❌ Anda belum terdaftar! Gunakan `!register` untuk memulai.")
-
     # Reset daily quests jika perlu
     reset_daily_quests()
 
-    claimed_quests = []
-    total_rewards = {"exp": 0, "qi": 0, "spirit_stones": 0, "power": 0}
-
-    for quest in DAILY_QUESTS:
-        quest_data = p["daily_quests"][quest["id"]]
-
-        if quest_data["completed"] and not quest_data["claimed"]:
-            # Give rewards
-            for reward_type, amount in quest["reward"].items():
-                if reward_type == "exp":
-                    p["exp"] = min(p["exp"] + amount, get_exp_cap(p))
-                    total_rewards["exp"] += amount
-                elif reward_type == "qi":
-                    p["qi"] += amount
-                    total_rewards["qi"] += amount
-                elif reward_type == "spirit_stones":
-                    p["spirit_stones"] += amount
-                    total_rewards["spirit_stones"] += amount
-                elif reward_type == "power":
-                    p["base_power"] += amount
-                    total_rewards["power"] += amount
-
-            quest_data["claimed"] = True
-            claimed_quests.append(quest["name"])
-
-    if not claimed_quests:
-        return await ctx.send("❌ Tidak ada quest yang bisa di-claim! Selesaikan quest harian terlebih dahulu.")
-
-    # Update login streak
-    now = time.time()
-    last_claim = float(p.get("last_daily_claim", "0"))
-
-    if now - last_claim > 172800:  # 2 days in seconds
-        p["login_streak"] = 1
-    else:
-        p["login_streak"] += 1
-
-    p["last_daily_claim"] = str(now)
-
-    # Add streak bonus
-    streak_bonus = min(0.5, p["login_streak"] * 0.05)  # Max 50% bonus
-    if streak_bonus > 0:
-        for reward_type in total_rewards:
-            if total_rewards[reward_type] > 0:
-                bonus_amount = int(total_rewards[reward_type] * streak_bonus)
-                total_rewards[reward_type] += bonus_amount
+    error = None
+    txn = player_txn(ctx.author.id)
+    async with txn as (p,):
+        claimable = [
+            quest for quest in DAILY_QUESTS
+            if p and p["daily_quests"][quest["id"]]["completed"] and not p["daily_quests"][quest["id"]]["claimed"]
+        ]
+        if not p:
+            error = "❌ Anda belum terdaftar! Gunakan `!register` untuk memulai."
+        elif not claimable:
+            error = "❌ Tidak ada quest yang bisa di-claim! Selesaikan quest harian terlebih dahulu."
 
-                if reward_type == "exp":
-                    p["exp"] = min(p["exp"] + bonus_amount, get_exp_cap(p))
-                elif reward_type == "qi":
-                    p["qi"] += bonus_amount
-                elif reward_type == "spirit_stones":
-                    p["spirit_stones"] += bonus_amount
-                elif reward_type == "power":
-                    p["base_power"] += bonus_amount
+        if error:
+            txn.abort()
+        else:
+            claimed_quests = []
+            total_rewards = {"exp": 0, "qi": 0, "spirit_stones": 0, "power": 0}
+
+            for quest in claimable:
+                # Give rewards
+                for reward_type, amount in quest["reward"].items():
+                    if reward_type == "exp":
+                        p["exp"] = min(p["exp"] + amount, get_exp_cap(p))
+                        total_rewards["exp"] += amount
+                    elif reward_type == "qi":
+                        p["qi"] += amount
+                        total_rewards["qi"] += amount
+                    elif reward_type == "spirit_stones":
+                        p["spirit_stones"] += amount
+                        total_rewards["spirit_stones"] += amount
+                    elif reward_type == "power":
+                        p["base_power"] += amount
+                        total_rewards["power"] += amount
+
+                p["daily_quests"][quest["id"]]["claimed"] = True
+                claimed_quests.append(quest["name"])
+
+            # Update login streak
+            now = time.time()
+            last_claim = float(p.get("last_daily_claim", "0"))
+
+            if now - last_claim > 172800:  # 2 days in seconds
+                p["login_streak"] = 1
+            else:
+                p["login_streak"] += 1
+
+            p["last_daily_claim"] = str(now)
+
+            # Add streak bonus
+            streak_bonus = min(0.5, p["login_streak"] * 0.05)  # Max 50% bonus
+            if streak_bonus > 0:
+                for reward_type in total_rewards:
+                    if total_rewards[reward_type] > 0:
+                        bonus_amount = int(total_rewards[reward_type] * streak_bonus)
+                        total_rewards[reward_type] += bonus_amount
+
+                        if reward_type == "exp":
+                            p["exp"] = min(p["exp"] + bonus_amount, get_exp_cap(p))
+                        elif reward_type == "qi":
+                            p["qi"] += bonus_amount
+                        elif reward_type == "spirit_stones":
+                            p["spirit_stones"] += bonus_amount
+                        elif reward_type == "power":
+                            p["base_power"] += bonus_amount
 
-    update_player(ctx.author.id, p)
+            # Recalculate total power
+            DERIVED_STATS.refresh_power(ctx.author.id, p)
+            login_streak = p["login_streak"]
+            total_power = p["total_power"]
 
-    # Recalculate total power
-    technique_bonus = 1 + sum(t['power_bonus'] for t in p["techniques"])
-    set_bonus = calculate_set_bonus(p["equipment"])
-    p["total_power"] = int((p["base_power"] + sum(p["equipment"].values())) * technique_bonus * (1 + set_bonus))
+    if error:
+        return await ctx.send(error)
 
     embed = discord.Embed(
         title="🎉 Daily Rewards Claimed!",
@@ -5532,15 +5573,15 @@ async def claim_daily(ctx):
 
     embed.add_field(name="Quests Completed", value="\n".join(claimed_quests), inline=False)
     embed.add_field(name="Rewards", value=rewards_text, inline=False)
-    embed.add_field(name="Login Streak", value=f"{p['login_streak']} days (+{int(streak_bonus*100)}% bonus)", inline=True)
-    embed.add_field(name="Total Power", value=p["total_power"], inline=True)
+    embed.add_field(name="Login Streak", value=f"{login_streak} days (+{int(streak_bonus*100)}% bonus)", inline=True)
+    embed.add_field(name="Total Power", value=total_power, inline=True)
 
     await ctx.send(embed=embed)
 
 @bot.command()
 async def daily_streak(ctx):
     """Lihat login streak Anda"""
-    p = get_player(ctx.author.id)
+    p = peek_player(ctx.author.id)
     if not p:
         return await ctx.send("❌ Anda belum terdaftar! Gunakan `!register` untuk memulai.")
 
@@ -5611,6 +5652,7 @@ async def reroll(ctx):
         # Bayar cost
         p["spirit_stones"] -= 1000
         p["race"] = new_race
+        DERIVED_STATS.invalidate(ctx.author.id, "race")
 
         # Recalculate stats dengan bonus baru
         race_data = RACES[new_race]
@@ -5629,9 +5671,7 @@ async def reroll(ctx):
             p["qi"] = int(p["qi"] * (1 + race_data["bonuses"]["qi"]))
 
         # Recalculate total power
-        technique_bonus = 1 + sum(t['power_bonus'] for t in p["techniques"])
-        set_bonus = calculate_set_bonus(p["equipment"])
-        p["total_power"] = int(p["base_power"] * technique_bonus * (1 + set_bonus))
+        DERIVED_STATS.refresh_power(ctx.author.id, p)
 
         update_player(ctx.author.id, p)
 
@@ -5684,7 +5724,7 @@ async def stats(ctx):
 @commands.is_owner()
 async def backup(ctx):
     """Buat backup manual data (Owner only)"""
-    if backup_data():
+    if await backup_data():
         await ctx.send("✅ Backup berhasil dibuat!")
     else:
         await ctx.send("❌ Gagal membuat backup!")
@@ -5916,7 +5956,9 @@ async def help_command(ctx, category: str = None):
         embed.add_field(
             name="🥊 Player vs Player",
             value="`!pvp @user` - Challenge player to battle (5min cooldown)\n"
-                  "`!pvp_rank` - View PvP leaderboard",
+                  "`!pvp_rank` - View PvP leaderboard\n"
+                  "`!pvp_odds @user` - Preview your win chance\n"
+                  "`!pvp_replay` - Replay your last instant battle",
             inline=False
         )
 
@@ -6371,6 +6413,7 @@ async def dev_cleanup(ctx):
     for battle_id, battle_data in list(ACTIVE_BATTLES.items()):
         if not battle_data.get("active", True):
             del ACTIVE_BATTLES[battle_id]
+            ENGAGEMENTS.release("pvp", battle_id, battle_data["attacker"], battle_data["defender"])
             cleaned_battles += 1
 
     # Cleanup old pending registrations
@@ -6399,7 +6442,7 @@ async def dev_cleanup(ctx):
 @commands.is_owner()
 async def dev_playerinfo(ctx, member: discord.Member):
     """Lihat info detail player (Owner only)"""
-    p = get_player(member.id)
+    p = peek_player(member.id)
     if not p:
         return await ctx.send("❌ Player tidak ditemukan!")
 
@@ -6468,10 +6511,28 @@ async def dev_broadcast(ctx, *, message: str):
 @commands.is_owner()
 async def dev_reload(ctx):
     """Reload data dari file (Owner only)"""
-    global players
-    players = load_data()
+    await PLAYER_STORE.reload()
     await ctx.send("✅ Data reloaded dari file!")
 
+@bot.command()
+@commands.is_owner()
+async def dev_restore(ctx, *, when: str = None):
+    """Restore data ke titik backup, misal !dev_restore 2025-01-31T12:00 (Owner only)"""
+    try:
+        at = parse_backup_time(when)
+    except ValueError:
+        return await ctx.send("❌ Format waktu tidak valid! Gunakan unix timestamp atau 2025-01-31T12:00")
+
+    # Baca base + incremental di thread terpisah, lalu ganti data di PLAYER_STORE
+    data = await asyncio.to_thread(BACKUP_ENGINE.restore, at)
+    if data is None:
+        return await ctx.send("❌ Tidak ada backup untuk waktu tersebut!")
+
+    migrate_data(data)
+    save_data(data)
+    await PLAYER_STORE.persist()
+    await ctx.send(f"✅ Data di-restore ke backup {when or 'terbaru'} ({len(data['players'])} players)")
+
 @bot.command()
 @commands.is_owner()
 async def dev_eval(ctx, *, code: str):
@@ -6503,17 +6564,14 @@ async def dev_activity(ctx):
     data = load_data()
     recent_players = []
 
-    for player_id, player_data in data["players"].items():
+    # Aktif dalam 7 hari, sudah terurut dari yang terbaru
+    since = (datetime.datetime.now() - datetime.timedelta(days=7)).isoformat()
+    for player_id, last_updated in PLAYER_STORE.active_since(since):
         try:
-            last_updated = datetime.datetime.fromisoformat(player_data["last_updated"])
-            if (datetime.datetime.now() - last_updated).days < 7:  # Aktif dalam 7 hari
-                recent_players.append((player_id, last_updated, player_data["total_power"]))
+            recent_players.append((player_id, datetime.datetime.fromisoformat(last_updated), data["players"][player_id]["total_power"]))
         except:
             continue
 
-    # Sort by most recent
-    recent_players.sort(key=lambda x: x[1], reverse=True)
-
     embed = discord.Embed(
         title="📈 Recent Player Activity",
         description="Player yang aktif dalam 7 hari terakhir",
@@ -6534,6 +6592,43 @@ async def dev_activity(ctx):
 
     await ctx.send(embed=embed)
 
+@bot.command()
+@commands.is_owner()
+async def dev_distribution(ctx):
+    """Distribusi total power keseluruhan dan per realm dari sketch (Owner only)"""
+    if not POWER_STATS.latest:
+        return await ctx.send("❌ Belum ada data power!")
+
+    embed = discord.Embed(
+        title="📊 Power Distribution",
+        description=f"Perkiraan kuantil total power ({len(POWER_STATS.latest)} players, KLL sketch)",
+        color=0x7289da
+    )
+
+    overall = POWER_STATS.overall
+    quantiles = [("p10", 0.1), ("p25", 0.25), ("p50", 0.5), ("p75", 0.75), ("p90", 0.9), ("p99", 0.99)]
+    embed.add_field(
+        name="Overall",
+        value="\n".join(f"**{label}:** {overall.quantile(q):,}" for label, q in quantiles),
+        inline=False
+    )
+
+    # Histogram jumlah player per realm + median / p90 power di realm tersebut
+    counts = POWER_STATS.realm_counts()
+    largest = max(counts.values())
+    realms = [realm for realm in REALM_ORDER if realm in counts] + sorted(r for r in counts if r not in REALMS)
+    lines = []
+    for realm in realms:
+        sketch = POWER_STATS.realms.get(realm)
+        bar = "█" * max(1, round(counts[realm] / largest * 12))
+        line = f"**{realm}** {bar} {counts[realm]}"
+        if sketch is not None and sketch.n:
+            line += f"\n  median {sketch.quantile(0.5):,} | p90 {sketch.quantile(0.9):,}"
+        lines.append(line)
+    embed.add_field(name="Per Realm", value="\n".join(lines)[:1024], inline=False)
+
+    await ctx.send(embed=embed)
+
 @bot.command()
 @commands.is_owner()
 async def reset_boss_cooldown(ctx, member: discord.Member):
@@ -6579,7 +6674,7 @@ async def my_relationships(ctx):
         return await ctx.send("❌ NPC system is not available!")
     
     player_id = str(ctx.author.id)
-    player = get_player(player_id)
+    player = peek_player(player_id)
     if not player:
         return await ctx.send("❌ You need to register first! Use `!register`")
     
@@ -6705,7 +6800,7 @@ async def talk_npc(ctx, *, npc_name=None):
         return await ctx.send(f"❌ NPC '{npc_name}' not found! Use `!npc_list` to see available NPCs.")
     
     player_id = str(ctx.author.id)
-    player = get_player(player_id)
+    player = peek_player(player_id)
     if not player:
         return await ctx.send("❌ You need to register first! Use `!register`")
     
@@ -7056,7 +7151,7 @@ async def remove_combat_assistant(ctx):
 async def combat_assistant_info(ctx):
     """View your current combat assistant details"""
     player_id = str(ctx.author.id)
-    player = get_player(player_id)
+    player = peek_player(player_id)
     if not player:
         return await ctx.send("❌ You need to register first! Use `!register`")
     
@@ -7117,7 +7212,7 @@ async def available_assistants(ctx):
         return await ctx.send("❌ NPC system is not available!")
     
     player_id = str(ctx.author.id)
-    player = get_player(player_id)
+    player = peek_player(player_id)
     if not player:
         return await ctx.send("❌ You need to register first! Use `!register`")
     
@@ -7188,7 +7283,7 @@ async def available_assistants(ctx):
 async def sect_list(ctx, realm=None):
     """View all available sects, optionally filtered by realm"""
     player_id = str(ctx.author.id)
-    player = get_player(player_id)
+    player = peek_player(player_id)
     if not player:
         return await ctx.send("❌ You need to register first! Use `!register`")
     
@@ -7350,7 +7445,7 @@ async def leave_sect(ctx):
 async def my_sect(ctx):
     """View your current sect status and techniques"""
     player_id = str(ctx.author.id)
-    player = get_player(player_id)
+    player = peek_player(player_id)
     if not player:
         return await ctx.send("❌ You need to register first! Use `!register`")
     
@@ -7568,7 +7663,7 @@ async def sect_info(ctx, *, sect_name=None):
 async def artifacts(ctx):
     """View all available artifacts and your collection"""
     player_id = str(ctx.author.id)
-    player = get_player(player_id)
+    player = peek_player(player_id)
     if not player:
         return await ctx.send("❌ You need to register first! Use `!register`")
     
@@ -7730,6 +7825,12 @@ async def treasure_hunt(ctx, *, location_name=None):
     # Check cost
     if player["spirit_stones"] < location["cost"]:
         return await ctx.send(f"❌ You need {location['cost']} spirit stones to explore {location['name']}!")
+
+    # Player terkunci selama durasi hunt (tidak bisa battle / explore bersamaan)
+    start_time = time.time()
+    conflict = ENGAGEMENTS.claim("treasure_hunt", player_id, player_id, until=start_time + location["exploration_time"])
+    if conflict:
+        return await ctx.send(busy_message(conflict))
     
     # Start exploration
     player["spirit_stones"] -= location["cost"]
@@ -7737,7 +7838,7 @@ async def treasure_hunt(ctx, *, location_name=None):
     
     active_explorations[player_id] = {
         "location": location_id,
-        "start_time": time.time(),
+        "start_time": start_time,
         "duration": location["exploration_time"]
     }
     
@@ -7787,6 +7888,7 @@ async def check_hunt(ctx):
         
         # Remove from active explorations
         del active_explorations[player_id]
+        ENGAGEMENTS.release("treasure_hunt", player_id, player_id)
         
         player = get_player(player_id)
         
@@ -7953,17 +8055,18 @@ async def create_formation(ctx, *, formation_name=None):
     
     formation = FORMATIONS[formation_id]
     
-    # Check if player already in a formation
-    for active_form in active_formations.values():
-        if player_id in active_form["participants"]:
-            return await ctx.send("❌ You're already in a formation! Leave it first or wait for it to complete.")
-    
     # Check cost
     if player["spirit_stones"] < formation["cost_per_person"]:
         return await ctx.send(f"❌ You need {formation['cost_per_person']} spirit stones to create this formation!")
+
+    # Check if player already in a formation (atau battle / hunt lain)
+    start_time = time.time()
+    formation_instance_id = f"{formation_id}_{int(start_time)}"
+    conflict = ENGAGEMENTS.claim("formation", formation_instance_id, player_id, until=start_time + formation["duration"])
+    if conflict:
+        return await ctx.send(busy_message(conflict))
     
     # Create formation
-    formation_instance_id = f"{formation_id}_{int(time.time())}"
     player["spirit_stones"] -= formation["cost_per_person"]
     update_player(player_id, player)
     
@@ -7971,7 +8074,7 @@ async def create_formation(ctx, *, formation_name=None):
         "type": formation_id,
         "creator": player_id,
         "participants": [player_id],
-        "start_time": time.time(),
+        "start_time": start_time,
         "duration": formation["duration"],
         "status": "recruiting"
     }
@@ -8008,6 +8111,10 @@ async def create_formation(ctx, *, formation_name=None):
     
     await ctx.send(embed=embed)
 
+def formation_end(active_form):
+    """Timestamp formation selesai (batas engagement participant)"""
+    return active_form["start_time"] + active_form["duration"]
+
 @bot.command(name="join_formation")
 async def join_formation(ctx, *, formation_name=None):
     """Join an active cultivation formation"""
@@ -8019,11 +8126,6 @@ async def join_formation(ctx, *, formation_name=None):
     if not player:
         return await ctx.send("❌ You need to register first! Use `!register`")
     
-    # Check if player already in a formation
-    for active_form in active_formations.values():
-        if player_id in active_form["participants"]:
-            return await ctx.send("❌ You're already in a formation! Wait for it to complete.")
-    
     # Find active formation
     target_formation = None
     target_id = None
@@ -8046,6 +8148,11 @@ async def join_formation(ctx, *, formation_name=None):
     # Check cost
     if player["spirit_stones"] < formation["cost_per_person"]:
         return await ctx.send(f"❌ You need {formation['cost_per_person']} spirit stones to join this formation!")
+
+    # Check if player already in a formation (atau battle / hunt lain)
+    conflict = ENGAGEMENTS.claim("formation", target_id, player_id, until=formation_end(target_formation))
+    if conflict:
+        return await ctx.send(busy_message(conflict))
     
     # Join formation
     player["spirit_stones"] -= formation["cost_per_person"]
@@ -8057,6 +8164,7 @@ async def join_formation(ctx, *, formation_name=None):
     if len(target_formation["participants"]) >= formation["min_participants"]:
         target_formation["status"] = "active"
         target_formation["start_time"] = time.time()
+        ENGAGEMENTS.extend("formation", target_id, formation_end(target_formation), *target_formation["participants"])
         
         # Notify all participants
         for participant_id in target_formation["participants"]:
@@ -8227,4 +8335,7 @@ try:
     bot.run(BOT_TOKEN)
 except Exception as e:
     print(f"❌ Error running bot: {e}")
+finally:
+    # Flush perubahan terakhir sebelum proses berhenti
+    PLAYER_STORE.flush()
     print(f"🔑 Token: {BOT_TOKEN}")
\ No newline at end of file
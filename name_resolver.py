@@ -0,0 +1,175 @@
+import asyncio
+import atexit
+import json
+import os
+import time
+from collections import OrderedDict
+from player_store import _write_atomic, encode_compact
+
+# ===============================
+# Name resolver - ID Discord -> nama untuk leaderboard / guild list
+# Urutan: cache gateway (bot.get_user) -> LRU + TTL (disimpan ke file)
+# -> fetch_user (REST) dengan batas concurrency
+# ===============================
+NAME_CACHE_FILE = os.environ.get("NAME_CACHE_FILE", "name_cache.json")
+NAME_CACHE_SIZE = int(os.environ.get("NAME_CACHE_SIZE", "10000"))
+NAME_CACHE_TTL = float(os.environ.get("NAME_CACHE_TTL", "86400"))
+NAME_FETCH_CONCURRENCY = int(os.environ.get("NAME_FETCH_CONCURRENCY", "4"))
+NAME_SAVE_INTERVAL = 600
+# User yang gagal di-fetch (akun terhapus, dsb) tidak dicoba ulang selama ini
+NAME_FAILURE_TTL = 300
+
+
+class NameResolver:
+    def __init__(self, path=NAME_CACHE_FILE, size=NAME_CACHE_SIZE, ttl=NAME_CACHE_TTL):
+        self.path = path
+        self.size = size
+        self.ttl = ttl
+        self.bot = None
+        self.cache = OrderedDict()  # uid -> (name, expires_at), urutan LRU
+        self.dirty = False
+        self._inflight = {}
+        self._failed = {}
+        self._semaphore = asyncio.Semaphore(NAME_FETCH_CONCURRENCY)
+        self._save_task = None
+
+    # ---------- LRU ----------
+
+    def remember(self, user_id, name):
+        """Simpan nama ke LRU (entry terlama dibuang jika penuh)"""
+        if not name:
+            return
+        user_id = str(user_id)
+        self.cache[user_id] = (name, time.time() + self.ttl)
+        self.cache.move_to_end(user_id)
+        while len(self.cache) > self.size:
+            self.cache.popitem(last=False)
+        self.dirty = True
+
+    def cached(self, user_id):
+        """Nama dari gateway cache atau LRU yang belum expired, None jika harus fetch"""
+        user_id = str(user_id)
+        if self.bot is not None and user_id.isdigit():
+            user = self.bot.get_user(int(user_id))
+            if user is not None:
+                if self.cache.get(user_id, (None,))[0] != user.name:
+                    self.remember(user_id, user.name)
+                return user.name
+
+        entry = self.cache.get(user_id)
+        if entry is None or entry[1] < time.time():
+            return None
+        self.cache.move_to_end(user_id)
+        return entry[0]
+
+    def warm(self, players):
+        """Isi LRU dari display_name yang tersimpan di data player (tanpa menimpa entry yang ada)"""
+        for user_id, player in players.items():
+            if isinstance(player, dict) and player.get("display_name") and user_id not in self.cache:
+                self.remember(user_id, player["display_name"])
+
+    # ---------- fetch ----------
+
+    async def _fetch(self, user_id):
+        async with self._semaphore:
+            try:
+                user = await self.bot.fetch_user(int(user_id))
+            except Exception:
+                self._failed[user_id] = time.time() + NAME_FAILURE_TTL
+                return None
+        self.remember(user_id, user.name)
+        return user.name
+
+    async def resolve(self, user_id, default=None):
+        """Nama satu user; default jika tidak bisa di-resolve"""
+        names = await self.resolve_many([user_id])
+        name = names.get(str(user_id))
+        if name is None:
+            return default if default is not None else f"Unknown User ({user_id})"
+        return name
+
+    async def resolve_many(self, user_ids):
+        """{uid: nama} untuk banyak user; yang belum ada di cache di-fetch paralel (dibatasi semaphore)"""
+        names = {}
+        missing = []
+        for user_id in user_ids:
+            user_id = str(user_id)
+            name = self.cached(user_id)
+            if name is not None:
+                names[user_id] = name
+            elif user_id not in missing and self._failed.get(user_id, 0) < time.time():
+                missing.append(user_id)
+
+        if missing and self.bot is not None:
+            tasks = []
+            for user_id in missing:
+                # User yang sama dari command lain yang sedang jalan cukup ditunggu, tidak di-fetch ulang
+                task = self._inflight.get(user_id)
+                if task is None:
+                    task = asyncio.ensure_future(self._fetch(user_id))
+                    self._inflight[user_id] = task
+                    task.add_done_callback(lambda _, uid=user_id: self._inflight.pop(uid, None))
+                tasks.append(task)
+            for user_id, name in zip(missing, await asyncio.gather(*tasks)):
+                if name is not None:
+                    names[user_id] = name
+
+        # Fallback terakhir: nama lama yang sudah expired masih lebih baik dari "Unknown"
+        for user_id in map(str, user_ids):
+            if user_id not in names and user_id in self.cache:
+                names[user_id] = self.cache[user_id][0]
+        return names
+
+    # ---------- persistensi ----------
+
+    def load(self):
+        if not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, "r") as f:
+                entries = json.load(f)
+            for user_id, (name, expires_at) in entries.items():
+                self.cache[user_id] = (name, expires_at)
+        except Exception as e:
+            print(f"❌ Error loading name cache: {e}")
+
+    def _encode(self):
+        self.dirty = False
+        return encode_compact({uid: list(entry) for uid, entry in self.cache.items()})
+
+    def save(self):
+        """Simpan LRU ke disk (blocking, dipakai saat exit)"""
+        if not self.dirty:
+            return
+        try:
+            _write_atomic(self.path, self._encode())
+        except Exception as e:
+            self.dirty = True
+            print(f"❌ Error saving name cache: {e}")
+
+    async def save_loop(self):
+        """Background task: simpan LRU ke disk secara berkala (tulis file di thread terpisah)"""
+        while True:
+            await asyncio.sleep(NAME_SAVE_INTERVAL)
+            if not self.dirty:
+                continue
+            try:
+                # Serialisasi di thread event loop agar cache tidak berubah di tengah encode
+                await asyncio.to_thread(_write_atomic, self.path, self._encode())
+            except Exception as e:
+                self.dirty = True
+                print(f"❌ Error saving name cache: {e}")
+
+    def start(self, bot, players):
+        """Dipanggil dari on_ready: pasang bot, muat cache dari file, warm dari data player"""
+        self.bot = bot
+        if not self.cache:
+            self.load()
+            self.warm(players)
+        if self._save_task is None or self._save_task.done():
+            self._save_task = asyncio.create_task(self.save_loop())
+        return self._save_task
+
+
+NAME_RESOLVER = NameResolver()
+atexit.register(NAME_RESOLVER.save)
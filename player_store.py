@@ -0,0 +1,1013 @@
+import argparse
+import asyncio
+import atexit
+import datetime
+import json
+import os
+import queue
+import sqlite3
+import threading
+import time
+from rank_index import RankIndex
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# ===============================
+# Player Store - data dimuat sekali, dibaca dari memory
+# dan ditulis ke disk secara berkala (write-behind)
+# ===============================
+DATA_FILE = "data.json"
+
+# Interval flush ke disk (detik), bisa diatur lewat Environment Variables
+FLUSH_INTERVAL = float(os.environ.get("STORE_FLUSH_INTERVAL", "10"))
+
+# Mode penyimpanan: "json" (satu data.json), "sharded" (satu file per player), "sqlite" atau "journal"
+STORE_BACKEND = os.environ.get("STORE_BACKEND", "json")
+STORE_DIR = os.environ.get("STORE_DIR", "data")
+STORE_DB = os.environ.get("STORE_DB", "data.db")
+STORE_JOURNAL = os.environ.get("STORE_JOURNAL", "data.journal")
+
+# Journal di-compact jadi snapshot baru setelah melewati ukuran ini (bytes)
+JOURNAL_MAX_BYTES = int(os.environ.get("JOURNAL_MAX_BYTES", str(4 * 1024 * 1024)))
+
+# Format file: "pretty" (indent=4 seperti dulu), "compact" (tanpa spasi) atau "fast" (orjson jika terinstall)
+STORE_FORMAT = os.environ.get("STORE_FORMAT", "pretty")
+
+# Section yang punya file sendiri di layout sharded, sisanya masuk meta.json
+SHARDED_SECTIONS = ("guilds", "server_stats", "world_bosses")
+META_SECTION = "meta"
+
+
+def _read_json(path):
+    with open(path, "r") as f:
+        return json.load(f)
+
+
+def _write_atomic(path, text):
+    """Tulis ke file sementara lalu os.replace, file lama tidak pernah setengah tertulis"""
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w") as f:
+        f.write(text)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+def encode_json(value, fmt=None):
+    """Serialisasi sesuai STORE_FORMAT, mode fast jatuh ke json compact jika orjson tidak ada"""
+    fmt = fmt or STORE_FORMAT
+    if fmt == "fast" and orjson is not None:
+        try:
+            return orjson.dumps(value, option=orjson.OPT_NON_STR_KEYS).decode("utf-8")
+        except TypeError:
+            pass  # Misal integer > 64 bit, pakai json biasa
+    if fmt == "pretty":
+        return json.dumps(value, indent=4, ensure_ascii=False)
+    return json.dumps(value, separators=(",", ":"), ensure_ascii=False)
+
+
+def encode_compact(value):
+    """Serialisasi satu baris untuk record journal / kolom SQLite (tidak pernah di-indent)"""
+    return encode_json(value, "fast" if STORE_FORMAT == "fast" else "compact")
+
+
+def _write_json(path, value):
+    _write_atomic(path, encode_json(value))
+
+
+def _clone(value):
+    """Salinan data lewat encoder C json (jauh lebih cepat dari copy.deepcopy)"""
+    return json.loads(json.dumps(value))
+
+
+def _section_value(data, section):
+    """Isi satu section; meta = semua key top-level selain players dan SHARDED_SECTIONS"""
+    if section == META_SECTION:
+        return {k: v for k, v in data.items() if k != "players" and k not in SHARDED_SECTIONS}
+    return data.get(section, {})
+
+
+class JsonFileBackend:
+    """Layout lama: semua data di satu file data.json"""
+
+    name = "json"
+    keeps_history = False
+    wants_full_write = True
+
+    def __init__(self, path=DATA_FILE):
+        self.path = path
+
+    def exists(self):
+        return os.path.exists(self.path)
+
+    def read(self):
+        """Baca seluruh data, None jika file belum ada"""
+        if not self.exists():
+            return None
+        return _read_json(self.path)
+
+    def write(self, data, players=None, sections=None):
+        """Selalu tulis ulang seluruh file (players/sections diabaikan)"""
+        _write_json(self.path, data)
+
+
+class ShardedBackend:
+    """Satu file per player di players/ plus file kecil untuk guilds, server_stats, world_bosses"""
+
+    name = "sharded"
+    keeps_history = False
+
+    def __init__(self, directory=STORE_DIR):
+        self.directory = directory
+        self.players_dir = os.path.join(directory, "players")
+
+    def _section_path(self, section):
+        return os.path.join(self.directory, f"{section}.json")
+
+    def _player_path(self, player_id):
+        return os.path.join(self.players_dir, f"{player_id}.json")
+
+    def exists(self):
+        return os.path.exists(self._section_path(META_SECTION))
+
+    def read(self):
+        """Gabungkan semua shard jadi satu dict dengan struktur yang sama seperti data.json"""
+        if not self.exists():
+            return None
+
+        data = _read_json(self._section_path(META_SECTION))
+        for section in SHARDED_SECTIONS:
+            path = self._section_path(section)
+            if os.path.exists(path):
+                data[section] = _read_json(path)
+
+        players = {}
+        if os.path.exists(self.players_dir):
+            for filename in os.listdir(self.players_dir):
+                if filename.endswith(".json"):
+                    players[filename[:-5]] = _read_json(os.path.join(self.players_dir, filename))
+        data["players"] = players
+        return data
+
+    def write(self, data, players=None, sections=None):
+        """Tulis hanya shard yang berubah (None = tulis semua)"""
+        os.makedirs(self.players_dir, exist_ok=True)
+
+        if players is None:
+            players = list(data["players"].keys())
+        for player_id in players:
+            path = self._player_path(player_id)
+            if player_id in data["players"]:
+                _write_json(path, data["players"][player_id])
+            elif os.path.exists(path):
+                os.remove(path)
+
+        if sections is None:
+            sections = SHARDED_SECTIONS + (META_SECTION,)
+        for section in sections:
+            _write_json(self._section_path(section), _section_value(data, section))
+
+
+# Kolom player yang dipisah dari JSON agar bisa di-index (sisanya tetap di kolom data)
+PLAYER_COLUMNS = {
+    "exp": ("INTEGER", 0),
+    "qi": ("INTEGER", 0),
+    "spirit_stones": ("INTEGER", 0),
+    "total_power": ("INTEGER", 0),
+    "pvp_wins": ("INTEGER", 0),
+    "pvp_losses": ("INTEGER", 0),
+    "realm": ("TEXT", None),
+    "stage": ("TEXT", None),
+    "last_updated": ("TEXT", None),
+}
+
+# Minimal jumlah match PvP untuk masuk ranking win rate
+PVP_MIN_MATCHES = 10
+
+
+def _pvp_winrate_key(player):
+    wins = player.get("pvp_wins") or 0
+    matches = wins + (player.get("pvp_losses") or 0)
+    if matches < PVP_MIN_MATCHES:
+        return None
+    return (-wins / matches, -matches)
+
+
+# Ranking yang punya RankIndex di memory (key ascending, jadi nilai dibalik untuk urutan descending)
+RANK_INDEX_KEYS = {
+    "power": lambda p: (-(p.get("total_power") or 0),),
+    "pvp": lambda p: (-(p.get("pvp_wins") or 0), p.get("pvp_losses") or 0),
+    "pvp_winrate": _pvp_winrate_key,
+}
+
+
+class SqliteBackend:
+    """Player sebagai row di SQLite (WAL), kolom hot di-index, sisanya JSON"""
+
+    name = "sqlite"
+    keeps_history = False
+
+    def __init__(self, path=STORE_DB):
+        self.path = path
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self._create_tables()
+
+    def _create_tables(self):
+        columns = ", ".join(f"{name} {kind}" for name, (kind, _) in PLAYER_COLUMNS.items())
+        with self.conn:
+            self.conn.execute(f"CREATE TABLE IF NOT EXISTS players (id TEXT PRIMARY KEY, {columns}, data TEXT NOT NULL)")
+            self.conn.execute("CREATE TABLE IF NOT EXISTS sections (name TEXT PRIMARY KEY, data TEXT NOT NULL)")
+            for name in ("total_power", "exp", "spirit_stones", "realm"):
+                self.conn.execute(f"CREATE INDEX IF NOT EXISTS idx_players_{name} ON players ({name})")
+
+    def exists(self):
+        row = self.conn.execute("SELECT 1 FROM sections WHERE name = ?", (META_SECTION,)).fetchone()
+        return row is not None
+
+    def read(self):
+        """Gabungkan semua row jadi satu dict dengan struktur yang sama seperti data.json"""
+        if not self.exists():
+            return None
+
+        sections = dict(self.conn.execute("SELECT name, data FROM sections"))
+        data = json.loads(sections.pop(META_SECTION))
+        for section, value in sections.items():
+            data[section] = json.loads(value)
+
+        data["players"] = {
+            player_id: json.loads(value)
+            for player_id, value in self.conn.execute("SELECT id, data FROM players")
+        }
+        return data
+
+    def write(self, data, players=None, sections=None):
+        """Upsert satu row per player yang berubah dalam satu transaksi"""
+        if players is None:
+            players = list(data["players"].keys())
+        if sections is None:
+            sections = SHARDED_SECTIONS + (META_SECTION,)
+
+        names = list(PLAYER_COLUMNS)
+        upsert = (
+            f"INSERT INTO players (id, {', '.join(names)}, data) VALUES (?, {', '.join('?' for _ in names)}, ?) "
+            f"ON CONFLICT(id) DO UPDATE SET {', '.join(f'{n} = excluded.{n}' for n in names)}, data = excluded.data"
+        )
+
+        with self.conn:
+            for player_id in players:
+                player = data["players"].get(player_id)
+                if player is None:
+                    self.conn.execute("DELETE FROM players WHERE id = ?", (player_id,))
+                    continue
+                values = [player.get(n, default) for n, (_, default) in PLAYER_COLUMNS.items()]
+                self.conn.execute(upsert, (player_id, *values, encode_compact(player)))
+
+            for section in sections:
+                self.conn.execute(
+                    "INSERT OR REPLACE INTO sections (name, data) VALUES (?, ?)",
+                    (section, encode_compact(_section_value(data, section)))
+                )
+
+    def count_players(self):
+        return self.conn.execute("SELECT COUNT(*) FROM players").fetchone()[0]
+
+
+class JournalBackend:
+    """Snapshot + journal append-only berisi delta per player
+
+    File: <prefix>.snapshot berisi {"segment": n, "data": {...}} yang sudah mencakup
+    semua segment journal <= n, lalu <prefix>.<n+1>, <prefix>.<n+2>, ... di-replay di atasnya.
+    """
+
+    name = "journal"
+    keeps_history = True
+
+    def __init__(self, prefix=STORE_JOURNAL, max_bytes=JOURNAL_MAX_BYTES):
+        self.prefix = prefix
+        self.snapshot_path = f"{prefix}.snapshot"
+        self.max_bytes = max_bytes
+        self.segment = 0
+        self.segment_bytes = 0
+        self._file = None
+        self._written = {}
+
+    def _segment_path(self, segment):
+        return f"{self.prefix}.{segment}"
+
+    def _segments(self):
+        """Nomor segment journal yang ada di disk, urut naik"""
+        directory = os.path.dirname(self.prefix) or "."
+        base = os.path.basename(self.prefix) + "."
+        segments = []
+        for filename in os.listdir(directory):
+            if filename.startswith(base) and filename[len(base):].isdigit():
+                segments.append(int(filename[len(base):]))
+        return sorted(segments)
+
+    def exists(self):
+        return os.path.exists(self.snapshot_path) or bool(self._segments())
+
+    def read(self):
+        """Load snapshot terakhir lalu replay semua delta di journal"""
+        if not self.exists():
+            return None
+
+        covered = 0
+        data = {}
+        if os.path.exists(self.snapshot_path):
+            snapshot = _read_json(self.snapshot_path)
+            covered = snapshot["segment"]
+            data = snapshot["data"]
+        data.setdefault("players", {})
+
+        replayed = 0
+        segments = [n for n in self._segments() if n > covered]
+        for segment in segments:
+            with open(self._segment_path(segment), "r") as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except json.JSONDecodeError:
+                        # Baris terakhir terpotong (crash saat menulis), sisanya diabaikan
+                        print(f"⚠️ Journal segment {segment} terpotong, replay berhenti di sini")
+                        break
+                    self._apply(data, record)
+                    replayed += 1
+
+        self.segment = max(segments + [covered]) + 1
+        if replayed:
+            print(f"📜 Replayed {replayed} journal records")
+        return data
+
+    @staticmethod
+    def _apply(data, record):
+        """Terapkan satu record journal ke data"""
+        if "k" in record:
+            if record["k"] == META_SECTION:
+                # Record meta berisi seluruh section: ganti, jangan merge (key yang dihapus ikut hilang)
+                for key in [k for k in data if k != "players" and k not in SHARDED_SECTIONS]:
+                    del data[key]
+                data.update(record["v"])
+            else:
+                data[record["k"]] = record["v"]
+        elif record.get("x"):
+            data["players"].pop(record["p"], None)
+        elif "f" in record:
+            data["players"][record["p"]] = record["f"]
+        else:
+            player = data["players"].setdefault(record["p"], {})
+            player.update(record.get("s", {}))
+            for field in record.get("u", []):
+                player.pop(field, None)
+
+    def _player_delta(self, player_id, player):
+        """Hanya field top-level yang berubah sejak terakhir ditulis"""
+        if player_id not in self._written:
+            # Belum ada state yang diketahui (baru start / setelah compaction): tulis player utuh
+            self._written[player_id] = {
+                field: encode_compact(value)
+                for field, value in player.items()
+            }
+            return {"p": player_id, "f": player}
+
+        written = self._written[player_id]
+        changed = {}
+        for field, value in player.items():
+            encoded = encode_compact(value)
+            if written.get(field) != encoded:
+                written[field] = encoded
+                changed[field] = value
+        removed = [field for field in written if field not in player]
+        for field in removed:
+            del written[field]
+
+        record = {"p": player_id}
+        if changed:
+            record["s"] = changed
+        if removed:
+            record["u"] = removed
+        return record if len(record) > 1 else None
+
+    def write(self, data, players=None, sections=None):
+        """Append delta player/section yang berubah lalu fsync sekali per batch"""
+        if players is None:
+            # Tulis penuh (data baru / restore / segment penuh): langsung jadi snapshot
+            self.compact(data)
+            return
+
+        records = []
+        for player_id in players:
+            player = data["players"].get(player_id)
+            if player is None:
+                self._written.pop(player_id, None)
+                records.append({"p": player_id, "x": 1})
+                continue
+            record = self._player_delta(player_id, player)
+            if record:
+                records.append(record)
+        for section in sections or ():
+            records.append({"k": section, "v": _section_value(data, section)})
+
+        if not records:
+            return
+
+        if self._file is None:
+            self._file = open(self._segment_path(self.segment), "a")
+        payload = "".join(encode_compact(r) + "\n" for r in records)
+        self._file.write(payload)
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self.segment_bytes += len(payload)
+
+    @property
+    def wants_full_write(self):
+        """Segment sudah melewati batas, flush berikutnya dikirim utuh untuk compaction"""
+        return self.segment_bytes >= self.max_bytes
+
+    def compact(self, data):
+        """Tulis snapshot baru dari data lalu hapus segment yang sudah tercakup"""
+        covered = self.segment
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+        self.segment = covered + 1
+        self.segment_bytes = 0
+        self._written = {}
+
+        _write_atomic(self.snapshot_path, encode_compact({"segment": covered, "data": data}))
+
+        for segment in self._segments():
+            if segment <= covered:
+                os.remove(self._segment_path(segment))
+        print(f"🗜️ Journal compacted into snapshot (segment {covered})")
+
+
+def create_backend(kind=STORE_BACKEND):
+    """Pilih backend berdasarkan STORE_BACKEND"""
+    if kind == "sharded":
+        return ShardedBackend()
+    if kind == "sqlite":
+        return SqliteBackend()
+    if kind == "journal":
+        return JournalBackend()
+    return JsonFileBackend()
+
+
+def _merge_changed(older, newer):
+    return {
+        "all": older["all"] or newer["all"],
+        "players": older["players"] | newer["players"],
+        "sections": older["sections"] | newer["sections"]
+    }
+
+
+def _merge_plans(older, newer):
+    """Gabungkan dua write plan berurutan menjadi satu (plan baru menimpa yang lama)"""
+    waiters = older["waiters"] + newer["waiters"]
+    if newer["data"] is None:
+        older["waiters"] = waiters
+        return older
+    if older["data"] is None or newer["players"] is None:
+        newer["waiters"] = waiters
+        newer["changed"] = _merge_changed(older["changed"], newer["changed"])
+        return newer
+
+    data = older["data"]
+    for player_id in newer["players"]:
+        if player_id in newer["data"]["players"]:
+            data["players"][player_id] = newer["data"]["players"][player_id]
+        else:
+            data["players"].pop(player_id, None)
+    for section in newer["sections"]:
+        if section == META_SECTION:
+            for key in list(_section_value(data, META_SECTION)):
+                del data[key]
+            data.update(_section_value(newer["data"], META_SECTION))
+        else:
+            data[section] = newer["data"][section]
+
+    if older["players"] is not None:
+        older["players"] = sorted(set(older["players"]) | set(newer["players"]))
+        older["sections"] = sorted(set(older["sections"]) | set(newer["sections"]))
+    older["changed"] = _merge_changed(older["changed"], newer["changed"])
+    older["waiters"] = waiters
+    return older
+
+
+class PlayerStore:
+    """Sumber data authoritative untuk seluruh proses bot"""
+
+    def __init__(self, backend=None, flush_interval=FLUSH_INTERVAL):
+        self.backend = backend or create_backend()
+        self.flush_interval = flush_interval
+        self.data = None
+        self.dirty = False
+        self.dirty_players = set()
+        self.dirty_sections = set()
+        self.last_flush = 0
+        self._loader = None
+        self._before_flush = None
+        self._after_write = None
+        self._commit_hook = None
+        self._player_listeners = []
+        self._reset_listeners = []
+        self._flush_task = None
+        self._lock = threading.RLock()
+        self._player_locks = {}
+        self._queue = queue.Queue()
+        self._writer = None
+        self.rank_indexes = {order: RankIndex(key) for order, key in RANK_INDEX_KEYS.items()}
+        self._indexes_stale = True
+        # Salinan per player / section dari full write terakhir (backend json), dipakai ulang
+        # untuk bagian yang tidak berubah supaya flush tidak meng-clone seluruh data
+        self._clones = None
+
+    def configure(self, loader, before_flush=None, after_write=None):
+        """Set fungsi loader (baca dari disk), hook sebelum flush dan hook setelah write
+
+        before_flush(data) jalan di thread event loop sebelum snapshot;
+        after_write(plan) jalan di writer thread setelah plan tertulis (juga untuk
+        plan barrier), dipakai backup engine.
+        """
+        self._loader = loader
+        self._before_flush = before_flush
+        self._after_write = after_write
+
+    def add_player_listener(self, listener):
+        """Listener(player_id, player) yang dipanggil setiap mark_player (player None = dihapus)"""
+        self._player_listeners.append(listener)
+
+    def add_reset_listener(self, listener):
+        """Listener() yang dipanggil saat seluruh data diganti / ditandai dirty (put, reload)"""
+        self._reset_listeners.append(listener)
+
+    def _notify_reset(self):
+        for listener in self._reset_listeners:
+            listener()
+
+    def set_commit_hook(self, hook):
+        """Hook(player_id, player) yang dijalankan untuk tiap player saat player_txn commit"""
+        self._commit_hook = hook
+
+    def player_lock(self, player_id):
+        """asyncio.Lock per player (dibuat saat pertama kali dipakai)"""
+        player_id = str(player_id)
+        if player_id not in self._player_locks:
+            self._player_locks[player_id] = asyncio.Lock()
+        return self._player_locks[player_id]
+
+    def get(self):
+        """Dapatkan data dari memory, file hanya dibaca saat pertama kali"""
+        if self.data is None:
+            with self._lock:
+                if self.data is None:
+                    self.data = self._loader()
+        return self.data
+
+    def put(self, data):
+        """Tandai seluruh data sebagai dirty (ganti root data jika objek berbeda)"""
+        with self._lock:
+            if data is not self.data:
+                self.data = data
+            self.dirty = True
+            self._indexes_stale = True
+            self._notify_reset()
+
+    def mark_player(self, player_id):
+        """Tandai satu player dirty, hanya shard player ini yang ditulis ulang"""
+        player_id = str(player_id)
+        with self._lock:
+            self.dirty_players.add(player_id)
+            # Setiap perubahan player lewat sini, jadi rank index ikut di-update di tempat
+            if self.data is not None:
+                player = self.data["players"].get(player_id)
+                if not self._indexes_stale:
+                    for index in self.rank_indexes.values():
+                        index.update(player_id, player)
+                for listener in self._player_listeners:
+                    listener(player_id, player)
+
+    def mark_section(self, section):
+        """Tandai satu section dirty (section tanpa file sendiri masuk meta)"""
+        if section not in SHARDED_SECTIONS:
+            section = META_SECTION
+        with self._lock:
+            self.dirty_sections.add(section)
+
+    def section_dirty(self, section):
+        """True jika section sudah ditandai berubah untuk flush berikutnya"""
+        if section not in SHARDED_SECTIONS:
+            section = META_SECTION
+        with self._lock:
+            return section in self.dirty_sections
+
+    def has_changes(self):
+        return self.dirty or bool(self.dirty_players) or bool(self.dirty_sections)
+
+    async def reload(self):
+        """Buang data di memory dan baca ulang dari disk tanpa memblokir event loop"""
+        # Tunggu write yang masih antri agar yang dibaca adalah data terbaru
+        await self.persist()
+        data = await asyncio.get_running_loop().run_in_executor(None, self._loader)
+        with self._lock:
+            self.data = data
+            self.dirty = False
+            self.dirty_players.clear()
+            self.dirty_sections.clear()
+            self._clones = None
+            self._indexes_stale = True
+            self._notify_reset()
+        return data
+
+    def _snapshot(self):
+        """Salin bagian data yang dirty menjadi write plan (dipanggil dari thread event loop)
+
+        Hanya salinan yang dikirim ke writer thread, jadi command boleh terus
+        mengubah data di memory selama penulisan berjalan.
+        """
+        with self._lock:
+            if self.data is None:
+                return None
+            # Apa yang benar-benar berubah, sebelum dipaksa full write oleh backend json
+            full_change = self.dirty
+            if getattr(self.backend, "wants_full_write", False):
+                self.dirty = True
+            if not self.has_changes():
+                return None
+
+            if self._before_flush:
+                self._before_flush(self.data)
+            changed = {
+                "all": full_change,
+                "players": set(self.dirty_players),
+                "sections": set(self.dirty_sections)
+            }
+
+            if self.dirty:
+                plan = {"data": self._full_clone(full_change), "players": None, "sections": None}
+            else:
+                players = sorted(self.dirty_players)
+                sections = sorted(self.dirty_sections)
+                partial = {"players": {
+                    uid: _clone(self.data["players"][uid]) for uid in players if uid in self.data["players"]
+                }}
+                for section in sections:
+                    if section == META_SECTION:
+                        partial.update(_clone(_section_value(self.data, section)))
+                    else:
+                        partial[section] = _clone(_section_value(self.data, section))
+                plan = {"data": partial, "players": players, "sections": sections}
+
+            self.dirty = False
+            self.dirty_players.clear()
+            self.dirty_sections.clear()
+
+        plan["changed"] = changed
+        plan["waiters"] = []
+        return plan
+
+    def _full_clone(self, full_change):
+        """Salinan seluruh data untuk full write (dipanggil dengan lock dipegang)
+
+        Jika yang berubah hanya player / section dirty (backend json memaksa full write),
+        cukup clone bagian itu dan pakai ulang salinan lama untuk sisanya. Salinan di
+        plan tidak pernah diubah lagi, jadi aman dibagi antar plan.
+        """
+        if full_change or self._clones is None:
+            data = _clone(self.data)
+            if not getattr(self.backend, "wants_full_write", False):
+                return data
+            self._clones = {
+                "players": dict(data["players"]),
+                "sections": {section: data[section] for section in SHARDED_SECTIONS if section in data},
+                "meta": _section_value(data, META_SECTION)
+            }
+            return data
+
+        clones = self._clones
+        for uid in self.dirty_players:
+            player = self.data["players"].get(uid)
+            if player is None:
+                clones["players"].pop(uid, None)
+            else:
+                clones["players"][uid] = _clone(player)
+        for section in self.dirty_sections:
+            if section == META_SECTION:
+                clones["meta"] = _clone(_section_value(self.data, section))
+            elif section in self.data:
+                clones["sections"][section] = _clone(self.data[section])
+            else:
+                clones["sections"].pop(section, None)
+
+        # Urutan key sama dengan data di memory agar isi file tetap stabil
+        data = {}
+        for key in self.data:
+            if key == "players":
+                data[key] = dict(clones["players"])
+            else:
+                cached = clones["sections"] if key in SHARDED_SECTIONS else clones["meta"]
+                if key not in cached:
+                    cached[key] = _clone(self.data[key])
+                data[key] = cached[key]
+        return data
+
+    def _write_plan(self, plan):
+        """Jalankan satu write plan (di writer thread, atau langsung jika thread tidak jalan)"""
+        if plan["data"] is not None:
+            try:
+                self.backend.write(plan["data"], plan["players"], plan["sections"])
+                self.last_flush = time.time()
+            except Exception:
+                # Data di memory tetap benar, tulis ulang semuanya di flush berikutnya
+                with self._lock:
+                    self.dirty = True
+                raise
+
+        if self._after_write:
+            try:
+                self._after_write(plan)
+            except Exception as e:
+                # Backup gagal tidak membatalkan write yang sudah berhasil
+                print(f"❌ Error creating backup: {e}")
+
+    def _writer_loop(self):
+        """Writer thread: ambil plan dari antrian, gabungkan yang menumpuk, tulis atomik"""
+        while True:
+            plan = self._queue.get()
+            while True:
+                try:
+                    plan = _merge_plans(plan, self._queue.get_nowait())
+                except queue.Empty:
+                    break
+
+            error = None
+            try:
+                self._write_plan(plan)
+            except Exception as e:
+                error = e
+                print(f"❌ Error writing player store: {e}")
+            for waiter in plan["waiters"]:
+                waiter(error)
+
+    def _submit(self, waiter=None):
+        """Ambil snapshot dan kirim ke writer thread; plan kosong tetap jadi barrier untuk waiter"""
+        plan = self._snapshot()
+        written = plan is not None
+        if plan is None:
+            plan = {
+                "data": None, "players": None, "sections": None,
+                "changed": {"all": False, "players": set(), "sections": set()}, "waiters": []
+            }
+        if waiter:
+            plan["waiters"].append(waiter)
+
+        if self._writer is not None and self._writer.is_alive():
+            self._queue.put(plan)
+        else:
+            error = None
+            try:
+                self._write_plan(plan)
+            except Exception as e:
+                error = e
+                print(f"❌ Error writing player store: {e}")
+            for callback in plan["waiters"]:
+                callback(error)
+        return written
+
+    def flush(self):
+        """Tulis perubahan sekarang dan tunggu sampai selesai (blocking), return True jika ada yang ditulis"""
+        done = threading.Event()
+        written = self._submit(lambda error: done.set())
+        done.wait()
+        return written
+
+    async def persist(self):
+        """Snapshot perubahan sekarang lalu await sampai benar-benar tersimpan di disk"""
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+
+        def resolve(error):
+            def set_result():
+                if future.done():
+                    return
+                if error:
+                    future.set_exception(error)
+                else:
+                    future.set_result(True)
+            try:
+                loop.call_soon_threadsafe(set_result)
+            except RuntimeError:
+                pass  # Event loop sudah ditutup
+
+        self._submit(resolve)
+        return await future
+
+    def rank_index(self, order):
+        """RankIndex untuk `order` (dibangun / disamakan ulang jika data diganti), None jika tidak ada"""
+        index = self.rank_indexes.get(order)
+        if index is None:
+            return None
+        players = self.get()["players"]
+        with self._lock:
+            if self._indexes_stale:
+                for stale in self.rank_indexes.values():
+                    if len(stale):
+                        stale.reconcile(players)
+                    else:
+                        stale.rebuild(players)
+                self._indexes_stale = False
+        return index
+
+    def _ranking(self, order):
+        index = self.rank_index(order)
+        if index is None:
+            raise ValueError(f"Unknown rank order: {order}")
+        return index
+
+    def ranked_players(self, order="power", limit=None, offset=0):
+        """List (uid, player) terurut descending dari RankIndex"""
+        players = self.get()["players"]
+        return [(uid, players[uid]) for uid in self._ranking(order).page(offset, limit)]
+
+    def rank_of(self, player_id, order="power"):
+        """Ranking satu player (1 = teratas), None jika belum terdaftar"""
+        return self._ranking(order).rank(str(player_id))
+
+    def count_players(self):
+        return len(self.get()["players"])
+
+    def count_ranked(self, order):
+        """Jumlah player di satu ranking (view terfilter seperti pvp_winrate bisa lebih sedikit)"""
+        return len(self._ranking(order))
+
+    def active_since(self, since):
+        """(uid, last_updated) player yang aktif sejak `since` (ISO string), terbaru dulu
+
+        Dibaca dari memory, jadi tidak perlu flush dulu ke backend.
+        """
+        recent = [
+            (uid, p.get("last_updated"))
+            for uid, p in self.get()["players"].items()
+            if p is not None and (p.get("last_updated") or "") >= since
+        ]
+        recent.sort(key=lambda x: x[1], reverse=True)
+        return recent
+
+    async def flush_loop(self):
+        """Background task: kirim data dirty ke writer thread setiap flush_interval detik"""
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            try:
+                await self.persist()
+            except Exception as e:
+                print(f"❌ Error flushing player store: {e}")
+
+    def start(self):
+        """Jalankan writer thread dan flush loop sekali saja (on_ready bisa terpanggil berkali-kali)"""
+        # Bangun rank index dari data yang sudah dimuat sebelum command pertama masuk
+        for order in self.rank_indexes:
+            self.rank_index(order)
+
+        if self._writer is None or not self._writer.is_alive():
+            self._writer = threading.Thread(target=self._writer_loop, name="player-store-writer", daemon=True)
+            self._writer.start()
+        if self._flush_task is None or self._flush_task.done():
+            self._flush_task = asyncio.create_task(self.flush_loop())
+        return self._flush_task
+
+
+class PlayerTxn:
+    """Context manager: lock beberapa player, berikan record mutable, commit sekali di akhir
+
+    txn = player_txn(winner_id, loser_id, stats=True)
+    async with txn as (winner, loser, stats):
+        if not valid:
+            txn.abort()
+        ...
+
+    Record yang diberikan adalah data live di memory. Jika blok keluar karena exception
+    atau txn.abort(), record dikembalikan ke isi saat masuk dan tidak ada yang di-commit.
+    Kirim pesan ke Discord setelah blok selesai agar lock tidak ditahan selama await.
+    """
+
+    def __init__(self, store, player_ids, stats=False):
+        self.store = store
+        self.player_ids = [str(player_id) for player_id in player_ids]
+        self.stats = stats
+        self.aborted = False
+        self._locks = []
+        self._records = ()
+        self._saved = ()
+
+    def abort(self):
+        """Batalkan transaksi: perubahan di blok di-rollback saat keluar"""
+        self.aborted = True
+
+    async def __aenter__(self):
+        # Urutan lock selalu sama (sorted) agar dua transaksi tidak saling deadlock
+        for player_id in sorted(set(self.player_ids)):
+            lock = self.store.player_lock(player_id)
+            await lock.acquire()
+            self._locks.append(lock)
+
+        data = self.store.get()
+        records = [data["players"].get(player_id) for player_id in self.player_ids]
+        if self.stats:
+            records.append(data["server_stats"])
+        self._records = tuple(records)
+        self._saved = tuple(None if record is None else _clone(record) for record in self._records)
+        return self._records
+
+    def _rollback(self):
+        """Kembalikan record yang berubah; index / listener ikut disamakan lewat mark_player"""
+        for i, (record, saved) in enumerate(zip(self._records, self._saved)):
+            if record is None or record == saved:
+                continue
+            record.clear()
+            record.update(saved)
+            if i < len(self.player_ids):
+                self.store.mark_player(self.player_ids[i])
+            else:
+                self.store.mark_section("server_stats")
+
+    async def __aexit__(self, exc_type, exc, tb):
+        try:
+            if exc_type is not None or self.aborted:
+                self._rollback()
+                return False
+            now = datetime.datetime.now().isoformat()
+            players = self.store.get()["players"]
+            for player_id in dict.fromkeys(self.player_ids):
+                player = players.get(player_id)
+                if player is None:
+                    continue
+                player["last_updated"] = now
+                if self.store._commit_hook:
+                    self.store._commit_hook(player_id, player)
+                self.store.mark_player(player_id)
+            if self.stats:
+                self.store.mark_section("server_stats")
+        finally:
+            for lock in reversed(self._locks):
+                lock.release()
+            self._locks = []
+            self._saved = ()
+        return False
+
+
+PLAYER_STORE = PlayerStore()
+
+
+def player_txn(*player_ids, stats=False):
+    """Transaksi untuk satu atau lebih player (opsional server_stats) pada PLAYER_STORE"""
+    return PlayerTxn(PLAYER_STORE, player_ids, stats)
+
+# Pastikan data terakhir tersimpan saat proses berhenti
+atexit.register(PLAYER_STORE.flush)
+
+
+def migrate_store(source=DATA_FILE, kind="sharded", dest=None):
+    """Migrasi satu kali dari data.json ke backend sharded / sqlite / journal"""
+    data = JsonFileBackend(source).read()
+    if data is None:
+        print(f"❌ {source} tidak ditemukan")
+        return False
+
+    if kind == "sqlite":
+        dest = dest or STORE_DB
+        target = SqliteBackend(dest)
+    elif kind == "journal":
+        dest = dest or STORE_JOURNAL
+        target = JournalBackend(dest)
+    else:
+        dest = dest or STORE_DIR
+        target = ShardedBackend(dest)
+
+    if target.exists():
+        print(f"❌ {dest} sudah berisi data, migrasi dibatalkan")
+        return False
+
+    data.setdefault("players", {})
+    target.write(data)
+    print(f"✅ Migrated {len(data['players'])} players dari {source} ke {dest} ({kind})")
+    return True
+
+
+if __name__ == "__main__":
+    # python player_store.py migrate --to sqlite --source data.json --dest data.db
+    parser = argparse.ArgumentParser(description="Player store tools")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    migrate_parser = subparsers.add_parser("migrate", help="Migrasi data.json ke layout sharded / sqlite / journal")
+    migrate_parser.add_argument("--to", choices=["sharded", "sqlite", "journal"], default="sharded")
+    migrate_parser.add_argument("--source", default=DATA_FILE)
+    migrate_parser.add_argument("--dest", default=None)
+
+    args = parser.parse_args()
+    if args.command == "migrate":
+        migrate_store(args.source, args.to, args.dest)
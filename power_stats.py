@@ -0,0 +1,192 @@
+import bisect
+import math
+import random
+
+# ===============================
+# Power stats - sketch kuantil (KLL) atas total_power, keseluruhan dan
+# per realm, untuk persentil & distribusi tanpa sort semua player
+# ===============================
+POWER_STATS_KEY = "power_distribution"
+
+
+class KLLSketch:
+    """KLL quantile sketch: memori O(k), error rank ~1.7/k dengan probabilitas tinggi
+
+    Level h menyimpan item dengan bobot 2^h. Jika total item melewati kapasitas,
+    level yang penuh di-sort dan separuh itemnya (ganjil/genap acak) naik level.
+    """
+
+    def __init__(self, k=200, c=2 / 3):
+        self.k = k
+        self.c = c
+        self.n = 0
+        self.compactors = [[]]
+        self._sorted = None
+        self._rng = random.Random()
+
+    def _capacity(self, level):
+        depth = len(self.compactors) - level - 1
+        return max(2, int(math.ceil(self.k * self.c ** depth)))
+
+    def update(self, value):
+        self.compactors[0].append(value)
+        self.n += 1
+        self._sorted = None
+        if sum(map(len, self.compactors)) > sum(self._capacity(h) for h in range(len(self.compactors))):
+            self._compress()
+
+    def _compress(self):
+        for level in range(len(self.compactors)):
+            if len(self.compactors[level]) >= self._capacity(level):
+                if level + 1 == len(self.compactors):
+                    self.compactors.append([])
+                items = sorted(self.compactors[level])
+                # Item sisa (jika ganjil) tetap di level ini
+                keep = items[-1:] if len(items) % 2 else []
+                pairs = items[:len(items) - len(keep)]
+                self.compactors[level + 1].extend(pairs[self._rng.random() < 0.5::2])
+                self.compactors[level] = keep
+                break
+
+    def _weighted(self):
+        """(values terurut, bobot kumulatif) di-cache sampai update berikutnya"""
+        if self._sorted is None:
+            items = sorted(
+                (value, 1 << level)
+                for level, compactor in enumerate(self.compactors)
+                for value in compactor
+            )
+            values = [value for value, _ in items]
+            cumulative = []
+            total = 0
+            for _, weight in items:
+                total += weight
+                cumulative.append(total)
+            self._sorted = (values, cumulative)
+        return self._sorted
+
+    def rank(self, value, inclusive=True):
+        """Perkiraan fraksi item <= value (atau < value jika inclusive=False), 0..1"""
+        values, cumulative = self._weighted()
+        if not values:
+            return 0.0
+        i = bisect.bisect_right(values, value) if inclusive else bisect.bisect_left(values, value)
+        return cumulative[i - 1] / cumulative[-1] if i else 0.0
+
+    def quantile(self, q):
+        """Perkiraan nilai pada kuantil q (0..1), None jika kosong"""
+        values, cumulative = self._weighted()
+        if not values:
+            return None
+        target = q * cumulative[-1]
+        i = bisect.bisect_left(cumulative, target)
+        return values[min(i, len(values) - 1)]
+
+    def to_dict(self):
+        return {"k": self.k, "n": self.n, "compactors": [list(c) for c in self.compactors]}
+
+    @classmethod
+    def from_dict(cls, state):
+        sketch = cls(state.get("k", 200))
+        sketch.n = state.get("n", 0)
+        sketch.compactors = [list(c) for c in state.get("compactors", [[]])] or [[]]
+        return sketch
+
+
+class PowerStats:
+    """Distribusi total_power keseluruhan + per realm
+
+    observe() dipanggil PLAYER_STORE setiap player berubah; nilai baru hanya
+    dimasukkan jika power/realm berubah. Sketch KLL tidak bisa menghapus nilai
+    lama, jadi saat jumlah update sudah 2x jumlah player sketch dibangun ulang
+    dari nilai terakhir tiap player (O(n), jarang terjadi).
+    """
+
+    def __init__(self, k=200):
+        self.k = k
+        self.latest = {}  # uid -> (power, realm)
+        self.overall = KLLSketch(k)
+        self.realms = {}
+        self.loaded = False
+        self.dirty = False
+
+    def _value(self, player):
+        if not isinstance(player, dict):
+            return None
+        return (player.get("total_power") or 0, player.get("realm") or "Unknown")
+
+    def _insert(self, power, realm):
+        self.overall.update(power)
+        if realm not in self.realms:
+            self.realms[realm] = KLLSketch(self.k)
+        self.realms[realm].update(power)
+
+    def rebuild(self):
+        self.overall = KLLSketch(self.k)
+        self.realms = {}
+        for power, realm in self.latest.values():
+            self._insert(power, realm)
+        self.dirty = True
+
+    def observe(self, player_id, player):
+        """Listener PLAYER_STORE.mark_player"""
+        if not self.loaded:
+            return
+        value = self._value(player)
+        old = self.latest.get(player_id)
+        if value == old:
+            return
+        if value is None:
+            del self.latest[player_id]
+        else:
+            self.latest[player_id] = value
+            self._insert(*value)
+        self.dirty = True
+
+        if self.overall.n > 2 * max(len(self.latest), 100):
+            self.rebuild()
+
+    def load(self, data):
+        """Muat sketch yang tersimpan di server_stats, atau bangun dari data player"""
+        self.latest = {}
+        for player_id, player in data["players"].items():
+            value = self._value(player)
+            if value is not None:
+                self.latest[player_id] = value
+
+        state = data.get("server_stats", {}).get(POWER_STATS_KEY)
+        if state and state.get("players") == len(self.latest):
+            self.overall = KLLSketch.from_dict(state["overall"])
+            self.realms = {realm: KLLSketch.from_dict(s) for realm, s in state["realms"].items()}
+            self.dirty = False
+        else:
+            self.rebuild()
+        self.loaded = True
+
+    def save_to(self, server_stats):
+        """Simpan sketch ke server_stats, return True jika ada perubahan"""
+        if not self.dirty:
+            return False
+        server_stats[POWER_STATS_KEY] = {
+            "players": len(self.latest),
+            "overall": self.overall.to_dict(),
+            "realms": {realm: sketch.to_dict() for realm, sketch in self.realms.items()}
+        }
+        self.dirty = False
+        return True
+
+    def percentile(self, power, realm=None):
+        """Persentase player dengan power >= power (Top X%), None jika tidak ada data"""
+        sketch = self.overall if realm is None else self.realms.get(realm)
+        if sketch is None or not sketch.n:
+            return None
+        return (1 - sketch.rank(power, inclusive=False)) * 100
+
+    def realm_counts(self):
+        counts = {}
+        for _, realm in self.latest.values():
+            counts[realm] = counts.get(realm, 0) + 1
+        return counts
+
+
+POWER_STATS = PowerStats()
@@ -0,0 +1,178 @@
+from collections import namedtuple
+from types import MappingProxyType
+
+# ===============================
+# Progression - data race & realm beserta tabel (realm, stage) yang
+# dibangun sekali saat import: ordinal, level (dengan bonus race),
+# EXP cap dan stage berikutnya, jadi lookup cukup O(1) tanpa list.index
+# ===============================
+
+# ===============================
+# Race System - BARU
+# ===============================
+RACES = {
+    "human": {
+        "name": "Human",
+        "emoji": "👨",
+        "bonuses": {"exp": 0.10, "qi": 0.15, "technique": 0.20},
+        "description": "Versatile cultivators with balanced growth and technique mastery"
+    },
+    "demon": {
+        "name": "Demon",
+        "emoji": "😈", 
+        "bonuses": {"power": 0.25, "attack": 0.20, "defense": -0.10},
+        "description": "Powerful but reckless cultivators with immense combat prowess"
+    },
+    "half_demon": {
+        "name": "Half-Demon",
+        "emoji": "😠",
+        "bonuses": {"power": 0.15, "exp": 0.10, "qi": 0.05},
+        "description": "Balanced hybrid with both human versatility and demonic power"
+    },
+    "beast": {
+        "name": "Beast Race",
+        "emoji": "🐺",
+        "bonuses": {"defense": 0.20, "health": 0.25, "speed": 0.15},
+        "description": "Natural survivors with enhanced physical attributes and instincts"
+    },
+    "celestial": {
+        "name": "Celestial",
+        "emoji": "👼",
+        "bonuses": {"qi": 0.30, "healing": 0.25, "exp": 0.10},
+        "description": "Divine beings with exceptional Qi control and healing abilities",
+        "hidden": True
+    }
+}
+# ===============================
+# Realms, Stages, dan EXP Cap - SISTEM YANG LEBIH CHALLENGING
+# ===============================
+REALMS = {
+    "Mortal Realm": {
+        "stages": [
+            "Body Refining [Entry]", "Body Refining [Middle]", "Body Refining [Peak]",
+            "Qi Gathering [Entry]", "Qi Gathering [Middle]", "Qi Gathering [Peak]", 
+            "Inner Pill [Entry]", "Inner Pill [Middle]", "Inner Pill [Peak]",
+            "Yuan Sea [Entry]", "Yuan Sea [Middle]", "Yuan Sea [Peak]",
+            "Becoming God [Entry]", "Becoming God [Middle]", "Becoming God [Peak]",
+            "Divine Bridge [Entry]", "Divine Bridge [Middle]", "Divine Bridge [Peak]",
+            "Nirvana [Entry]", "Nirvana [Middle]", "Nirvana [Peak]",
+            "Destiny [Entry]", "Destiny [Middle]", "Destiny [Peak]",
+            "Life and Death [Entry]", "Life and Death [Middle]", "Life and Death [Peak]",
+            "Ascended [Entry]", "Ascended [Middle]", "Ascended [Peak]"
+        ],
+        "exp_multiplier": 1.0,
+        "power_multiplier": 1.0,
+        "spirit_stone_gain": 1,
+        "color": 0x964B00,
+        "discovery_chance": 0.3
+    },
+    "Immortal Realm": {
+        "stages": [
+            "Half-Immortal [Entry]", "Half-Immortal [Middle]", "Half-Immortal [Peak]",
+            "True Immortal [Entry]", "True Immortal [Middle]", "True Immortal [Peak]",
+            "Profound Immortal [Entry]", "Profound Immortal [Middle]", "Profound Immortal [Peak]",
+            "Golden Immortal [Entry]", "Golden Immortal [Middle]", "Golden Immortal [Peak]",
+            "Mystic Immortal [Entry]", "Mystic Immortal [Middle]", "Mystic Immortal [Peak]",
+            "Supreme Immortal [Entry]", "Supreme Immortal [Middle]", "Supreme Immortal [Peak]",
+            "Immortal Lord [Entry]", "Immortal Lord [Middle]", "Immortal Lord [Peak]",
+            "Immortal Saint [Entry]", "Immortal Saint [Middle]", "Immortal Saint [Peak]",
+            "Immortal Ancestor [Entry]", "Immortal Ancestor [Middle]", "Immortal Ancestor [Peak]",
+            "Immortal Venerable [Entry]", "Immortal Venerable [Middle]", "Immortal Venerable [Peak]",
+            "Immortal King [Entry]", "Immortal King [Middle]", "Immortal King [Peak]",
+            "Immortal Emperor [Entry]", "Immortal Emperor [Middle]", "Immortal Emperor [Peak]"
+        ],
+        "exp_multiplier": 50000.0,
+        "power_multiplier": 25.0,
+        "spirit_stone_gain": 50,
+        "color": 0x00FF00,
+        "discovery_chance": 0.5
+    },
+    "God Realm": {
+        "stages": [
+            "Lesser God [Entry]", "Lesser God [Middle]", "Lesser God [Peak]",
+            "True God [Entry]", "True God [Middle]", "True God [Peak]",
+            "Elder God [Entry]", "Elder God [Middle]", "Elder God [Peak]",
+            "High God [Entry]", "High God [Middle]", "High God [Peak]",
+            "Ancient God [Entry]", "Ancient God [Middle]", "Ancient God [Peak]",
+            "Primordial God [Entry]", "Primordial God [Middle]", "Primordial God [Peak]",
+            "Supreme God [Entry]", "Supreme God [Middle]", "Supreme God [Peak]",
+            "Divine Lord [Entry]", "Divine Lord [Middle]", "Divine Lord [Peak]",
+            "Divine Saint [Entry]", "Divine Saint [Middle]", "Divine Saint [Peak]",
+            "Divine Ancestor [Entry]", "Divine Ancestor [Middle]", "Divine Ancestor [Peak]",
+            "God Sovereign [Entry]", "God Sovereign [Middle]", "God Sovereign [Peak]",
+            "God Emperor [Entry]", "God Emperor [Middle]", "God Emperor [Peak]", 
+            "God King [Entry]", "God King [Middle]", "God King [Peak]",
+            "Celestial Overlord [Entry]", "Celestial Overlord [Middle]", "Celestial Overlord [Peak]",
+            "Universe Creator [Entry]", "Universe Creator [Middle]", "Universe Creator [Peak]"
+        ],
+        "exp_multiplier": 500000.0,
+        "power_multiplier": 100.0,
+        "spirit_stone_gain": 250,
+        "color": 0xFFD700,
+        "discovery_chance": 0.7
+    }
+}
+
+REALM_ORDER = list(REALMS.keys())
+DEFAULT_EXP_CAP = 1000
+
+StageInfo = namedtuple(
+    "StageInfo",
+    ["realm", "stage", "realm_index", "stage_index", "ordinal", "level", "race_levels", "exp_cap", "next_realm", "next_stage"]
+)
+
+
+def _exp_cap(realm_idx, stage_idx, exp_multiplier):
+    # Half-Immortal (Immortal Realm, Stage 0) should be around 500M
+    # Stage 0, Realm 1: 1000 * (1.5^1) * (10^realm_idx) * multiplier
+    # With multiplier 50000: 1000 * 1.5 * 10 * 50000 = 750,000,000 (750M) - Correct range
+    req = int(DEFAULT_EXP_CAP * (1.5 ** (stage_idx + 1)) * (10 ** (realm_idx if realm_idx < 1 else realm_idx + 1)) * exp_multiplier)
+    return max(req, DEFAULT_EXP_CAP)
+
+
+def _build_table():
+    """{(realm, stage): StageInfo} untuk semua stage, urut dari stage pertama"""
+    stages = [(realm, stage) for realm in REALM_ORDER for stage in REALMS[realm]["stages"]]
+    table = {}
+    for ordinal, (realm, stage) in enumerate(stages):
+        realm_idx = REALM_ORDER.index(realm)
+        stage_idx = REALMS[realm]["stages"].index(stage)
+        level = (realm_idx * 100) + (stage_idx * 3) + 1
+        race_levels = MappingProxyType({
+            race: int(level * (1 + race_data["bonuses"]["exp"])) if "exp" in race_data["bonuses"] else level
+            for race, race_data in RACES.items()
+        })
+        next_realm, next_stage = stages[ordinal + 1] if ordinal + 1 < len(stages) else (None, None)
+        table[(realm, stage)] = StageInfo(
+            realm, stage, realm_idx, stage_idx, ordinal, level, race_levels,
+            _exp_cap(realm_idx, stage_idx, REALMS[realm].get("exp_multiplier", 1.0)),
+            next_realm, next_stage
+        )
+    return MappingProxyType(table)
+
+
+PROGRESSION = _build_table()
+
+
+def stage_info(realm, stage):
+    """StageInfo untuk (realm, stage), None jika tidak dikenal"""
+    return PROGRESSION.get((realm, stage))
+
+
+def get_player_level(p):
+    """Hitung level player berdasarkan realm dan stage dengan race bonus"""
+    info = PROGRESSION[(p["realm"], p["stage"])]
+    return info.race_levels.get(p.get("race", "human"), info.race_levels["human"])
+
+
+def get_exp_cap(p):
+    """Calculate the EXP cap for the current realm and stage"""
+    realm_name = p.get("realm", "Mortal Realm")
+    info = PROGRESSION.get((realm_name, p.get("stage")))
+    if info is None:
+        # Stage tidak dikenal dihitung sebagai stage pertama realm-nya
+        realm_data = REALMS.get(realm_name)
+        if not realm_data:
+            return DEFAULT_EXP_CAP
+        info = PROGRESSION[(realm_name, realm_data["stages"][0])]
+    return info.exp_cap
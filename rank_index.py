@@ -0,0 +1,174 @@
+import bisect
+
+# ===============================
+# Rank index - daftar terurut yang di-update per player, jadi leaderboard
+# tidak perlu sort semua player setiap command
+# ===============================
+
+
+class RankIndex:
+    """Sorted list bertingkat (bucket) untuk ranking player
+
+    Entry = key(player) + (uid,), urut ascending, jadi key harus dibalik untuk
+    ranking descending (misal (-total_power,)); key None = player tidak
+    dimasukkan ke index (view terfilter). Ukuran bucket disimpan di
+    Fenwick tree sehingga posisi/rank dan akses entry ke-i cukup O(log n);
+    insert/hapus hanya menggeser satu bucket kecil.
+    """
+
+    BUCKET_SIZE = 512
+
+    def __init__(self, key):
+        self.key = key
+        self.entries = {}
+        self._buckets = []
+        self._maxes = []
+        self._tree = []
+
+    def __len__(self):
+        return len(self.entries)
+
+    def _entry(self, player_id, player):
+        if not isinstance(player, dict):
+            return None
+        key = self.key(player)
+        if key is None:
+            return None  # Player tidak masuk view ini (misal belum cukup match)
+        return key + (player_id,)
+
+    # ---------- Fenwick tree atas ukuran bucket ----------
+
+    def _build_tree(self):
+        tree = [0] * (len(self._buckets) + 1)
+        for i, bucket in enumerate(self._buckets, start=1):
+            tree[i] += len(bucket)
+            parent = i + (i & -i)
+            if parent < len(tree):
+                tree[parent] += tree[i]
+        self._tree = tree
+
+    def _tree_add(self, i, delta):
+        i += 1
+        while i < len(self._tree):
+            self._tree[i] += delta
+            i += i & -i
+
+    def _prefix(self, i):
+        """Jumlah entry di bucket [0, i)"""
+        total = 0
+        while i > 0:
+            total += self._tree[i]
+            i -= i & -i
+        return total
+
+    def _locate(self, index):
+        """Entry ke-index (0-based) -> (bucket, posisi dalam bucket)"""
+        pos = 0
+        step = 1 << (len(self._tree).bit_length() - 1)
+        while step:
+            nxt = pos + step
+            if nxt < len(self._tree) and self._tree[nxt] <= index:
+                index -= self._tree[nxt]
+                pos = nxt
+            step >>= 1
+        return pos, index
+
+    # ---------- mutasi ----------
+
+    def rebuild(self, players):
+        """Bangun ulang dari seluruh data players (startup / setelah save_data penuh)"""
+        self.entries = {}
+        for player_id, player in players.items():
+            entry = self._entry(player_id, player)
+            if entry is not None:
+                self.entries[player_id] = entry
+        ordered = sorted(self.entries.values())
+        self._buckets = [ordered[i:i + self.BUCKET_SIZE] for i in range(0, len(ordered), self.BUCKET_SIZE)]
+        self._maxes = [bucket[-1] for bucket in self._buckets]
+        self._build_tree()
+
+    def reconcile(self, players):
+        """Samakan index dengan data players, hanya entry yang berubah yang dipindah (O(n) tanpa sort)"""
+        for player_id in [uid for uid in self.entries if uid not in players]:
+            self.update(player_id, None)
+        for player_id, player in players.items():
+            self.update(player_id, player)
+
+    def update(self, player_id, player):
+        """Pindahkan satu player ke posisi barunya (player None = hapus dari index)"""
+        entry = self._entry(player_id, player)
+        old = self.entries.get(player_id)
+        if old == entry:
+            return
+        if old is not None:
+            self._delete(old)
+            del self.entries[player_id]
+        if entry is not None:
+            self._insert(entry)
+            self.entries[player_id] = entry
+
+    def _insert(self, entry):
+        if not self._buckets:
+            self._buckets.append([entry])
+            self._maxes.append(entry)
+            self._build_tree()
+            return
+
+        i = min(bisect.bisect_left(self._maxes, entry), len(self._buckets) - 1)
+        bucket = self._buckets[i]
+        bisect.insort(bucket, entry)
+        self._maxes[i] = bucket[-1]
+
+        if len(bucket) > 2 * self.BUCKET_SIZE:
+            half = len(bucket) // 2
+            self._buckets[i:i + 1] = [bucket[:half], bucket[half:]]
+            self._maxes[i:i + 1] = [bucket[half - 1], bucket[-1]]
+            self._build_tree()
+        else:
+            self._tree_add(i, 1)
+
+    def _delete(self, entry):
+        i = bisect.bisect_left(self._maxes, entry)
+        bucket = self._buckets[i]
+        del bucket[bisect.bisect_left(bucket, entry)]
+
+        if not bucket:
+            del self._buckets[i]
+            del self._maxes[i]
+            self._build_tree()
+        else:
+            self._maxes[i] = bucket[-1]
+            self._tree_add(i, -1)
+
+    # ---------- query ----------
+
+    def rank(self, player_id):
+        """Ranking player (1 = teratas), None jika tidak ada di index"""
+        entry = self.entries.get(player_id)
+        if entry is None:
+            return None
+        i = bisect.bisect_left(self._maxes, entry)
+        return self._prefix(i) + bisect.bisect_left(self._buckets[i], entry) + 1
+
+    def page(self, offset=0, limit=None):
+        """List uid pada posisi [offset, offset + limit)"""
+        if offset >= len(self.entries):
+            return []
+        end = len(self.entries) if limit is None else min(len(self.entries), offset + limit)
+        i, j = self._locate(offset)
+
+        result = []
+        remaining = end - offset
+        while remaining > 0:
+            chunk = self._buckets[i][j:j + remaining]
+            result.extend(entry[-1] for entry in chunk)
+            remaining -= len(chunk)
+            i, j = i + 1, 0
+        return result
+
+    def at(self, rank):
+        """uid di ranking tertentu (1 = teratas), None jika di luar jangkauan"""
+        if rank < 1 or rank > len(self.entries):
+            return None
+        i, j = self._locate(rank - 1)
+        return self._buckets[i][j][-1]
@@ -0,0 +1,131 @@
+import datetime
+
+# ===============================
+# Schema migration - data disimpan dengan "schema_version",
+# migrasi dijalankan sekali saat load lalu versinya dinaikkan
+# ===============================
+SCHEMA_VERSION_KEY = "schema_version"
+
+# Daftar migrasi terurut: (versi, deskripsi, fungsi upgrade)
+MIGRATIONS = []
+
+
+def migration(version, description):
+    """Decorator untuk mendaftarkan fungsi upgrade ke versi tertentu"""
+    def register(func):
+        MIGRATIONS.append((version, description, func))
+        MIGRATIONS.sort(key=lambda m: m[0])
+        return func
+    return register
+
+
+def latest_version():
+    return MIGRATIONS[-1][0] if MIGRATIONS else 0
+
+
+def migrate_data(data):
+    """Jalankan migrasi yang belum diterapkan, return True jika data berubah"""
+    current = data.get(SCHEMA_VERSION_KEY, 0)
+    applied = False
+
+    for version, description, func in MIGRATIONS:
+        if version <= current:
+            continue
+        func(data)
+        data[SCHEMA_VERSION_KEY] = version
+        applied = True
+        print(f"🔧 Schema migrated to v{version}: {description}")
+
+    return applied
+
+
+@migration(1, "default server fields + field player dari load_data")
+def add_server_and_player_fields(data):
+    default_fields = {
+        "guilds": {},
+        "market_items": [],
+        "server_events": {},
+        "server_stats": {
+            "total_pvp_battles": 0,
+            "total_breakthroughs": 0,
+            "total_dungeons": 0,
+            "total_techniques_learned": 0,
+            "total_spirit_beasts": 0,
+            "total_pills_crafted": 0,
+            "total_world_boss_kills": 0,
+            "last_update": datetime.datetime.now().isoformat()
+        },
+        "daily_quests_reset": datetime.datetime.now().isoformat(),
+        "world_bosses": {}
+    }
+
+    for field, default_value in default_fields.items():
+        if field not in data:
+            data[field] = default_value
+
+    for player_data in data["players"].values():
+        new_fields = {
+            "breakthroughs": 0,
+            "daily_quests": {},
+            "last_daily_claim": "0",
+            "discovered_techniques": [],
+            "guild_contributions": 0,
+            "login_streak": 0,
+            "last_login": "0",
+            "world_boss_kills": {},
+            "last_world_boss": "0"
+        }
+
+        for field, default_value in new_fields.items():
+            if field not in player_data:
+                player_data[field] = default_value
+
+
+@migration(2, "field player dari get_player + faction legacy")
+def add_profile_fields(data):
+    now = datetime.datetime.now().isoformat()
+
+    for player_data in data["players"].values():
+        # Jika ada power lama, convert ke base_power
+        if "power" in player_data and "base_power" not in player_data:
+            player_data["base_power"] = player_data["power"]
+            player_data["total_power"] = player_data["power"]
+
+        new_fields = {
+            "spirit_stones": 50,
+            "techniques": [],
+            "current_technique": None,
+            "sect": None,
+            "guild": None,
+            "guild_role": None,
+            "base_power": 10,
+            "total_power": 10,
+            "last_technique_find": "0",
+            "last_daily_quest": "0",
+            "techniques_learned": 0,
+            "daily_streak": 0,
+            "spirit_beasts": [],
+            "current_beast": None,
+            "inventory": {
+                "spirit_herb": 0, "spirit_water": 0, "spirit_crystal": 0,
+                "dragon_scale": 0, "phoenix_feather": 0, "dragon_heart": 0
+            },
+            "pills_crafted": 0,
+            "achievements": [],
+            "race": "human",
+            "gender": "other",
+            "display_name": "",
+            "created_at": now,
+            "last_updated": now
+        }
+
+        for field, default_value in new_fields.items():
+            if field not in player_data:
+                player_data[field] = default_value
+
+        # Auto-assign faction for legacy players (Human/Demon)
+        if "faction" not in player_data:
+            if player_data["race"] == "human":
+                player_data["faction"] = "Orthodox Alliance"
+            elif player_data["race"] == "demon":
+                player_data["faction"] = "Demonic Cult"
@@ -0,0 +1,122 @@
+import asyncio
+import atexit
+import json
+import os
+import time
+from player_store import _write_atomic, encode_compact
+
+# ===============================
+# Session state - registry sesi aktif (cultivation, battle, explore,
+# treasure hunt, formation) disimpan ke file agar bisa dilanjutkan
+# setelah restart / redeploy. Object discord.Message disimpan sebagai
+# channel_id + message_id dan di-fetch ulang saat on_ready.
+# ===============================
+SESSION_STATE_FILE = os.environ.get("SESSION_STATE_FILE", "session_state.json")
+SESSION_SAVE_INTERVAL = float(os.environ.get("SESSION_SAVE_INTERVAL", "10"))
+MESSAGE_KEY = "message"
+
+
+def message_ref(message):
+    """discord.Message -> {"channel_id", "message_id"} (None jika tidak ada message)"""
+    if message is None:
+        return None
+    try:
+        return {"channel_id": message.channel.id, "message_id": message.id}
+    except AttributeError:
+        return None
+
+
+class SessionState:
+    def __init__(self, path=SESSION_STATE_FILE):
+        self.path = path
+        self.registries = {}  # nama -> (dict registry, tipe key)
+        self._last_written = None
+        self._save_task = None
+
+    def track(self, name, registry, key_type=str):
+        """Daftarkan registry yang disimpan; key_type mengembalikan key JSON (selalu str) ke tipe aslinya"""
+        self.registries[name] = (registry, key_type)
+
+    # ---------- serialisasi ----------
+
+    def snapshot(self):
+        """Salinan semua registry yang bisa di-JSON-kan, message diganti referensi ID"""
+        sessions = {}
+        for name, (registry, _) in self.registries.items():
+            entries = {}
+            for key, entry in list(registry.items()):
+                entry = dict(entry)
+                if MESSAGE_KEY in entry:
+                    entry[MESSAGE_KEY] = message_ref(entry[MESSAGE_KEY])
+                entries[str(key)] = entry
+            sessions[name] = entries
+        return {"saved_at": time.time(), "sessions": sessions}
+
+    def _encode(self):
+        """Teks file atau None jika semua registry kosong dan file sudah kosong juga
+
+        Selama ada sesi aktif file selalu ditulis ulang, karena saved_at dipakai
+        sebagai waktu terakhir bot hidup untuk menghitung progress saat restore.
+        """
+        state = self.snapshot()
+        sessions = encode_compact(state["sessions"])
+        if sessions == self._last_written and not any(state["sessions"].values()):
+            return None
+        self._last_written = sessions
+        return encode_compact(state)
+
+    # ---------- persistensi ----------
+
+    def load(self):
+        """(saved_at, {nama: {key: entry}}) dari file, key sudah dikembalikan ke tipe aslinya"""
+        if not os.path.exists(self.path):
+            return None, {}
+        try:
+            with open(self.path, "r") as f:
+                state = json.load(f)
+        except Exception as e:
+            print(f"❌ Error loading session state: {e}")
+            return None, {}
+
+        sessions = {}
+        for name, entries in state.get("sessions", {}).items():
+            if name not in self.registries:
+                continue
+            key_type = self.registries[name][1]
+            sessions[name] = {key_type(key): entry for key, entry in entries.items()}
+        return state.get("saved_at"), sessions
+
+    def save(self):
+        """Simpan registry ke disk (blocking, dipakai saat exit)"""
+        if not self.registries:
+            return
+        try:
+            text = self._encode()
+            if text is not None:
+                _write_atomic(self.path, text)
+        except Exception as e:
+            self._last_written = None
+            print(f"❌ Error saving session state: {e}")
+
+    async def save_loop(self):
+        """Background task: simpan registry secara berkala (tulis file di thread terpisah)"""
+        while True:
+            await asyncio.sleep(SESSION_SAVE_INTERVAL)
+            try:
+                # Snapshot di thread event loop (registry tidak berubah di tengah encode)
+                text = self._encode()
+                if text is not None:
+                    await asyncio.to_thread(_write_atomic, self.path, text)
+            except Exception as e:
+                self._last_written = None
+                print(f"❌ Error saving session state: {e}")
+
+    def start(self):
+        """Jalankan save_loop sekali saja (on_ready bisa terpanggil lagi saat reconnect)"""
+        if self._save_task is None or self._save_task.done():
+            self._save_task = asyncio.create_task(self.save_loop())
+        return self._save_task
+
+
+SESSION_STATE = SessionState()
+atexit.register(SESSION_STATE.save)
@@ -0,0 +1,103 @@
+"""Cek deterministik battle_engine terhadap logika battle_round / finish_battle lama
+
+Jalankan dari root repo:
+    python tests/test_battle_engine.py
+(atau `python -m pytest` dari root repo)
+"""
+import json
+import os
+import random
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from battle_engine import FLAVOR_TECHNIQUES, Combatant, Replay, attacker_wins, replay_log, simulate, snapshot
+
+TIGER = {"name": "White Divine Tiger", "bonus": {"attack": 0.50, "critical": 0.30, "speed": 0.40}}
+# Regen + crit sekaligus: battle_round lama selalu roll crit untuk beast aktif,
+# engine hanya jika critical > 0, jadi beast tanpa crit memakai stream RNG berbeda
+MENDER = {"name": "Jade Mender", "bonus": {"regeneration": 0.10, "critical": 0.20}}
+
+
+def player(power, beast=None):
+    if beast is None:
+        return {"total_power": power}
+    return {"total_power": power, "current_beast": beast["name"], "spirit_beasts": [beast]}
+
+
+def legacy_battle(attacker, defender, rng):
+    """battle_task + battle_round + penentuan pemenang finish_battle sebelum battle_engine"""
+    battle = {"attacker_hp": 100, "defender_hp": 100, "round": 0}
+    rounds = []
+    while battle["attacker_hp"] > 0 and battle["defender_hp"] > 0 and battle["round"] < 10:
+        battle["round"] += 1
+        power_ratio = attacker["total_power"] / max(1, defender["total_power"])
+        def_ratio = defender["total_power"] / max(1, attacker["total_power"])
+        att_dmg = max(5, min(40, int(15 * (power_ratio ** 0.5) * rng.uniform(0.8, 1.2))))
+        def_dmg = max(5, min(40, int(15 * (def_ratio ** 0.5) * rng.uniform(0.8, 1.2))))
+
+        regen = {}
+        for side, data in (("attacker", attacker), ("defender", defender)):
+            regen[side] = 0
+            for beast in data.get("spirit_beasts", []):
+                if beast["name"] == data.get("current_beast"):
+                    value = beast.get("bonus", {}).get("regeneration", 0)
+                    if value > 0:
+                        regen[side] = int(100 * value)
+                        battle[f"{side}_hp"] = min(100, battle[f"{side}_hp"] + regen[side])
+
+        crit = {}
+        for side, data in (("attacker", attacker), ("defender", defender)):
+            crit[side] = False
+            for beast in data.get("spirit_beasts", []):
+                if beast["name"] == data.get("current_beast"):
+                    if rng.random() < beast.get("bonus", {}).get("critical", 0):
+                        crit[side] = True
+        if crit["attacker"]:
+            att_dmg *= 2
+        if crit["defender"]:
+            def_dmg *= 2
+
+        battle["defender_hp"] = max(0, battle["defender_hp"] - att_dmg)
+        battle["attacker_hp"] = max(0, battle["attacker_hp"] - def_dmg)
+        techniques = (rng.choice(FLAVOR_TECHNIQUES), rng.choice(FLAVOR_TECHNIQUES))
+        rounds.append((
+            att_dmg, def_dmg, crit["attacker"], crit["defender"], regen["attacker"], regen["defender"],
+            battle["attacker_hp"], battle["defender_hp"], *techniques
+        ))
+
+    attacker_won = not (battle["attacker_hp"] <= 0 or battle["defender_hp"] > battle["attacker_hp"])
+    return rounds, attacker_won
+
+
+PAIRS = [
+    (player(12000), player(12500)),
+    (player(12000, TIGER), player(15000)),
+    (player(30000, TIGER), player(9000, MENDER)),
+    (player(500), player(80000, MENDER)),
+]
+
+
+def test_simulate_matches_legacy_battle():
+    for attacker, defender in PAIRS:
+        for seed in range(200):
+            expected_rounds, expected_win = legacy_battle(attacker, defender, random.Random(seed))
+            logs = simulate(snapshot("a", attacker), snapshot("d", defender), seed)
+            assert [tuple(log[1:]) for log in logs] == expected_rounds, (attacker, defender, seed)
+            assert [log.round for log in logs] == list(range(1, len(logs) + 1))
+            assert attacker_wins(logs[-1].attacker_hp, logs[-1].defender_hp) == expected_win
+
+
+def test_replay_round_trip():
+    for attacker, defender in PAIRS:
+        replay = Replay(1234, snapshot("a", attacker), snapshot("d", defender))
+        assert replay_log(replay) == simulate(replay.attacker, replay.defender, replay.seed)
+        # Snapshot lewat JSON (session state) tetap menghasilkan log yang sama
+        restored = Replay(replay.seed, *(Combatant(*json.loads(json.dumps(c))) for c in replay[1:]))
+        assert replay_log(restored) == replay_log(replay)
+
+
+if __name__ == "__main__":
+    test_simulate_matches_legacy_battle()
+    test_replay_round_trip()
+    print("✅ battle_engine cocok dengan battle lama")
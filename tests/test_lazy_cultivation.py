@@ -0,0 +1,52 @@
+"""Cek lazy cultivation: rate baru setelah breakthrough / reroll hanya berlaku untuk tick berikutnya
+
+Jalankan dari root repo:
+    python tests/test_lazy_cultivation.py
+(atau `python -m pytest` dari root repo)
+"""
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from lazy_cultivation import LAZY_CULTIVATION_KEY, new_state, rerate, settle
+
+RATES = {"exp": 5, "qi": [10, 50], "qi_bonus": 0, "power": [5, 15], "spirit_stones": [10, 10]}
+FASTER = dict(RATES, exp=20)
+
+
+def player(rates, start=0):
+    return {
+        "exp": 0, "qi": 0, "base_power": 0, "spirit_stones": 0,
+        "daily_quests": {"cultivate_5": {"progress": 0, "completed": False}},
+        LAZY_CULTIVATION_KEY: new_state(rates, now=start)
+    }
+
+
+def test_rerate_settles_old_ticks_first():
+    p = player(RATES)
+    settle(p, 10 ** 6, now=10)
+    assert p["exp"] == 50
+
+    # Rate berubah di t=30: tick 10..30 masih rate lama, setelahnya rate baru
+    assert rerate(p, FASTER, 10 ** 6, now=30) == 20
+    assert p["exp"] == 150
+    assert p[LAZY_CULTIVATION_KEY]["rates"] == FASTER
+
+    settle(p, 10 ** 6, now=40)
+    assert p["exp"] == 150 + 10 * 20
+    assert p[LAZY_CULTIVATION_KEY]["ticks"] == 40
+
+
+def test_rerate_respects_exp_cap():
+    p = player(RATES)
+    rerate(p, FASTER, 100, now=30)
+    assert p["exp"] == 100
+    settle(p, 100, now=60)
+    assert p["exp"] == 100
+
+
+if __name__ == "__main__":
+    test_rerate_settles_old_ticks_first()
+    test_rerate_respects_exp_cap()
+    print("✅ lazy cultivation rerate OK")
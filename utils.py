@@ -2,66 +2,56 @@ import json
 import os
 import time
 import datetime
-import shutil
+from player_store import PLAYER_STORE
+from backup_engine import BACKUP_ENGINE, BACKUP_DIR, BACKUP_SUFFIXES, read_backup
+from power_stats import POWER_STATS
+from schema import SCHEMA_VERSION_KEY, latest_version, migrate_data
+from progression import REALM_ORDER, PROGRESSION, get_exp_cap as progression_exp_cap, get_player_level as progression_level
 
 # Data penyimpanan dengan backup system
 DATA_FILE = "data.json"
-BACKUP_DIR = "backups"
 
 def load_data():
-    """Load data dengan error handling"""
+    """Ambil data dari PLAYER_STORE (data.json hanya dibaca sekali saat startup)"""
+    return PLAYER_STORE.get()
+
+def save_data(data):
+    """Tandai data sebagai dirty, PLAYER_STORE yang menulis ke disk secara berkala"""
     try:
-        if not os.path.exists(DATA_FILE):
-            return create_default_data()
+        PLAYER_STORE.put(data)
+        return True
+    except Exception as e:
+        print(f"❌ Error saving data: {e}")
+        return False
 
-        with open(DATA_FILE, "r") as f:
-            data = json.load(f)
+def save_player(player_id):
+    """Tandai satu player dirty, hanya data player ini yang ditulis ulang"""
+    PLAYER_STORE.mark_player(player_id)
+    return True
 
-        # Validasi struktur data
-        if "players" not in data:
-            return create_default_data()
-
-        # Update dengan field baru jika missing
-        default_fields = {
-            "guilds": {},
-            "market_items": [],
-            "server_events": {},
-            "server_stats": {
-                "total_pvp_battles": 0,
-                "total_breakthroughs": 0,
-                "total_dungeons": 0,
-                "total_techniques_learned": 0,
-                "total_spirit_beasts": 0,
-                "total_pills_crafted": 0,
-                "total_world_boss_kills": 0,
-                "last_update": datetime.datetime.now().isoformat()
-            },
-            "daily_quests_reset": datetime.datetime.now().isoformat(),
-            "world_bosses": {}
-        }
+def save_section(section):
+    """Tandai satu section (guilds, server_stats, world_bosses, ...) dirty"""
+    PLAYER_STORE.mark_section(section)
+    return True
 
-        for field, default_value in default_fields.items():
-            if field not in data:
-                data[field] = default_value
+def bump_server_stat(stat, amount=1):
+    """Tambah counter di server_stats tanpa menandai seluruh data dirty"""
+    data = load_data()
+    data["server_stats"][stat] = data["server_stats"].get(stat, 0) + amount
+    return save_section("server_stats")
 
-        # Update player data dengan field baru
-        for player_id, player_data in data["players"].items():
-            new_fields = {
-                "breakthroughs": player_data.get("breakthroughs", 0),
-                "daily_quests": player_data.get("daily_quests", {}),
-                "last_daily_claim": player_data.get("last_daily_claim", "0"),
-                "discovered_techniques": player_data.get("discovered_techniques", []),
-                "guild_contributions": player_data.get("guild_contributions", 0),
-                "login_streak": player_data.get("login_streak", 0),
-                "last_login": player_data.get("last_login", "0"),
-                "world_boss_kills": player_data.get("world_boss_kills", {}),
-                "last_world_boss": player_data.get("last_world_boss", "0")
-            }
+def read_data_file():
+    """Baca data dari disk (data.json atau layout sharded) dengan error handling"""
+    try:
+        data = PLAYER_STORE.backend.read()
 
-            for field, default_value in new_fields.items():
-                if field not in player_data:
-                    player_data[field] = default_value
+        # Validasi struktur data
+        if data is None or "players" not in data:
+            return create_default_data()
 
+        # Migrasi schema sekali saat load, hasilnya langsung disimpan
+        if migrate_data(data):
+            save_data(data)
         return data
 
     except json.JSONDecodeError:
@@ -75,7 +65,6 @@ def create_default_data():
     """Buat data default jika file tidak ada"""
     default_data = {
         "players": {},
-        "last_backup": 0,
         "total_players": 0,
         "server_stats": {
             "total_pvp_battles": 0,
@@ -91,87 +80,79 @@ def create_default_data():
         "market_items": [],
         "server_events": {},
         "daily_quests_reset": datetime.datetime.now().isoformat(),
-        "world_bosses": {}
+        "world_bosses": {},
+        SCHEMA_VERSION_KEY: latest_version()
     }
 
     # Simpan data default
     save_data(default_data)
     return default_data
 
-def save_data(data):
-    """Save data dengan backup otomatis setiap 5 menit"""
-    try:
-        # Backup data lama sebelum menimpa jika sudah 5 menit sejak backup terakhir
-        current_time = int(time.time())
-        last_backup = data.get("last_backup", 0)
-        
-        # Ensure last_backup is an integer
-        if not isinstance(last_backup, (int, float)):
-            last_backup = 0
-
-        if os.path.exists(DATA_FILE) and (current_time - last_backup >= 300):
-            # Read current file before backing it up to ensure we don't backup corrupted data
-            backup_data()
-            data["last_backup"] = current_time
-
-        # Update timestamp
+def before_flush(data):
+    """Dipanggil PLAYER_STORE sebelum snapshot (di thread event loop)"""
+    # Sketch distribusi power ikut disimpan bersama server_stats
+    changed = POWER_STATS.save_to(data["server_stats"])
+    # Flush yang hanya berisi player tidak menulis ulang server_stats
+    if changed or PLAYER_STORE.section_dirty("server_stats"):
         data["server_stats"]["last_update"] = datetime.datetime.now().isoformat()
-
-        with open(DATA_FILE, "w") as f:
-            json.dump(data, f, indent=4, ensure_ascii=False)
-
-        # print("💾 Data saved successfully!") # Removed to reduce console noise
-        return True
-
-    except Exception as e:
-        print(f"❌ Error saving data: {e}")
+        PLAYER_STORE.mark_section("server_stats")
+
+def after_write(plan):
+    """Dipanggil writer thread setelah tiap write: base / incremental backup"""
+    # Backend journal sudah menyimpan riwayat per mutasi (snapshot + journal)
+    if PLAYER_STORE.backend.keeps_history:
+        return
+    BACKUP_ENGINE.record(plan, PLAYER_STORE.backend.read)
+
+def list_backups():
+    """Nama file backup lama (backup_<ts>.json[.gz|.zst]), urut dari yang terlama"""
+    if not os.path.exists(BACKUP_DIR):
+        return []
+    backups = []
+    for filename in os.listdir(BACKUP_DIR):
+        if filename.startswith("backup_") and filename.endswith(tuple(BACKUP_SUFFIXES.values())):
+            timestamp = filename[len("backup_"):].split(".")[0]
+            if timestamp.isdigit():
+                backups.append((int(timestamp), filename))
+    return [filename for _, filename in sorted(backups)]
+
+async def backup_data():
+    """Buat base backup sekarang (ditulis writer thread, event loop tidak diblok)"""
+    # Backend journal sudah menyimpan riwayat per mutasi (snapshot + journal)
+    if PLAYER_STORE.backend.keeps_history:
         return False
 
-def backup_data():
-    """Buat backup data"""
-    try:
-        if not os.path.exists(BACKUP_DIR):
-            os.makedirs(BACKUP_DIR)
-
-        if os.path.exists(DATA_FILE):
-            timestamp = int(time.time())
-            backup_path = os.path.join(BACKUP_DIR, f"backup_{timestamp}.json")
-            shutil.copy2(DATA_FILE, backup_path)
-
-            # Hapus backup lama (simpan hanya 5 terbaru)
-            backups = []
-            if os.path.exists(BACKUP_DIR):
-                backups = sorted([f for f in os.listdir(BACKUP_DIR) if f.startswith("backup_") and f.endswith(".json")])
-
-            if len(backups) > 5:
-                for old_backup in backups[:-5]:
-                    os.remove(os.path.join(BACKUP_DIR, old_backup))
-
-            print(f"📦 Backup created: backup_{timestamp}.json")
-            return True
-
-    except Exception as e:
-        print(f"❌ Error creating backup: {e}")
+    BACKUP_ENGINE.request_base()
+    await PLAYER_STORE.persist()
+    if BACKUP_ENGINE.needs_base or BACKUP_ENGINE.last_error:
+        print(f"❌ Error creating backup: {BACKUP_ENGINE.last_error}")
         return False
+    return True
 
-def restore_from_backup():
-    """Restore data dari backup terbaru"""
-    try:
-        if not os.path.exists(BACKUP_DIR):
-            print("⚠️ No backup directory found")
-            return create_default_data()
-
-        backups = [f for f in os.listdir(BACKUP_DIR) if f.startswith("backup_") and f.endswith(".json")]
-        if not backups:
-            print("⚠️ No backup files found")
-            return create_default_data()
-
-        backups.sort(reverse=True)
-        latest_backup = os.path.join(BACKUP_DIR, backups[0])
+PLAYER_STORE.configure(read_data_file, before_flush, after_write)
+PLAYER_STORE.add_player_listener(POWER_STATS.observe)
 
-        print(f"🔧 Restoring from backup: {latest_backup}")
-        shutil.copy2(latest_backup, DATA_FILE)
-        return load_data()
+def restore_from_backup(at=None):
+    """Restore data ke titik backup pada waktu `at` (unix ts, None = terbaru)"""
+    try:
+        data = BACKUP_ENGINE.restore(at)
+
+        # Fallback ke file backup_<ts> dari sistem backup lama
+        if data is None:
+            backups = list_backups()
+            if not backups:
+                print("⚠️ No backup files found")
+                return create_default_data()
+            latest_backup = os.path.join(BACKUP_DIR, backups[-1])
+            print(f"🔧 Restoring from backup: {latest_backup}")
+            data = read_backup(latest_backup)
+        else:
+            print(f"🔧 Restoring from backup point: {at or 'latest'}")
+
+        # Tulis ulang seluruh data (data.json atau semua shard) dari backup
+        migrate_data(data)
+        save_data(data)
+        return data
 
     except Exception as e:
         print(f"❌ Error restoring backup: {e}")
@@ -179,13 +160,14 @@ def restore_from_backup():
 
 def calculate_set_bonus(equipment_dict):
     """Calculate set bonuses from equipment"""
+    # Import sekali per panggilan, bukan di dalam loop
+    from main import EQUIPMENT_SHOP, SET_BONUSES
+
     set_counts = {}
     total_bonus = 0
 
     # Count items per set
     for item_id in equipment_dict.keys():
-        # Import equipment shop data
-        from main import EQUIPMENT_SHOP
         item_data = EQUIPMENT_SHOP.get(item_id, {})
         if "set" in item_data:
             set_name = item_data["set"]
@@ -193,8 +175,6 @@ def calculate_set_bonus(equipment_dict):
 
     # Calculate bonuses
     for set_name, count in set_counts.items():
-        # Import set bonuses
-        from main import SET_BONUSES
         if set_name in SET_BONUSES:
             if count >= 3 and "3_piece" in SET_BONUSES[set_name]:
                 total_bonus += SET_BONUSES[set_name]["3_piece"]
@@ -205,8 +185,6 @@ def calculate_set_bonus(equipment_dict):
 
 def get_realm_order_index(realm_name):
     """Get realm order for equipment access checks"""
-    # Import realm order
-    from main import REALM_ORDER
     return REALM_ORDER.index(realm_name) if realm_name in REALM_ORDER else 0
 
 def can_access_equipment(player_realm, equipment_realm):
@@ -250,8 +228,6 @@ def check_achievements(player_id, player_data):
                 if reward_type == "spirit_stones":
                     player_data["spirit_stones"] += amount
                 elif reward_type == "exp":
-                    # Import get_exp_cap function
-                    from main import get_exp_cap
                     player_data["exp"] = min(player_data["exp"] + amount, get_exp_cap(player_data))
                 elif reward_type == "qi":
                     player_data["qi"] += amount
@@ -312,7 +288,7 @@ def save_world_boss_data():
             "player_parties": PLAYER_PARTIES
         }
 
-        save_data(data)
+        save_section("world_bosses")
         print("✅ World boss data saved!")
         return True
     except Exception as e:
@@ -353,59 +329,22 @@ def load_world_boss_data():
 def update_world_boss_kill_count(boss_name):
     """Update server stats untuk world boss kills"""
     try:
-        data = load_data()
-        data["server_stats"]["total_world_boss_kills"] = data["server_stats"].get("total_world_boss_kills", 0) + 1
-        save_data(data)
-        return True
+        return bump_server_stat("total_world_boss_kills")
     except Exception as e:
         print(f"❌ Error updating world boss kill count: {e}")
         return False
 
 def get_player_level(p):
-    """Hitung level player berdasarkan realm dan stage"""
+    """Hitung level player berdasarkan realm dan stage (tabel progression)"""
     try:
-        # Import realm data
-        from main import REALMS, REALM_ORDER
-
-        realm_idx = REALM_ORDER.index(p["realm"])
-        stage_idx = REALMS[p["realm"]]["stages"].index(p["stage"])
-
-        base_level = (realm_idx * 100) + (stage_idx * 3) + 1
-
-        # Apply race bonus jika ada
-        from main import RACES
-        race_data = RACES.get(p.get("race", "human"), RACES["human"])
-        if "exp" in race_data["bonuses"]:
-            base_level = int(base_level * (1 + race_data["bonuses"]["exp"]))
-
-        return base_level
+        return progression_level(p)
     except:
         return 1
 
 def get_exp_cap(p):
-    """Dapatkan EXP cap untuk stage player saat ini"""
+    """Dapatkan EXP cap untuk stage player saat ini (tabel progression)"""
     try:
-        # Import realm data
-        from main import REALMS
-
-        realm_data = REALMS[p["realm"]]
-        stage_idx = realm_data["stages"].index(p["stage"])
-
-        # Base EXP untuk stage pertama di Mortal Realm
-        base_exp = 1000
-
-        # Exponential growth per stage: 1.5x per stage
-        stage_exp = base_exp * (1.5 ** stage_idx)
-
-        # Realm multiplier 
-        realm_multiplier = realm_data["exp_multiplier"]
-
-        # Additional difficulty scaling
-        difficulty_multiplier = 1 + (stage_idx * 0.1)
-
-        exp_cap = int(stage_exp * realm_multiplier * difficulty_multiplier)
-
-        return max(1000, exp_cap)
+        return progression_exp_cap(p)
     except:
         return 1000
 
@@ -421,9 +360,8 @@ def generate_random_technique(player_realm, player_stage):
         element = random.choice(list(ELEMENT_TYPES.keys()))
 
         # Determine power based on realm
-        from main import REALM_ORDER, REALMS
-        realm_idx = REALM_ORDER.index(player_realm)
-        stage_idx = REALMS[player_realm]["stages"].index(player_stage)
+        info = PROGRESSION[(player_realm, player_stage)]
+        realm_idx, stage_idx = info.realm_index, info.stage_index
         base_power = (realm_idx * 0.1) + (stage_idx * 0.02)
 
         # Power bonus range
@@ -3,6 +3,11 @@ import random
 import asyncio
 import time
 import math
+from player_store import player_txn
+from name_resolver import NAME_RESOLVER
+from derived_stats import DERIVED_STATS
+from engagements import ENGAGEMENTS, busy_message
+from progression import get_player_level
 
 # Data structures
 WORLD_BOSSES = {
@@ -178,19 +183,6 @@ def calculate_set_bonus(equipment):
     from main import calculate_set_bonus as main_calculate_set_bonus
     return main_calculate_set_bonus(equipment)
 
-# Realm data untuk level calculation
-REALMS = {
-    "Mortal Realm": {"stages": ["Body Refining [Entry]", "Body Refining [Middle]", "Body Refining [Peak]"]},
-    "Immortal Realm": {"stages": ["Half-Immortal [Entry]", "Half-Immortal [Middle]", "Half-Immortal [Peak]"]},
-    "God Realm": {"stages": ["Lesser God [Entry]", "Lesser God [Middle]", "Lesser God [Peak]"]}
-}
-
-def get_player_level(p):
-    """Hitung level player"""
-    realm_idx = list(REALMS.keys()).index(p["realm"])
-    stage_idx = REALMS[p["realm"]]["stages"].index(p["stage"])
-    return (realm_idx * 100) + (stage_idx * 3) + 1
-
 def create_health_bar(percentage):
     """Buat health bar visual"""
     filled = int(percentage / 10)
@@ -355,13 +347,14 @@ async def party_info(ctx):
 
     # Member list
     members_text = ""
+    names = await NAME_RESOLVER.resolve_many(party_info["members"])
     for member_id in party_info["members"]:
         try:
-            member = await ctx.bot.fetch_user(member_id)
+            member_name = names[str(member_id)]
             role = "👑" if member_id == party_info["leader"] else "👤"
             p_data = get_player(member_id)
             level = get_player_level(p_data)
-            members_text += f"{role} {member.name} (Lv. {level})\n"
+            members_text += f"{role} {member_name} (Lv. {level})\n"
         except:
             members_text += f"👤 Unknown User ({member_id})\n"
 
@@ -425,32 +418,50 @@ async def challenge_world_boss(ctx, boss_name: str):
     if boss_data["name"] in ACTIVE_WORLD_BOSSES:
         return await ctx.send("❌ World boss sedang dilawan party lain!")
 
-    # Start world boss battle
+    # HP party dihitung dulu: member yang belum terdaftar / sudah dihapus ditolak sebelum ada yang dikunci
+    members = WORLD_BOSS_PARTIES[party_id]["members"].copy()
+    player_health = {}
+    for member_id in members:
+        member = get_player(member_id)
+        if member is None:
+            return await ctx.send(f"❌ <@{member_id}> belum terdaftar! Semua member party harus terdaftar.")
+        player_health[member_id] = 1000 + (member.get("total_power", 0) // 100)
+
+    # Start world boss battle (semua member party harus bebas dari battle/aktivitas lain)
     battle_id = f"world_boss_{boss_data['name'].lower()}_{party_id}"
+    conflict = ENGAGEMENTS.claim("world_boss", battle_id, *members)
+    if conflict:
+        return await ctx.send(busy_message(conflict))
 
-    ACTIVE_WORLD_BOSSES[boss_data["name"]] = {
-        "battle_id": battle_id,
-        "boss_data": boss_data,
-        "party_id": party_id,
-        "party_members": WORLD_BOSS_PARTIES[party_id]["members"].copy(),
-        "boss_health": boss_data["health"],
-        "player_health": {member_id: 1000 + (get_player(member_id).get("total_power", 0) // 100) for member_id in WORLD_BOSS_PARTIES[party_id]["members"]},
-        "max_player_health": {member_id: 1000 + (get_player(member_id).get("total_power", 0) // 100) for member_id in WORLD_BOSS_PARTIES[party_id]["members"]},
-        "round": 0,
-        "start_time": current_time,
-        "damage_dealt": {member_id: 0 for member_id in WORLD_BOSS_PARTIES[party_id]["members"]}
-    }
+    try:
+        ACTIVE_WORLD_BOSSES[boss_data["name"]] = {
+            "battle_id": battle_id,
+            "boss_data": boss_data,
+            "party_id": party_id,
+            "party_members": members,
+            "boss_health": boss_data["health"],
+            "player_health": player_health,
+            "max_player_health": dict(player_health),
+            "round": 0,
+            "start_time": current_time,
+            "damage_dealt": {member_id: 0 for member_id in members}
+        }
 
-    embed = discord.Embed(
-        title=f"🌍 WORLD BOSS BATTLE - {boss_data['name']}",
-        description=f"Party **{party_id}** menantang {boss_data['emoji']} {boss_data['name']}!",
-        color=0xff0000
-    )
-    embed.add_field(name="Party Size", value=f"{len(WORLD_BOSS_PARTIES[party_id]['members'])} players", inline=True)
-    embed.add_field(name="Boss Health", value=f"{boss_data['health']:,}", inline=True)
-    embed.add_field(name="Time Limit", value="10 minutes", inline=True)
+        embed = discord.Embed(
+            title=f"🌍 WORLD BOSS BATTLE - {boss_data['name']}",
+            description=f"Party **{party_id}** menantang {boss_data['emoji']} {boss_data['name']}!",
+            color=0xff0000
+        )
+        embed.add_field(name="Party Size", value=f"{len(members)} players", inline=True)
+        embed.add_field(name="Boss Health", value=f"{boss_data['health']:,}", inline=True)
+        embed.add_field(name="Time Limit", value="10 minutes", inline=True)
 
-    await ctx.send(embed=embed)
+        await ctx.send(embed=embed)
+    except Exception:
+        # Task belum jalan, jadi finally-nya tidak akan melepas kunci party
+        ACTIVE_WORLD_BOSSES.pop(boss_data["name"], None)
+        ENGAGEMENTS.release("world_boss", battle_id, *members)
+        raise
 
     # Start battle task
     asyncio.create_task(world_boss_battle_task(boss_data["name"], ctx))
@@ -482,7 +493,8 @@ async def world_boss_battle_task(boss_name, ctx):
         print(f"Error in world boss battle task: {e}")
     finally:
         if boss_name in ACTIVE_WORLD_BOSSES:
-            del ACTIVE_WORLD_BOSSES[boss_name]
+            battle_data = ACTIVE_WORLD_BOSSES.pop(boss_name)
+            ENGAGEMENTS.release("world_boss", battle_data["battle_id"], *battle_data["party_members"])
 
 async def world_boss_round(battle_data, ctx):
     """Satu round world boss battle"""
@@ -494,7 +506,7 @@ async def world_boss_round(battle_data, ctx):
     for player_id in battle_data["party_members"]:
         if battle_data["player_health"][player_id] > 0:
             p = get_player(player_id)
-            player_damage = calculate_player_damage(p, boss_data)
+            player_damage = calculate_player_damage(p, boss_data, DERIVED_STATS.get(player_id, p)["beast_profile"])
             battle_data["damage_dealt"][player_id] += player_damage
             total_damage += player_damage
 
@@ -520,8 +532,8 @@ async def world_boss_round(battle_data, ctx):
     except:
         pass
 
-def calculate_player_damage(player_data, boss_data):
-    """Hitung damage player ke boss"""
+def calculate_player_damage(player_data, boss_data, beast=None):
+    """Hitung damage player ke boss; beast = BeastProfile (critical beast aktif)"""
     base_damage = player_data["total_power"]
 
     # Element advantage (sederhana)
@@ -535,6 +547,10 @@ def calculate_player_damage(player_data, boss_data):
 
     # Random variation
     damage = random.randint(int(base_damage * 0.8), int(base_damage * 1.2))
+
+    # Critical hit beast aktif (White Divine Tiger dll), sama seperti PvP
+    if beast is not None and beast.critical > 0 and random.random() < beast.critical:
+        damage *= 2
     return max(10, damage)
 
 def create_world_boss_embed(battle_data, ctx):
@@ -580,14 +596,16 @@ async def finish_world_boss_battle(battle_data, ctx, victory):
         rewards = {}
         drop_winners = []  # Untuk melacak siapa yang dapat equipment
 
-        for player_id in battle_data["party_members"]:
-            if battle_data["player_health"][player_id] > 0:  # Only alive players get rewards
-                damage_share = battle_data["damage_dealt"][player_id] / total_damage
+        # Hanya player yang masih hidup dapat reward, semua di-commit sekali di akhir
+        alive_members = [pid for pid in battle_data["party_members"] if battle_data["player_health"][pid] > 0]
 
-                p = get_player(player_id)
+        async with player_txn(*alive_members, stats=True) as records:
+            stats = records[-1]
+            for player_id, p in zip(alive_members, records[:-1]):
                 if p is None:
                     continue
-                    
+
+                damage_share = battle_data["damage_dealt"][player_id] / total_damage
                 p["exp"] += int(boss_data["reward_exp"] * damage_share)
                 p["qi"] += int(boss_data["reward_qi"] * damage_share)
                 p["spirit_stones"] += int(boss_data["reward_stones"] * damage_share)
@@ -603,6 +621,8 @@ async def finish_world_boss_battle(battle_data, ctx, victory):
                         # Add equipment properly
                         equip_id = equip["name"].lower().replace(" ", "_")
                         p["equipment"][equip_id] = equip.get("power", 100)
+                        DERIVED_STATS.invalidate(player_id, "equipment")
+                        DERIVED_STATS.refresh_power(player_id, p)
 
                         # Cek apakah player punya full set
                         player_set_items = [e for e in p["equipment"] if e.get("set") == equip["set"]]
@@ -619,14 +639,14 @@ async def finish_world_boss_battle(battle_data, ctx, victory):
                 boss_name = boss_data["name"]
                 p["world_boss_kills"][boss_name] = p["world_boss_kills"].get(boss_name, 0) + 1
 
-                update_player(player_id, p)
-
                 rewards[player_id] = {
                     "exp": int(boss_data["reward_exp"] * damage_share),
                     "qi": int(boss_data["reward_qi"] * damage_share),
                     "stones": int(boss_data["reward_stones"] * damage_share)
                 }
 
+            stats["total_world_boss_kills"] = stats.get("total_world_boss_kills", 0) + 1
+
         # Victory embed
         embed = discord.Embed(
             title=f"🎉 WORLD BOSS DEFEATED! {boss_data['emoji']}",
@@ -636,11 +656,8 @@ async def finish_world_boss_battle(battle_data, ctx, victory):
 
         rewards_text = ""
         for player_id, reward in rewards.items():
-            try:
-                user = await ctx.bot.fetch_user(player_id)
-                rewards_text += f"{user.mention}: {reward['exp']} EXP, {reward['qi']} Qi, {reward['stones']} Stones\n"
-            except:
-                continue
+            # Mention cukup dari ID, tidak perlu fetch_user per player
+            rewards_text += f"<@{player_id}>: {reward['exp']} EXP, {reward['qi']} Qi, {reward['stones']} Stones\n"
 
         # Tambahkan info equipment drops jika ada
         if drop_winners: